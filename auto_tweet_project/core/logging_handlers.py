@@ -0,0 +1,127 @@
+"""
+ログ出力を投稿処理から切り離すためのハンドラーとフォーマッター
+
+LOG_QUEUE=True の場合、settings.LOGGING は QueueListenerHandler だけをロガーに設定する。
+呼び出し元のスレッドはレコードをキューに積むだけで戻り、コンソール・ファイルへの
+書き込み (ローテーションを含む) はバックグラウンドのリスナースレッドが行う。
+"""
+
+import copy
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# LogRecord の標準属性 (これ以外は extra で渡された構造化フィールドとして出力する)
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """ログレコードを1行の JSON に変換するフォーマッター"""
+
+    def format(self, record):
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc)
+            .astimezone()
+            .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "process": record.process,
+            "thread": record.thread,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc_info"] = record.exc_text
+        if record.stack_info:
+            data["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _DrainingQueueListener(QueueListener):
+    """停止の合図を、キューに空きができるまで待ってから積む QueueListener"""
+
+    def enqueue_sentinel(self):
+        # 標準の put_nowait では、キューが満杯の状態で停止すると queue.Full になる
+        self.queue.put(self._sentinel)
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    dictConfig から使う QueueHandler。指定したハンドラーへの出力を
+    バックグラウンドの QueueListener に任せる。
+
+    handlers には "cfg://handlers.<名前>" 形式で、先に設定されるハンドラーを指定する。
+    キューが満杯で捨てたレコードは dropped に数え、件数を標準エラー出力に書き出す。
+    """
+
+    def __init__(self, handlers, respect_handler_level=True, maxsize=10000):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        # dictConfig の ConvertingList は要素アクセス時にハンドラーへ解決される
+        handlers = [handlers[i] for i in range(len(handlers))]
+        self.listener = _DrainingQueueListener(
+            self.queue, *handlers, respect_handler_level=respect_handler_level
+        )
+        # 捨てたレコードの累計と、まだ報告していない件数
+        self.dropped = 0
+        self._unreported_drops = 0
+        self.listener.start()
+        self._started = True
+
+    def prepare(self, record):
+        """
+        キューに積むレコードを作る。引数の埋め込みはここで1度だけ行い、
+        例外情報はテキスト化して別スレッドに渡す (%s の遅延評価はレベル判定後に行われる)。
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        # emit() はハンドラーのロックを取得して呼ばれるため、件数の更新は競合しない
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # 出力が追いつかない場合は投稿処理を待たせずにレコードを捨て、件数を数える
+            self.dropped += 1
+            self._unreported_drops += 1
+            if self._unreported_drops == 1:
+                self._report("ログのキューが満杯のため、レコードを捨てています")
+            return
+        if self._unreported_drops:
+            self._report_drops()
+
+    def _report_drops(self):
+        """前回の報告以降に捨てたレコードの件数を書き出す"""
+        self._report(
+            f"ログのキューが満杯のため、{self._unreported_drops}件のレコードを捨てました"
+            f" (累計 {self.dropped}件)"
+        )
+        self._unreported_drops = 0
+
+    def _report(self, message):
+        # ログ自体が詰まっているため、logging を通さずに標準エラー出力へ書く
+        if sys.stderr:
+            sys.stderr.write(f"{type(self).__name__}: {message}\n")
+
+    def close(self):
+        """キューに残ったレコードを出力してからリスナーを停止する (logging.shutdown から呼ばれる)"""
+        with self.lock:
+            started, self._started = self._started, False
+            if self._unreported_drops:
+                self._report_drops()
+        # logging.shutdown と dictConfig の再設定の両方から呼ばれても、停止は1度だけ行う
+        if started:
+            self.listener.stop()
+        super().close()
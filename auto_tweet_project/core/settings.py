@@ -99,6 +99,19 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "core.wsgi.application"
+ASGI_APPLICATION = "core.asgi.application"
+
+# ASGI サーバー (uvicorn 等) で運用する場合に True にすると、
+# スケジュール画面に非同期版のビュー (x_scheduler/async_views.py) を使用する
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "False").lower() == "true"
+
+# 投稿キューの変更配信 (Server-Sent Events)
+# DB をポーリングする間隔（秒）
+SSE_POLL_INTERVAL_SECONDS = float(os.getenv("SSE_POLL_INTERVAL_SECONDS", "2"))
+# WSGI (同期ビュー) で1接続を維持する最大時間（秒）。経過後はブラウザが自動で再接続する
+SSE_STREAM_MAX_SECONDS = int(os.getenv("SSE_STREAM_MAX_SECONDS", "300"))
+# 差分を読み直す重なりの幅（秒）。カーソルより前の updated_at で後からコミットされた行を拾う
+SSE_CURSOR_OVERLAP_SECONDS = float(os.getenv("SSE_CURSOR_OVERLAP_SECONDS", "60"))
 
 
 # Database
@@ -112,6 +125,18 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# スケジュール一覧の行単位のフラグメントキャッシュに使用
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "x_scheduler",
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -153,6 +178,10 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# アップロードは常に一時ファイルへチャンク単位で書き出し、メモリに保持しない
+# (画像はサイズ上限を超えた時点で書き込みを中止する)
+FILE_UPLOAD_HANDLERS = ["x_scheduler.uploadhandlers.LimitedTemporaryFileUploadHandler"]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -173,7 +202,52 @@ MAX_DAILY_POSTS_PER_USER = int(os.getenv("MAX_DAILY_POSTS", "16"))
 # .env から読み込むように変更 (デフォルトは開発用URL)
 X_CALLBACK_URL = os.getenv("X_CALLBACK_URL", "http://127.0.0.1:8000/x_auth/callback/")
 
+# 投稿遅延 (予定時刻から投稿まで) の SLO: 指定パーセンタイルがこの秒数以下であること
+DISPATCH_LAG_SLO_SECONDS = float(os.getenv("DISPATCH_LAG_SLO_SECONDS", "900"))
+DISPATCH_LAG_SLO_PERCENTILE = int(os.getenv("DISPATCH_LAG_SLO_PERCENTILE", "95"))
+
+# 管理コマンドの --profile / --trace-queries の出力先
+PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR", str(BASE_DIR / "profiles"))
+
+# 常駐ワーカー (run_worker) が待ち受ける Unix ドメインソケットのパス
+WORKER_SOCKET_PATH = os.getenv("WORKER_SOCKET_PATH", str(BASE_DIR / "worker.sock"))
+# 予約の変更をディスパッチャー (run_worker --dispatch) に通知するデータグラムソケットのパス
+WAKEUP_SOCKET_PATH = os.getenv("WAKEUP_SOCKET_PATH", str(BASE_DIR / "wakeup.sock"))
+# ディスパッチャーが通知によらず予定時刻を計算し直す間隔（秒）
+DISPATCH_REPLAN_SECONDS = int(os.getenv("DISPATCH_REPLAN_SECONDS", "300"))
+# 投稿上限などで予定時刻を過ぎた予約が残った場合に、process_tweets を再実行するまでの間隔（秒）
+DISPATCH_RETRY_SECONDS = int(os.getenv("DISPATCH_RETRY_SECONDS", "60"))
+
+# X API の接続確認 (verify_credentials + get_me) の結果を有効とみなす秒数。
+# 投稿の成功も接続確認として記録されるため、期限切れか失敗の後にだけ接続確認を行う
+API_HEALTH_TTL_SECONDS = int(os.getenv("API_HEALTH_TTL_SECONDS", "21600"))
+
+# 遅延分の再配置: 予定時刻を過ぎた予約がこの件数を超えたら、CATCHUP_WINDOW_HOURS 時間に分散させる (0 で無効)
+CATCHUP_THRESHOLD = int(os.getenv("CATCHUP_THRESHOLD", "5"))
+CATCHUP_WINDOW_HOURS = float(os.getenv("CATCHUP_WINDOW_HOURS", "6"))
+# 再配置で投稿を多めに割り当てる時間帯 (時、カンマ区切り)
+PEAK_HOURS = [
+    int(hour) for hour in os.getenv("PEAK_HOURS", "6,12,18").split(",") if hour.strip()
+]
+
+# 繰り返しパターンの予約を作成しておく先読み期間（時間）。この範囲に入った分だけを TweetSchedule にする (0 で無効)
+RECURRENCE_HORIZON_HOURS = float(os.getenv("RECURRENCE_HORIZON_HOURS", "48"))
+
+# collect_metrics で公開指標を取得する対象の、投稿からの日数
+METRICS_COLLECT_DAYS = int(os.getenv("METRICS_COLLECT_DAYS", "7"))
+
+# 投稿時刻のおすすめ: 古い投稿のエンゲージメントの重みが半分になる日数と、おすすめを使い始める投稿数
+ENGAGEMENT_HALF_LIFE_DAYS = float(os.getenv("ENGAGEMENT_HALF_LIFE_DAYS", "30"))
+ENGAGEMENT_MIN_POSTS = int(os.getenv("ENGAGEMENT_MIN_POSTS", "20"))
+
 # ロギング設定
+# LOG_QUEUE=True の場合、ログはキュー経由でバックグラウンドスレッドから出力する
+# (ファイル書き込みやローテーションで投稿処理が待たされないようにする)
+LOG_QUEUE = os.getenv("LOG_QUEUE", "False").lower() == "true"
+# LOG_FORMAT=json の場合、コンソール・ファイルとも1行1レコードの JSON で出力する
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_HANDLERS = ["queue"] if LOG_QUEUE else ["console", "file"]
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -182,32 +256,42 @@ LOGGING = {
             "format": "{levelname} {asctime} [{process:d}:{thread:d}] {module} {message}",
             "style": "{",
         },
+        "json": {
+            "()": "core.logging_handlers.JsonFormatter",
+        },
     },
     "handlers": {
         "console": {
             "level": os.getenv("DJANGO_LOG_LEVEL", "WARNING"),
             "class": "logging.StreamHandler",
-            "formatter": "verbose",
+            "formatter": "json" if LOG_FORMAT == "json" else "verbose",
         },
         "file": {  # RotatingFileHandler に変更
             "level": os.getenv("DJANGO_LOG_LEVEL", "WARNING"),
             "class": "logging.handlers.RotatingFileHandler",
             "filename": BASE_DIR / "debug.log",
-            "formatter": "verbose",
+            "formatter": "json" if LOG_FORMAT == "json" else "verbose",
             "maxBytes": 1024 * 1024 * 5,  # 5MB
             "backupCount": 3,  # 3世代まで保持
         },
     },
     "loggers": {
         "django": {
-            "handlers": ["console", "file"],
+            "handlers": LOG_HANDLERS,
             "level": os.getenv("DJANGO_LOG_LEVEL", "WARNING"),
             "propagate": False,
         },
         "x_scheduler": {
-            "handlers": ["console", "file"],
+            "handlers": LOG_HANDLERS,
             "level": os.getenv("APP_LOG_LEVEL", "WARNING"),
             "propagate": True,
         },
     },
 }
+
+if LOG_QUEUE:
+    # console / file はリスナースレッドから呼ばれる (名前順で queue より先に生成される)
+    LOGGING["handlers"]["queue"] = {
+        "()": "core.logging_handlers.QueueListenerHandler",
+        "handlers": ["cfg://handlers.console", "cfg://handlers.file"],
+    }
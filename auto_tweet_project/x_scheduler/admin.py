@@ -1,19 +1,135 @@
-from django.conf import settings
-from django.contrib import admin
+import logging
+from datetime import timedelta
 
-from .models import DailyPostCounter, SystemSetting, TweetSchedule
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import (
+    Account,
+    DailyPostCounter,
+    EngagementSnapshot,
+    PostingAttempt,
+    RecurringPattern,
+    SystemSetting,
+    TweetSchedule,
+)
+from .signals import suppress_wakeup
+from .wakeup import notify_schedule_changed
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+
+def delete_media_files(names, storage):
+    """行の削除後にまとめて画像ファイルを削除し、削除できた件数を返す"""
+    deleted = 0
+    for name in names:
+        try:
+            storage.delete(name)
+            deleted += 1
+        except OSError as e:
+            logger.warning(f"画像の削除に失敗しました: {name} ({e})")
+    logger.info(f"{deleted}/{len(names)}件の画像を削除しました")
+    return deleted
+
+
+class TweetScheduleActionForm(ActionForm):
+    """一括操作用のフォーム (予定時刻をずらす分数を指定)"""
+
+    offset_minutes = forms.IntegerField(
+        label="ずらす分数",
+        required=False,
+        help_text="「予定時刻をずらす」で使用 (負の値で前倒し)",
+    )
+
+
+@admin.register(Account)
+class AccountAdmin(admin.ModelAdmin):
+    list_display = (
+        "name",
+        "credentials_prefix",
+        "daily_limit",
+        "is_active",
+        "updated_at",
+    )
+    list_filter = ("is_active",)
+    search_fields = ("name",)
+    readonly_fields = ("created_at", "updated_at")
+    fieldsets = (
+        (
+            "アカウント",
+            {"fields": ("name", "credentials_prefix", "max_daily_posts", "is_active")},
+        ),
+        ("メタデータ", {"fields": ("created_at", "updated_at")}),
+    )
+
+    def daily_limit(self, obj):
+        """1日の投稿上限 (未設定の場合は settings の値)"""
+        return obj.daily_limit
+
+    daily_limit.short_description = "1日の投稿上限"
 
 
 @admin.register(TweetSchedule)
 class TweetScheduleAdmin(admin.ModelAdmin):
-    list_display = ("content_preview", "scheduled_time", "status", "created_at")
-    list_filter = ("status", "scheduled_time")
+    list_display = (
+        "content_preview",
+        "account",
+        "scheduled_time",
+        "status",
+        "created_at",
+    )
+    # どちらも (status, scheduled_time) / scheduled_time のインデックスで絞り込める
+    list_filter = ("status", "scheduled_time", "account")
+    list_select_related = ("account",)
     search_fields = ("content",)
-    readonly_fields = ("created_at", "updated_at")
+    # 大量の予約があっても全件の COUNT(*) を実行しない
+    show_full_result_count = False
+    action_form = TweetScheduleActionForm
+    actions = (
+        "retry_failed",
+        "shift_scheduled_time",
+        "cancel_pending",
+        "purge_with_media",
+    )
+    readonly_fields = (
+        "original_scheduled_time",
+        "posted_at",
+        "dispatch_lag",
+        "tweet_id",
+        "recurring_pattern",
+        "created_at",
+        "updated_at",
+    )
     fieldsets = (
-        ("投稿内容", {"fields": ("content", "scheduled_time")}),
-        ("ステータス", {"fields": ("status", "error_message")}),
-        ("メタデータ", {"fields": ("created_at", "updated_at")}),
+        (
+            "投稿内容",
+            {
+                "fields": (
+                    "account",
+                    "content",
+                    "scheduled_time",
+                    "original_scheduled_time",
+                )
+            },
+        ),
+        (
+            "ステータス",
+            {
+                "fields": (
+                    "status",
+                    "error_message",
+                    "posted_at",
+                    "dispatch_lag",
+                    "tweet_id",
+                )
+            },
+        ),
+        ("メタデータ", {"fields": ("recurring_pattern", "created_at", "updated_at")}),
     )
 
     def content_preview(self, obj):
@@ -22,20 +138,115 @@ class TweetScheduleAdmin(admin.ModelAdmin):
 
     content_preview.short_description = "投稿内容"
 
+    # 一括操作はいずれも1回の UPDATE / DELETE で実行する。
+    # update() は auto_now を更新しないため、一覧の差分検出用に updated_at も明示的に設定する。
+    # また、シグナルが送られないため、ディスパッチャーへの変更通知も明示的に行う。
+
+    @admin.action(description="選択した失敗済みの予約を再試行する")
+    def retry_failed(self, request, queryset):
+        count = queryset.filter(status="failed").update(
+            status="pending", error_message=None, updated_at=timezone.now()
+        )
+        if count:
+            notify_schedule_changed()
+        self.message_user(request, f"{count}件の予約を待機中に戻しました。")
+
+    @admin.action(description="選択した待機中の予約の予定時刻をずらす")
+    def shift_scheduled_time(self, request, queryset):
+        try:
+            offset = self.action_form.base_fields["offset_minutes"].clean(
+                request.POST.get("offset_minutes")
+            )
+        except forms.ValidationError:
+            offset = None
+        if not offset:
+            self.message_user(
+                request, "ずらす分数を指定してください。", level=messages.WARNING
+            )
+            return
+        count = queryset.filter(status="pending").update(
+            scheduled_time=F("scheduled_time") + timedelta(minutes=offset),
+            updated_at=timezone.now(),
+        )
+        if count:
+            notify_schedule_changed()
+        self.message_user(
+            request, f"{count}件の予約の予定時刻を{offset}分ずらしました。"
+        )
+
+    @admin.action(description="選択した待機中の予約をキャンセルする")
+    def cancel_pending(self, request, queryset):
+        count = queryset.filter(status="pending").update(
+            status="cancelled", updated_at=timezone.now()
+        )
+        if count:
+            notify_schedule_changed()
+        self.message_user(request, f"{count}件の予約をキャンセルしました。")
+
+    @admin.action(description="選択した予約を画像ごと削除する")
+    def purge_with_media(self, request, queryset):
+        image_names = list(
+            queryset.exclude(image="")
+            .exclude(image__isnull=True)
+            .values_list("image", flat=True)
+        )
+        storage = TweetSchedule._meta.get_field("image").storage
+        # 関連する行 (投稿試行・公開指標) の扱いはモデルの on_delete に従う。
+        # 1行ごとの post_delete による通知は止め、削除後に1回だけ通知する
+        with transaction.atomic():
+            with suppress_wakeup():
+                _, deleted = queryset.delete()
+            count = deleted.get(TweetSchedule._meta.label, 0)
+            if count:
+                notify_schedule_changed()
+            # 行の削除が確定してから画像を削除する
+            transaction.on_commit(lambda: delete_media_files(image_names, storage))
+        self.message_user(
+            request, f"{count}件の予約と{len(image_names)}件の画像を削除しました。"
+        )
+
+
+@admin.register(RecurringPattern)
+class RecurringPatternAdmin(admin.ModelAdmin):
+    list_display = ("name", "account", "frequency", "time", "is_active", "next_fire_at")
+    list_filter = ("frequency", "is_active", "account")
+    search_fields = ("name", "content_template")
+    readonly_fields = ("next_fire_at", "created_at", "updated_at")
+    fieldsets = (
+        (
+            "パターン",
+            {"fields": ("name", "frequency", "time", "weekday", "day_of_month")},
+        ),
+        ("投稿内容", {"fields": ("account", "content_template", "image")}),
+        ("ステータス", {"fields": ("is_active", "next_fire_at")}),
+        ("メタデータ", {"fields": ("created_at", "updated_at")}),
+    )
+
+    def save_model(self, request, obj, form, change):
+        # 日程を変更した場合は、次回の投稿時刻を現在時刻から計算し直す
+        # (作成済みの予約はそのまま残る)
+        if change and set(form.changed_data) & set(RecurringPattern.SCHEDULE_FIELDS):
+            obj.reset_next_fire()
+        super().save_model(request, obj, form, change)
+        # ディスパッチャーに先読み期間に入った分の予約を作成させる
+        notify_schedule_changed()
+
 
 @admin.register(DailyPostCounter)
 class DailyPostCounterAdmin(admin.ModelAdmin):
     list_display = (
         "date",
+        "account",
         "post_count",
         "display_max_posts",
         "remaining_posts",
         "updated_at",
     )
-    list_filter = ("date",)
+    list_filter = ("date", "account")
+    list_select_related = ("account",)
     readonly_fields = ("created_at", "updated_at")
     fieldsets = (
-        ("投稿カウント", {"fields": ("date", "post_count")}),
+        ("投稿カウント", {"fields": ("account", "date", "post_count")}),
         ("メタデータ", {"fields": ("created_at", "updated_at")}),
     )
 
@@ -46,8 +257,8 @@ class DailyPostCounterAdmin(admin.ModelAdmin):
     remaining_posts.short_description = "残り投稿可能数"
 
     def display_max_posts(self, obj):
-        """settings から最大投稿数を取得して表示"""
-        return settings.MAX_DAILY_POSTS_PER_USER
+        """アカウントの1日の投稿上限 (既定のアカウントは settings の値) を表示"""
+        return obj.limit
 
     display_max_posts.short_description = "今日の最大投稿数"
 
@@ -61,3 +272,37 @@ class SystemSettingAdmin(admin.ModelAdmin):
         ("設定", {"fields": ("key", "value", "description")}),
         ("メタデータ", {"fields": ("created_at", "updated_at")}),
     )
+
+
+@admin.register(PostingAttempt)
+class PostingAttemptAdmin(admin.ModelAdmin):
+    list_display = (
+        "started_at",
+        "source",
+        "success",
+        "total_seconds",
+        "media_upload_seconds",
+        "create_tweet_seconds",
+        "http_status",
+        "rate_limit_remaining",
+    )
+    list_filter = ("source", "success")
+    list_select_related = ("tweet",)
+    show_full_result_count = False
+    readonly_fields = [field.name for field in PostingAttempt._meta.fields]
+
+
+@admin.register(EngagementSnapshot)
+class EngagementSnapshotAdmin(admin.ModelAdmin):
+    list_display = (
+        "collected_at",
+        "tweet",
+        "impression_count",
+        "like_count",
+        "retweet_count",
+        "reply_count",
+    )
+    list_select_related = ("tweet",)
+    date_hierarchy = "collected_at"
+    show_full_result_count = False
+    readonly_fields = [field.name for field in EngagementSnapshot._meta.fields]
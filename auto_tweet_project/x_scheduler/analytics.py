@@ -0,0 +1,179 @@
+"""
+エンゲージメントの履歴にもとづく投稿時刻のおすすめ
+
+collect_metrics が記録した公開指標 (EngagementSnapshot) と投稿履歴から、曜日×時間帯
+(1週間の168時間枠) ごとの投稿1件あたりのエンゲージメント (いいね・リポスト・返信・
+引用・ブックマークの合計) を求め、投稿枠の選択 (auto_post --slots / --until、
+作成画面の初期値) に使う。
+
+- 投稿ごとの最新の値をデータベースで1行に集計し、枠ごとの集計は NumPy の bincount で
+  まとめて行う (投稿履歴が何年分あっても Python のループで枠ごとに数えない)
+- 古い投稿ほど重みを小さくする (ENGAGEMENT_HALF_LIFE_DAYS 日で半分)
+- 投稿の少ない枠は全体の平均に寄せる (件数が少ない枠の偶然の高評価を避ける)
+- 公開指標のある投稿が ENGAGEMENT_MIN_POSTS 件未満の場合はおすすめを出さず、
+  呼び出し側は従来どおりの時刻を使う
+"""
+
+import logging
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F, Max
+from django.db.models.functions import ExtractHour, ExtractWeekDay
+from django.utils import timezone
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+# 1週間の時間枠の数 (月曜0時が0、日曜23時が167)
+HOURS_PER_WEEK = 7 * 24
+
+# 投稿の少ない枠を全体の平均に寄せる強さ (この件数分の平均的な投稿があるものとみなす)
+PRIOR_WEIGHT = 2.0
+
+# エンゲージメントとして合計する公開指標 (表示回数は含めない)
+ENGAGEMENT_FIELDS = (
+    "like_count",
+    "retweet_count",
+    "reply_count",
+    "quote_count",
+    "bookmark_count",
+)
+
+
+def hour_of_week(when):
+    """日時 (現地時刻) の1週間の時間枠の番号を返す"""
+    local = timezone.localtime(when)
+    return local.weekday() * 24 + local.hour
+
+
+def _load_history(account):
+    """
+    公開指標のある投稿の (時間枠の番号, 投稿日時の UNIX 時刻, エンゲージメント) を
+    NumPy 配列で返す。エンゲージメントは投稿ごとに記録した値の最大 (= 最新) を使う。
+    """
+    from .models import TweetSchedule  # 循環インポート回避
+
+    engagement = sum(
+        (F(f"engagement_snapshots__{field}") for field in ENGAGEMENT_FIELDS[1:]),
+        F(f"engagement_snapshots__{ENGAGEMENT_FIELDS[0]}"),
+    )
+    rows = list(
+        TweetSchedule.objects.filter(
+            account=account, status="posted", posted_at__isnull=False
+        )
+        .annotate(engagement=Max(engagement))
+        .filter(engagement__isnull=False)
+        # 曜日と時刻は現在のタイムゾーン (TIME_ZONE) でデータベースが求める
+        .annotate(week_day=ExtractWeekDay("posted_at"), hour=ExtractHour("posted_at"))
+        .values_list("week_day", "hour", "posted_at", "engagement")
+    )
+    if not rows:
+        return None
+    week_day, hour, posted_at, values = zip(*rows)
+    # ExtractWeekDay は日曜1〜土曜7のため、月曜0〜日曜6に直す
+    slots = (np.array(week_day) - 2) % 7 * 24 + np.array(hour)
+    timestamps = np.array([when.timestamp() for when in posted_at])
+    return slots, timestamps, np.array(values, dtype=float)
+
+
+def score_hours(slots, timestamps, values, now_ts, half_life_days):
+    """
+    時間枠ごとの投稿1件あたりのエンゲージメントを、古い投稿ほど小さい重みで平均する。
+    投稿の少ない枠は全体の平均に寄せる。戻り値は長さ168の配列。
+    """
+    age_days = np.maximum(now_ts - timestamps, 0) / 86400
+    weights = 0.5 ** (age_days / half_life_days)
+    weight_sums = np.bincount(slots, weights=weights, minlength=HOURS_PER_WEEK)
+    value_sums = np.bincount(slots, weights=weights * values, minlength=HOURS_PER_WEEK)
+    total_weight = weight_sums.sum()
+    # 古い投稿ばかりで重みの合計が 0 になった (アンダーフローした) 場合は重みを付けない
+    overall = value_sums.sum() / total_weight if total_weight > 0 else values.mean()
+    return (value_sums + PRIOR_WEIGHT * overall) / (weight_sums + PRIOR_WEIGHT)
+
+
+class PostingTimeRecommender:
+    """曜日×時間帯ごとのエンゲージメントから投稿時刻を選ぶクラス"""
+
+    def __init__(self, account=None, now=None, half_life_days=None, min_posts=None):
+        self.account = account
+        self.now = now or timezone.now()
+        self.half_life_days = (
+            settings.ENGAGEMENT_HALF_LIFE_DAYS
+            if half_life_days is None
+            else half_life_days
+        )
+        self.min_posts = (
+            settings.ENGAGEMENT_MIN_POSTS if min_posts is None else min_posts
+        )
+        self._scores = None
+        self._loaded = False
+
+    @property
+    def scores(self):
+        """時間枠ごとのスコア (長さ168の配列)。履歴が足りない場合は None"""
+        if not self._loaded:
+            self._loaded = True
+            history = _load_history(self.account)
+            if history is None or len(history[0]) < self.min_posts:
+                logger.info(
+                    f"公開指標のある投稿が {self.min_posts}件未満のため、"
+                    f"投稿時刻のおすすめは使いません"
+                )
+            else:
+                self._scores = score_hours(
+                    *history, self.now.timestamp(), self.half_life_days
+                )
+        return self._scores
+
+    @property
+    def available(self):
+        return self.scores is not None
+
+    def choose(self, candidates, count):
+        """
+        候補の日時からスコアの高い count 件を選び、時刻順に返す。
+        同じスコアなら早い時刻を優先する。履歴が足りない場合は先頭の count 件を返す。
+        """
+        candidates = list(candidates)
+        if self.scores is None or count >= len(candidates):
+            return candidates[:count]
+        candidate_scores = self.scores[[hour_of_week(when) for when in candidates]]
+        # 安定ソートのため、同じスコアの候補は元の (時刻の) 順に並ぶ
+        best = np.argsort(-candidate_scores, kind="stable")[:count]
+        return [candidates[index] for index in sorted(best)]
+
+    def upcoming(self, start, hours=24, count=3, allocator=None):
+        """
+        start 以降 hours 時間の毎時0分から、スコアの高い時刻を count 件返す (スコア順)。
+        allocator (SlotAllocator) を指定した場合は投稿枠の残っている日の時刻だけを返す。
+        履歴が足りない場合は空のリスト。
+        """
+        if self.scores is None:
+            return []
+        local = timezone.localtime(start)
+        first = local.replace(minute=0, second=0, microsecond=0)
+        if first < local:
+            first += timedelta(hours=1)
+        candidates = [first + timedelta(hours=offset) for offset in range(hours)]
+        if allocator is not None:
+            candidates = [
+                when
+                for when in candidates
+                if allocator.remaining(timezone.localdate(when)) > 0
+            ]
+        if not candidates:
+            return []
+        candidate_scores = self.scores[[hour_of_week(when) for when in candidates]]
+        best = np.argsort(-candidate_scores, kind="stable")[:count]
+        return [candidates[index] for index in best]
+
+    def top_hours(self, count=5):
+        """スコアの高い時間枠を (曜日 0〜6, 時, スコア) のリストで返す"""
+        if self.scores is None:
+            return []
+        best = np.argsort(-self.scores, kind="stable")[:count]
+        return [
+            (int(slot) // 24, int(slot) % 24, float(self.scores[slot])) for slot in best
+        ]
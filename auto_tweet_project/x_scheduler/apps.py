@@ -11,3 +11,7 @@ class XSchedulerConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "x_scheduler"
     verbose_name = "X投稿スケジューラー"
+
+    def ready(self):
+        # 予約の変更をディスパッチャーに通知するシグナルハンドラーを登録する
+        from . import signals  # noqa: F401
@@ -0,0 +1,187 @@
+"""
+ASGI 環境向けの非同期ビュー
+
+views.py の schedule_list / schedule_events / schedule_create / schedule_edit /
+schedule_delete と同じ画面・同じ振る舞いを、非同期 ORM とスレッドへの
+ファイル操作のオフロードで提供する。
+settings.ASYNC_VIEWS が True の場合に urls.py から使用される。
+"""
+
+import asyncio
+import logging
+import os
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.http import StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, redirect, render
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from . import events
+from .forms import TweetScheduleForm
+from .models import TweetSchedule
+from .views import (
+    SCHEDULE_LIST_VERSION,
+    recommended_posting_times,
+    schedule_list_etag_from_version,
+    selected_account,
+)
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+# テンプレート描画は同期処理のため、スレッドで実行する
+arender = sync_to_async(render)
+
+
+def _remove_file(path):
+    """ファイルが存在すれば削除する (スレッドで実行される)"""
+    if os.path.exists(path):
+        logger.debug(f"画像を削除します: {path}")
+        os.remove(path)
+
+
+async def schedule_list(request):
+    """投稿スケジュール一覧ページ (非同期版、変更がなければ 304 を返す)"""
+    # condition デコレーターは版情報を同期的に取得するため、ここで非同期に判定する
+    etag = last_modified = None
+    # メッセージがセッションに保存されている場合に備え、件数確認もスレッドで行う
+    if not await sync_to_async(len)(messages.get_messages(request)):
+        version = await TweetSchedule.objects.aaggregate(**SCHEDULE_LIST_VERSION)
+        etag = schedule_list_etag_from_version(version)
+        if version["last_modified"]:
+            last_modified = int(version["last_modified"].timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is not None:
+            return response
+
+    schedules = [schedule async for schedule in TweetSchedule.objects.all()]
+    response = await arender(
+        request,
+        "x_scheduler/schedule_list.html",
+        {
+            "schedules": schedules,
+        },
+    )
+    if etag:
+        response.headers["ETag"] = etag
+    if last_modified:
+        response.headers["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+async def schedule_events(request):
+    """投稿キューの変更を Server-Sent Events で配信する (非同期版、変更フィードを共有)"""
+    response = StreamingHttpResponse(
+        events.aiter_events(request.headers.get("Last-Event-ID")),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # リバースプロキシでのバッファリングを無効化
+    return response
+
+
+async def schedule_create(request):
+    """投稿スケジュール作成ページ (非同期版)"""
+    if request.method == "POST":
+        form = TweetScheduleForm(request.POST, request.FILES)
+        # 画像の検証でファイルを読むため、バリデーションはスレッドで実行する
+        if await sync_to_async(form.is_valid)():
+            tweet = form.save(commit=False)
+
+            if "image" in request.FILES:
+                tweet_images_dir = os.path.join(settings.MEDIA_ROOT, "tweet_images")
+                await asyncio.to_thread(os.makedirs, tweet_images_dir, exist_ok=True)
+
+            # 保存 (画像ファイルの書き込みも含めてスレッドで実行される)
+            await tweet.asave()
+
+            messages.success(request, "投稿スケジュールが作成されました。")
+            return redirect("x_scheduler:schedule_list")
+        else:
+            logger.debug(f"フォームエラー: {form.errors}")
+        recommended_times = await sync_to_async(recommended_posting_times)(
+            form.cleaned_data.get("account")
+        )
+    else:
+        # エンゲージメントの履歴があれば、今後24時間で反応の良い時刻を初期値にする
+        # (?account= で選んだアカウントの履歴を使う)
+        form = TweetScheduleForm()
+        account = await sync_to_async(selected_account)(
+            form, request.GET.get("account")
+        )
+        recommended_times = await sync_to_async(recommended_posting_times)(account)
+        form.initial["account"] = account
+        if recommended_times:
+            form.initial["scheduled_time"] = timezone.localtime(recommended_times[0])
+
+    return await arender(
+        request,
+        "x_scheduler/schedule_form.html",
+        {
+            "form": form,
+            "title": "新規投稿スケジュール作成",
+            "recommended_times": recommended_times,
+        },
+    )
+
+
+async def schedule_edit(request, pk):
+    """投稿スケジュール編集ページ (非同期版)"""
+    tweet = await aget_object_or_404(TweetSchedule, pk=pk)
+    old_image_path = tweet.image.path if tweet.image else None
+
+    if request.method == "POST":
+        form = TweetScheduleForm(request.POST, request.FILES, instance=tweet)
+        if await sync_to_async(form.is_valid)():
+            updated_tweet = form.save(commit=False)
+
+            # 既存の画像がある場合は削除
+            if "image" in request.FILES and old_image_path:
+                await asyncio.to_thread(_remove_file, old_image_path)
+
+            await updated_tweet.asave()
+
+            messages.success(request, "投稿スケジュールが更新されました。")
+            return redirect("x_scheduler:schedule_list")
+        else:
+            logger.debug(f"編集フォームエラー: {form.errors}")
+    else:
+        form = TweetScheduleForm(instance=tweet)
+
+    return await arender(
+        request,
+        "x_scheduler/schedule_form.html",
+        {
+            "form": form,
+            "tweet": tweet,
+            "title": "投稿スケジュール編集",
+        },
+    )
+
+
+async def schedule_delete(request, pk):
+    """投稿スケジュール削除 (非同期版)"""
+    tweet = await aget_object_or_404(TweetSchedule, pk=pk)
+
+    if request.method == "POST":
+        # 画像があれば削除
+        if tweet.image:
+            await asyncio.to_thread(_remove_file, tweet.image.path)
+
+        await tweet.adelete()
+        messages.success(request, "投稿スケジュールが削除されました。")
+        return redirect("x_scheduler:schedule_list")
+
+    return await arender(
+        request,
+        "x_scheduler/schedule_confirm_delete.html",
+        {
+            "tweet": tweet,
+        },
+    )
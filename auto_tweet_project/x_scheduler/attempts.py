@@ -0,0 +1,151 @@
+"""
+投稿試行ごとのフェーズ別計測
+
+process_scheduled_tweets / auto_post --post-now は1件の投稿を attempts.start() の
+ブロック内で行い、画像ファイルのオープン・画像アップロード・ツイート投稿・DB保存の
+所要時間と、アップロードしたバイト数、最後の HTTP レスポンスのステータスと
+レート制限ヘッダーを PostingAttempt に1行として記録する。
+"""
+
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+from django.utils import timezone
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+# 計測するフェーズ (PostingAttempt の <フェーズ>_seconds フィールドに対応)
+PHASES = ("open_image", "media_upload", "create_tweet", "db_save")
+
+# 実行中の投稿試行 (TwitterAPIClient やレスポンスフックから参照する)
+_current_attempt = contextvars.ContextVar("posting_attempt", default=None)
+
+
+def _to_int(value):
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def file_size(filename, file=None):
+    """アップロードするファイルのサイズを返す (取得できない場合は 0)"""
+    try:
+        if file is not None and hasattr(file, "seek"):
+            position = file.tell()
+            size = file.seek(0, os.SEEK_END)
+            file.seek(position)
+            return size
+        return os.path.getsize(filename)
+    except (OSError, TypeError, ValueError):
+        return 0
+
+
+class AttemptRecorder:
+    """1回の投稿試行のフェーズ別所要時間とレスポンス情報を集める"""
+
+    def __init__(self, source, tweet=None):
+        self.source = source
+        self.tweet = tweet
+        self.started_at = timezone.now()
+        self.timings = {}
+        self.bytes_uploaded = 0
+        self.http_status = None
+        self.rate_limit = {}
+        self.success = False
+        self.error_message = ""
+        self._start = time.monotonic()
+
+    @contextmanager
+    def phase(self, name):
+        """with ブロックの所要時間を指定したフェーズに加算する"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0) + time.monotonic() - start
+
+    def record_response(self, response):
+        """HTTP レスポンスのステータスとレート制限ヘッダーを記録する"""
+        self.http_status = response.status_code
+        headers = response.headers
+        if "x-rate-limit-remaining" in headers:
+            self.rate_limit = {
+                "limit": _to_int(headers.get("x-rate-limit-limit")),
+                "remaining": _to_int(headers.get("x-rate-limit-remaining")),
+                "reset": _to_int(headers.get("x-rate-limit-reset")),
+            }
+
+    def save(self):
+        """計測結果を PostingAttempt に保存する"""
+        from .models import PostingAttempt  # 循環インポート回避
+
+        total = time.monotonic() - self._start
+        try:
+            return PostingAttempt.objects.create(
+                tweet=self.tweet,
+                source=self.source,
+                started_at=self.started_at,
+                success=self.success,
+                error_message=self.error_message or "",
+                total_seconds=total,
+                bytes_uploaded=self.bytes_uploaded,
+                http_status=self.http_status,
+                rate_limit_limit=self.rate_limit.get("limit"),
+                rate_limit_remaining=self.rate_limit.get("remaining"),
+                rate_limit_reset=self.rate_limit.get("reset"),
+                **{f"{name}_seconds": self.timings.get(name) for name in PHASES},
+            )
+        except Exception as e:
+            # 計測結果の保存失敗で投稿処理を止めない
+            logger.error(f"投稿試行の記録中にエラー: {e}")
+            return None
+
+
+@contextmanager
+def start(source, tweet=None):
+    """
+    投稿試行の計測を開始する。ブロックを抜けると PostingAttempt を保存する。
+    成否はブロック内で recorder.success / recorder.error_message に設定する。
+    """
+    recorder = AttemptRecorder(source, tweet)
+    token = _current_attempt.set(recorder)
+    try:
+        yield recorder
+    except Exception as e:
+        recorder.success = False
+        recorder.error_message = recorder.error_message or str(e)
+        raise
+    finally:
+        _current_attempt.reset(token)
+        recorder.save()
+
+
+def current():
+    """実行中の投稿試行を返す (計測中でなければ None)"""
+    return _current_attempt.get()
+
+
+def phase(name):
+    """実行中の投稿試行のフェーズを計測する (計測中でなければ何もしない)"""
+    recorder = _current_attempt.get()
+    return recorder.phase(name) if recorder else nullcontext()
+
+
+def add_bytes_uploaded(size):
+    """実行中の投稿試行にアップロードしたバイト数を加算する"""
+    recorder = _current_attempt.get()
+    if recorder:
+        recorder.bytes_uploaded += size
+
+
+def record_response(response, *args, **kwargs):
+    """requests のレスポンスフックとして、実行中の投稿試行にレスポンス情報を記録する"""
+    recorder = _current_attempt.get()
+    if recorder:
+        recorder.record_response(response)
+    return response
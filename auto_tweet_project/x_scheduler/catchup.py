@@ -0,0 +1,188 @@
+"""
+遅延分の再配置 (キャッチアップ)
+
+Mac のスリープやワーカーの停止で予定時刻を過ぎた予約がたまった場合、次の実行で
+まとめて投稿するとレート制限にかかりやすく、内容も偏る。予定時刻を過ぎた予約が
+CATCHUP_THRESHOLD 件を超えたら、現在時刻から CATCHUP_WINDOW_HOURS 時間の範囲に
+予定時刻を再配置し、以後は通常どおり予定時刻ごとに投稿する。
+
+- 古い予約から順に、範囲の先頭 (現在時刻) から詰めて配置する
+- PEAK_HOURS の時間帯は他の時間帯より密に配置する (PEAK_HOUR_WEIGHT 倍)
+- 各日の投稿上限 (投稿済み数と他の予約を含む、slots.SlotAllocator でアカウントごとに確認) を
+  超える分は翌日以降で枠の空いている日の同じ時刻に延期する
+- 再配置は1回の UPDATE で行い、最初の予定時刻は original_scheduled_time に残す
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db.models import Case, DateTimeField, F, Q, TextField, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .slots import SlotAllocator
+from .wakeup import notify_schedule_changed
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+# ピーク時間帯に配置する密度 (通常の時間帯に対する倍率)
+PEAK_HOUR_WEIGHT = 3
+
+
+def _weighted_segments(start, end, peak_hours):
+    """start〜end を時刻の区切り (正時) で分割し、(開始, 終了, 重み) のリストを返す"""
+    segments = []
+    cursor = start
+    while cursor < end:
+        local = timezone.localtime(cursor)
+        hour_start = local.replace(minute=0, second=0, microsecond=0)
+        segment_end = min(hour_start + timedelta(hours=1), end)
+        weight = PEAK_HOUR_WEIGHT if local.hour in peak_hours else 1
+        segments.append((cursor, segment_end, weight))
+        cursor = segment_end
+    return segments
+
+
+def spread_times(count, start, end, peak_hours=()):
+    """
+    start〜end の範囲に count 件の時刻を配置して返す (先頭は start)。
+    重み付きの時間を等分するため、ピーク時間帯ほど間隔が短くなる。
+    """
+    segments = _weighted_segments(start, end, set(peak_hours))
+    total = sum((e - s).total_seconds() * w for s, e, w in segments)
+    times = []
+    for i in range(count):
+        remaining = total * i / count
+        for segment_start, segment_end, weight in segments:
+            span = (segment_end - segment_start).total_seconds() * weight
+            if remaining < span:
+                times.append(segment_start + timedelta(seconds=remaining / weight))
+                break
+            remaining -= span
+        else:
+            times.append(end)
+    return times
+
+
+def plan_catch_up(now=None, threshold=None, window_hours=None, accounts=None):
+    """
+    予定時刻を過ぎた予約が threshold 件を超えていれば再配置する。
+    accounts を指定した場合は、そのアカウント (None は既定のアカウント) の予約だけを対象にする。
+    戻り値: {"overdue": 対象件数, "spread": 再配置した件数, "deferred": 翌日に延期した件数,
+             "until": 最後の再配置先の時刻}
+    """
+    from .models import TweetSchedule  # 循環インポート回避
+
+    threshold = settings.CATCHUP_THRESHOLD if threshold is None else threshold
+    window_hours = (
+        settings.CATCHUP_WINDOW_HOURS if window_hours is None else window_hours
+    )
+    now = now or timezone.now()
+    result = {"overdue": 0, "spread": 0, "deferred": 0, "until": None}
+    if threshold <= 0:
+        return result
+
+    due = TweetSchedule.objects.filter(status="pending", scheduled_time__lte=now)
+    if accounts is None:
+        # 無効なアカウントの予約は投稿されないため再配置しない
+        due = due.filter(Q(account__isnull=True) | Q(account__is_active=True))
+    else:
+        due = due.filter(
+            reduce(or_, (Q(account=account) for account in accounts), Q(pk__in=[]))
+        )
+    overdue = list(
+        due.select_related("account")
+        .order_by("scheduled_time")
+        .only("id", "scheduled_time", "account__max_daily_posts")
+    )
+    result["overdue"] = len(overdue)
+    if len(overdue) <= threshold:
+        return result
+
+    times = spread_times(
+        len(overdue), now, now + timedelta(hours=window_hours), settings.PEAK_HOURS
+    )
+    # 投稿枠はアカウントごとに数える (再配置する予約自身の枠は数えない)
+    overdue_ids = defaultdict(list)
+    accounts_by_id = {}
+    for tweet in overdue:
+        overdue_ids[tweet.account_id].append(tweet.pk)
+        accounts_by_id[tweet.account_id] = tweet.account
+    allocators = {
+        account_id: SlotAllocator(exclude_ids=ids, account=accounts_by_id[account_id])
+        for account_id, ids in overdue_ids.items()
+    }
+    # 古い予約から順に、その予約のアカウントの投稿枠がある時刻を割り当てる
+    new_times = {}
+    available = []
+    deferred = []
+    unused = list(times)
+    for tweet in overdue:
+        allocator = allocators[tweet.account_id]
+        for index, candidate in enumerate(unused):
+            if allocator.take(candidate):
+                new_times[tweet.pk] = candidate
+                available.append(candidate)
+                del unused[index]
+                break
+        else:
+            deferred.append(tweet)
+    # 枠に入らなかった予約は翌日以降の、枠の空いている日の同じ時刻に延期する
+    reasons = {}
+    for tweet in deferred:
+        allocator = allocators[tweet.account_id]
+        reason = (
+            f"投稿上限（{allocator.limit}）のため、"
+            "遅延分の再配置で翌日以降に延期しました"
+        )
+        reasons[tweet.pk] = reason
+        tweet.defer_to_next_day(reason)
+        # 上限が0のアカウントは枠が空くことがないため、投稿時と同じく翌日に延期する
+        new_times[tweet.pk] = (
+            allocator.allocate(tweet.scheduled_time) or tweet.scheduled_time
+        )
+
+    # 全件を1回の UPDATE で書き換える (SET の右辺は更新前の値を参照する)
+    changes = {
+        "original_scheduled_time": Coalesce(
+            "original_scheduled_time", "scheduled_time"
+        ),
+        "scheduled_time": Case(
+            *[When(pk=pk, then=Value(t)) for pk, t in new_times.items()],
+            output_field=DateTimeField(),
+        ),
+        "updated_at": now,
+    }
+    if deferred:
+        changes["error_message"] = Case(
+            *[When(pk=pk, then=Value(reason)) for pk, reason in reasons.items()],
+            default=F("error_message"),
+            output_field=TextField(),
+        )
+    updated = TweetSchedule.objects.filter(
+        pk__in=list(new_times), status="pending"
+    ).update(**changes)
+    if updated:
+        notify_schedule_changed()
+
+    result.update(
+        spread=len(available),
+        deferred=len(deferred),
+        until=max(available) if available else None,
+    )
+    logger.warning(
+        f"予定時刻を過ぎた予約 {len(overdue)}件を再配置しました: "
+        f"{len(available)}件を {window_hours}時間以内に分散"
+        + (
+            f" (最終 {timezone.localtime(result['until']):%m/%d %H:%M})"
+            if available
+            else ""
+        )
+        + (f", {len(deferred)}件を翌日以降に延期" if deferred else "")
+    )
+    return result
@@ -0,0 +1,192 @@
+"""
+投稿済みツイートの公開指標 (public_metrics) の収集
+
+collect() は投稿から METRICS_COLLECT_DAYS 日以内のツイートの ID を X API v2 の
+ツイート取得 (GET /2/tweets) で 100件ずつまとめて問い合わせ、取得した時点の値を
+EngagementSnapshot に1行ずつ追記する (ツイートごとの API 呼び出しはしない)。
+
+- 前回の取得が古いツイート (未取得のものが最初) から順に問い合わせるため、
+  途中で打ち切っても次回の実行で残りから再開される
+- レート制限はアカウント (ユーザー認証) ごとのため、アカウントごとに LookupGovernor で
+  レスポンスヘッダーの残り回数を追跡し、使い切ったらリセットまで待つか打ち切る
+- 429 (Too Many Requests) を受けた場合もそのアカウントの残りは次回に回す
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from .utils import TwitterAPIClient, account_label
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+# 1回のツイート取得で指定できる ID の上限
+BATCH_SIZE = 100
+
+
+class LookupGovernor:
+    """ツイート取得のレート制限の残り回数をレスポンスヘッダーから追跡する"""
+
+    def __init__(self, max_wait_seconds=0):
+        self.max_wait_seconds = max_wait_seconds
+        self.remaining = None
+        self.reset = None
+
+    def record_response(self, response, *args, **kwargs):
+        """requests のレスポンスフックとして、レート制限ヘッダーを記録する"""
+        headers = response.headers
+        try:
+            if "x-rate-limit-remaining" in headers:
+                self.remaining = int(headers["x-rate-limit-remaining"])
+            if "x-rate-limit-reset" in headers:
+                self.reset = int(headers["x-rate-limit-reset"])
+        except ValueError:
+            pass
+        return response
+
+    def acquire(self):
+        """
+        次のリクエストを送ってよければ True を返す。
+        残り回数を使い切っている場合は、リセットまでが max_wait_seconds 以内なら待ち、
+        それより長ければ False を返す。
+        """
+        if self.remaining != 0:
+            return True
+        wait = (self.reset or 0) - time.time()
+        if wait > self.max_wait_seconds:
+            return False
+        if wait > 0:
+            logger.info(
+                f"ツイート取得のレート制限のリセットまで {wait:.0f}秒待機します"
+            )
+            time.sleep(wait)
+        self.remaining = None
+        return True
+
+
+def _fetch_targets(since, accounts):
+    """
+    収集対象のツイートを (予約の ID, ツイートID) のリストとしてアカウントごとに返す。
+    前回の取得日時が古い順 (未取得のものが最初) に並べる。
+    """
+    from .models import TweetSchedule  # 循環インポート回避
+
+    targets = (
+        TweetSchedule.objects.filter(
+            status="posted", posted_at__gte=since, tweet_id__isnull=False
+        )
+        .exclude(tweet_id="")
+        .filter(Q(account=None) | Q(account__is_active=True))
+    )
+    if accounts is not None:
+        targets = targets.filter(account__in=accounts)
+    targets = targets.annotate(
+        last_collected=Max("engagement_snapshots__collected_at")
+    ).order_by(F("last_collected").asc(nulls_first=True), "posted_at")
+
+    lanes = {}
+    for pk, tweet_id, account_id in targets.values_list("id", "tweet_id", "account_id"):
+        lanes.setdefault(account_id, []).append((pk, tweet_id))
+    return lanes
+
+
+def collect(days=None, max_requests=None, max_wait_seconds=0, accounts=None, now=None):
+    """
+    投稿済みツイートの公開指標を取得して EngagementSnapshot に保存する。
+    戻り値: {"tweets": 対象のツイート数, "requests": API の呼び出し回数,
+             "snapshots": 保存した記録数, "missing": 取得できなかった数 (削除済みなど),
+             "remaining": 打ち切りのため次回に回した数}
+    """
+    import tweepy
+
+    from .models import Account, EngagementSnapshot  # 循環インポート回避
+
+    now = now or timezone.now()
+    days = settings.METRICS_COLLECT_DAYS if days is None else days
+    result = {"tweets": 0, "requests": 0, "snapshots": 0, "missing": 0, "remaining": 0}
+
+    lanes = _fetch_targets(now - timedelta(days=days), accounts)
+    account_objects = Account.objects.in_bulk([pk for pk in lanes if pk is not None])
+
+    for account_id, rows in lanes.items():
+        result["tweets"] += len(rows)
+        account = account_objects.get(account_id)
+        client = TwitterAPIClient(account).client_v2
+        if client is None:
+            logger.error(
+                f"アカウント {account_label(account)} の API v2 クライアントを初期化できないため、"
+                f"{len(rows)}件の取得を次回に回します"
+            )
+            result["remaining"] += len(rows)
+            continue
+
+        governor = LookupGovernor(max_wait_seconds)
+        hooks = client.session.hooks["response"]
+        hooks.append(governor.record_response)
+        try:
+            for start in range(0, len(rows), BATCH_SIZE):
+                if (
+                    max_requests is not None and result["requests"] >= max_requests
+                ) or not governor.acquire():
+                    result["remaining"] += len(rows) - start
+                    break
+                end = start + BATCH_SIZE
+                batch = rows[start:end]
+                result["requests"] += 1
+                try:
+                    response = client.get_tweets(
+                        ids=[tweet_id for _, tweet_id in batch],
+                        tweet_fields=["public_metrics"],
+                        user_auth=True,
+                    )
+                except tweepy.TooManyRequests:
+                    logger.warning(
+                        f"アカウント {account_label(account)} のツイート取得がレート制限に達したため、"
+                        f"残り {len(rows) - start}件は次回に取得します"
+                    )
+                    result["remaining"] += len(rows) - start
+                    break
+                except tweepy.TweepyException as e:
+                    logger.error(
+                        f"アカウント {account_label(account)} のツイート取得中にエラー: {e}"
+                    )
+                    result["remaining"] += len(rows) - start
+                    break
+
+                metrics_by_id = {
+                    str(item["id"]): item["public_metrics"]
+                    for item in response.data or []
+                }
+                snapshots = []
+                for pk, tweet_id in batch:
+                    metrics = metrics_by_id.get(tweet_id)
+                    if metrics is None:
+                        # 削除済み・非公開のツイートは errors に含まれ、data には含まれない
+                        result["missing"] += 1
+                        continue
+                    snapshots.append(
+                        EngagementSnapshot(
+                            tweet_id=pk,
+                            collected_at=now,
+                            **{
+                                field: metrics.get(field) or 0
+                                for field in EngagementSnapshot.METRIC_FIELDS
+                            },
+                        )
+                    )
+                EngagementSnapshot.objects.bulk_create(snapshots)
+                result["snapshots"] += len(snapshots)
+        finally:
+            hooks.remove(governor.record_response)
+
+    logger.info(
+        f"公開指標を {result['snapshots']}件取得しました "
+        f"(API 呼び出し {result['requests']}回, 取得できなかった分 {result['missing']}件, "
+        f"次回に回した分 {result['remaining']}件)"
+    )
+    return result
@@ -0,0 +1,250 @@
+"""
+投稿キューの変更フィード (Server-Sent Events)
+
+TweetSchedule のステータス変化と DailyPostCounter の更新を updated_at を
+カーソルにして差分として取り出し、SSE 形式で配信する。
+updated_at は保存時の時刻のため、コミットが遅れた行はカーソルより前の時刻で現れる。
+取りこぼさないよう毎回 SSE_CURSOR_OVERLAP_SECONDS だけ遡って読み直し、
+配信済みの (行, updated_at) は接続ごとに覚えておいて二重に送らない。
+ASGI では1プロセスにつき1つの ChangeFeed だけが DB をポーリングし、
+接続中のすべてのクライアントへ同じ差分を配信する。
+"""
+
+import asyncio
+import json
+import logging
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import DailyPostCounter, TweetSchedule
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+# 差分がない場合に接続維持のコメントを送る間隔（秒）
+KEEPALIVE_SECONDS = 15
+# 切断時にブラウザが再接続するまでの待ち時間（ミリ秒）
+RETRY_MILLISECONDS = 3000
+
+
+def format_event(event, data, event_id=None):
+    """SSE の1イベント分の文字列を生成する"""
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def schedule_delta(tweet):
+    """TweetSchedule の差分データ"""
+    return {
+        "id": str(tweet.pk),
+        "status": tweet.status,
+        "status_display": tweet.get_status_display(),
+        "error_message": tweet.error_message or "",
+        "updated_at": tweet.updated_at.isoformat(),
+    }
+
+
+def counter_delta(counter):
+    """DailyPostCounter の差分データ"""
+    return {
+        "date": counter.date.isoformat(),
+        "post_count": counter.post_count,
+        "remaining": counter.remaining_posts,
+        "max": counter.limit,
+    }
+
+
+def parse_cursor(value):
+    """Last-Event-ID をカーソル (日時) に変換する。不正な場合は None"""
+    if not value:
+        return None
+    try:
+        cursor = parse_datetime(value)
+    except ValueError:
+        return None
+    if cursor is not None and timezone.is_naive(cursor):
+        cursor = timezone.make_aware(cursor)
+    return cursor
+
+
+def changes_since(cursor, delivered=None):
+    """
+    cursor 以降に更新された予約とカウンターの差分を返す。
+    delivered (配信済みの (種類, ID, updated_at) の集合) を指定した場合は、重なりの範囲で
+    読み直した行のうち配信済みのものを除き、今回の差分を追加する (呼び出し側で使い回す)。
+    戻り値: ([(イベント名, データ), ...], 新しいカーソル)
+    """
+    if delivered is None:
+        delivered = set()
+    overlap = timedelta(seconds=settings.SSE_CURSOR_OVERLAP_SECONDS)
+    since = cursor - overlap
+    changes = []
+    new_cursor = cursor
+    tweets = (
+        TweetSchedule.objects.filter(updated_at__gte=since)
+        .only("id", "status", "error_message", "updated_at")
+        .order_by("updated_at")
+    )
+    for tweet in tweets:
+        key = ("schedule", tweet.pk, tweet.updated_at)
+        if key in delivered:
+            continue
+        delivered.add(key)
+        changes.append(("schedule", schedule_delta(tweet)))
+        new_cursor = max(new_cursor, tweet.updated_at)
+    # 画面のカウンターは既定のアカウントのもの
+    for counter in DailyPostCounter.objects.filter(
+        account=None, updated_at__gte=since
+    ).order_by("updated_at"):
+        key = ("counter", counter.pk, counter.updated_at)
+        if key in delivered:
+            continue
+        delivered.add(key)
+        changes.append(("counter", counter_delta(counter)))
+        new_cursor = max(new_cursor, counter.updated_at)
+    # 次回の読み直しの範囲より前の記録は使われないため捨てる
+    delivered.difference_update(
+        [key for key in delivered if key[2] < new_cursor - overlap]
+    )
+    return changes, new_cursor
+
+
+def initial_events(last_event_id, delivered=None):
+    """
+    接続直後に送る本日のカウンターと、再接続時の取りこぼし分を返す。
+    配信済みの記録は再接続で失われるため、重なりの範囲の差分は再度送られる。
+    """
+    cursor = parse_cursor(last_event_id)
+    if cursor is not None:
+        changes, cursor = changes_since(cursor, delivered)
+    else:
+        changes, cursor = [], timezone.now()
+    counter = DailyPostCounter.objects.filter(
+        account=None, date=timezone.localdate()
+    ).first()
+    if counter is not None:
+        changes.append(("counter", counter_delta(counter)))
+    return changes, cursor
+
+
+def _format_changes(changes, cursor):
+    """差分のリストを SSE 文字列に変換する (最後のイベントにカーソルを付与)"""
+    chunks = []
+    for i, (event, data) in enumerate(changes):
+        event_id = cursor.isoformat() if i == len(changes) - 1 else None
+        chunks.append(format_event(event, data, event_id))
+    return "".join(chunks)
+
+
+class ChangeFeed:
+    """
+    プロセス内で1つだけ DB をポーリングし、購読者のキューへ差分を配信するクラス。
+    購読者がいなくなるとポーリングを停止する。
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.subscribers = set()
+        self._task = None
+        self._loop = None
+
+    def subscribe(self):
+        """購読を開始し、差分を受け取るキューを返す"""
+        queue = asyncio.Queue(maxsize=1000)
+        self.subscribers.add(queue)
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            # タスクの開始を待たずに、購読した時点をカーソルの起点にする
+            self._task = loop.create_task(self._run(timezone.now()))
+        return queue
+
+    def unsubscribe(self, queue):
+        """購読を終了する"""
+        self.subscribers.discard(queue)
+
+    async def _run(self, cursor):
+        logger.debug("変更フィードのポーリングを開始します")
+        delivered = set()
+        try:
+            while self.subscribers:
+                await asyncio.sleep(self.interval)
+                changes, cursor = await sync_to_async(changes_since)(cursor, delivered)
+                if not changes:
+                    continue
+                message = _format_changes(changes, cursor)
+                for queue in list(self.subscribers):
+                    try:
+                        queue.put_nowait(message)
+                    except asyncio.QueueFull:
+                        logger.warning(
+                            "変更フィードの購読者の受信が遅れているため差分を破棄します"
+                        )
+        except Exception as e:
+            logger.error(f"変更フィードのポーリング中にエラー: {e}", exc_info=True)
+        finally:
+            logger.debug("変更フィードのポーリングを停止します")
+
+
+_feed = None
+
+
+def get_feed():
+    """プロセス共通の ChangeFeed を返す"""
+    global _feed
+    if _feed is None:
+        _feed = ChangeFeed(settings.SSE_POLL_INTERVAL_SECONDS)
+    return _feed
+
+
+async def aiter_events(last_event_id=None):
+    """ASGI 用: 共有の変更フィードから SSE を配信する非同期ジェネレーター"""
+    feed = get_feed()
+    queue = feed.subscribe()
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+        changes, cursor = await sync_to_async(initial_events)(last_event_id)
+        if changes:
+            yield _format_changes(changes, cursor)
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield message
+    finally:
+        feed.unsubscribe(queue)
+
+
+def iter_events(last_event_id=None):
+    """
+    WSGI 用: クライアントごとに DB をポーリングする同期ジェネレーター。
+    ワーカーを占有し続けないよう SSE_STREAM_MAX_SECONDS で切断し、再接続させる。
+    """
+    yield f"retry: {RETRY_MILLISECONDS}\n\n"
+    delivered = set()
+    changes, cursor = initial_events(last_event_id, delivered)
+    if changes:
+        yield _format_changes(changes, cursor)
+
+    deadline = time.monotonic() + settings.SSE_STREAM_MAX_SECONDS
+    last_sent = time.monotonic()
+    while time.monotonic() < deadline:
+        time.sleep(settings.SSE_POLL_INTERVAL_SECONDS)
+        changes, cursor = changes_since(cursor, delivered)
+        if changes:
+            yield _format_changes(changes, cursor)
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
@@ -4,7 +4,97 @@ import os
 from django import forms
 from django.utils import timezone
 
-from .models import TweetSchedule
+from .models import Account, TweetSchedule
+from .slots import SlotAllocator
+
+# 添付画像の制限
+MAX_IMAGE_SIZE = 5 * 1024 * 1024  # 5MB
+ALLOWED_IMAGE_EXTENSIONS = ["jpg", "jpeg", "png", "gif"]
+MAX_IMAGE_DIMENSION = 8192  # 縦横それぞれの最大ピクセル数
+
+# 先頭バイト (マジックナンバー) と画像形式の対応
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+)
+
+
+def sniff_image_format(header):
+    """ファイル先頭のバイト列から画像形式を判定する (対応外の場合は None)"""
+    for signature, image_format in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return image_format
+    return None
+
+
+class StreamingImageField(forms.ImageField):
+    """
+    アップロード画像をメモリに読み込まずに検証する ImageField。
+    サイズ → 先頭バイトによる形式判定 → Pillow の遅延オープンによる縦横サイズ確認、
+    の順に安価な検査から行い、不正なファイルは画素データを展開する前に拒否する。
+    """
+
+    def to_python(self, data):
+        f = forms.FileField.to_python(self, data)
+        if f is None:
+            return None
+
+        # アップロードハンドラーが上限超過で書き込みを中止したファイルも含め、サイズを先に確認
+        if getattr(f, "truncated", False) or f.size > MAX_IMAGE_SIZE:
+            raise forms.ValidationError(
+                "画像サイズは5MB以下にしてください。", code="file_too_large"
+            )
+
+        from PIL import Image
+
+        # 一時ファイルがあればパスから開き、なければファイルオブジェクトをそのまま使う
+        if hasattr(f, "temporary_file_path"):
+            source = f.temporary_file_path()
+            with open(source, "rb") as fp:
+                header = fp.read(16)
+        else:
+            source = f
+            f.seek(0)
+            header = f.read(16)
+            f.seek(0)
+
+        image_format = sniff_image_format(header)
+        if image_format is None:
+            raise forms.ValidationError(
+                "対応している画像形式は、jpg、jpeg、png、gifのみです。",
+                code="invalid_image",
+            )
+
+        try:
+            # open() はヘッダーのみを読み、画素データは展開しない
+            image = Image.open(source)
+            width, height = image.size
+            if width > MAX_IMAGE_DIMENSION or height > MAX_IMAGE_DIMENSION:
+                raise forms.ValidationError(
+                    f"画像の縦横は{MAX_IMAGE_DIMENSION}ピクセル以下にしてください。",
+                    code="image_too_large",
+                )
+            # verify() はデコードせずにファイル構造の破損を検出する
+            image.verify()
+        except forms.ValidationError:
+            raise
+        except Exception as exc:
+            raise forms.ValidationError(
+                self.error_messages["invalid_image"], code="invalid_image"
+            ) from exc
+
+        if image.format != image_format:
+            raise forms.ValidationError(
+                self.error_messages["invalid_image"], code="invalid_image"
+            )
+
+        f.image = image
+        f.content_type = Image.MIME.get(image.format)
+        if hasattr(f, "seek") and callable(f.seek):
+            f.seek(0)
+        return f
 
 
 class TweetScheduleForm(forms.ModelForm):
@@ -21,7 +111,9 @@ class TweetScheduleForm(forms.ModelForm):
 
     class Meta:
         model = TweetSchedule
-        fields = ["content", "image", "scheduled_time"]
+        # 投稿枠の確認 (clean_scheduled_time) でアカウントを使うため、先に検証する
+        fields = ["account", "content", "image", "scheduled_time"]
+        field_classes = {"image": StreamingImageField}
         widgets = {
             "content": forms.Textarea(
                 attrs={
@@ -34,8 +126,16 @@ class TweetScheduleForm(forms.ModelForm):
             "image": forms.FileInput(
                 attrs={"class": "form-control", "accept": "image/*"}
             ),
+            "account": forms.Select(attrs={"class": "form-select"}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 選べるのは有効なアカウントだけ (未選択は既定のアカウント)
+        account_field = self.fields["account"]
+        account_field.queryset = Account.objects.filter(is_active=True)
+        account_field.empty_label = "既定のアカウント"
+
     def clean_scheduled_time(self):
         """予定時刻のバリデーション"""
         scheduled_time = self.cleaned_data.get("scheduled_time")
@@ -44,6 +144,24 @@ class TweetScheduleForm(forms.ModelForm):
         if scheduled_time and scheduled_time < timezone.now():
             raise forms.ValidationError("過去の時間は設定できません。")
 
+        # その日の投稿枠が残っていることを確認 (編集中の予約自身は数えない)
+        if scheduled_time:
+            allocator = SlotAllocator(
+                exclude_ids=[self.instance.pk], account=self.cleaned_data.get("account")
+            )
+            if not allocator.take(scheduled_time):
+                next_free = allocator.next_free(scheduled_time)
+                suggestion = (
+                    f"空いている日: {timezone.localtime(next_free):%Y-%m-%d %H:%M}"
+                    if next_free
+                    else "投稿上限の設定を確認してください。"
+                )
+                raise forms.ValidationError(
+                    f"{timezone.localdate(scheduled_time):%Y-%m-%d} は1日の投稿上限"
+                    f"（{allocator.limit}件）まで予約済みです。{suggestion}",
+                    code="daily_limit",
+                )
+
         return scheduled_time
 
     def clean_image(self):
@@ -51,15 +169,64 @@ class TweetScheduleForm(forms.ModelForm):
         image = self.cleaned_data.get("image")
         if image:
             # 画像サイズが5MB以下であることを確認
-            if image.size > 5 * 1024 * 1024:
+            if image.size > MAX_IMAGE_SIZE:
                 raise forms.ValidationError("画像サイズは5MB以下にしてください。")
 
             # 拡張子の確認
-            allowed_extensions = ["jpg", "jpeg", "png", "gif"]
             ext = image.name.split(".")[-1].lower()
-            if ext not in allowed_extensions:
+            if ext not in ALLOWED_IMAGE_EXTENSIONS:
                 raise forms.ValidationError(
                     "対応している画像形式は、jpg、jpeg、png、gifのみです。"
                 )
 
         return image
+
+
+class ScheduleImportForm(forms.Form):
+    """投稿スケジュール一括インポート用フォーム"""
+
+    FORMAT_CHOICES = (
+        ("auto", "自動判定（拡張子）"),
+        ("csv", "CSV"),
+        ("jsonl", "JSONL"),
+    )
+
+    file = forms.FileField(
+        label="インポートファイル",
+        widget=forms.FileInput(
+            attrs={"class": "form-control", "accept": ".csv,.jsonl,.ndjson"}
+        ),
+    )
+    format = forms.ChoiceField(
+        label="形式",
+        choices=FORMAT_CHOICES,
+        initial="auto",
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    dry_run = forms.BooleanField(
+        label="検証のみ（登録しない）",
+        required=False,
+        widget=forms.CheckboxInput(attrs={"class": "form-check-input"}),
+    )
+    spill_over = forms.BooleanField(
+        label="1日の投稿上限を超える行は、枠の空いている日の同じ時刻に登録する",
+        required=False,
+        widget=forms.CheckboxInput(attrs={"class": "form-check-input"}),
+    )
+
+    def clean(self):
+        """形式の自動判定"""
+        cleaned_data = super().clean()
+        upload = cleaned_data.get("file")
+        fmt = cleaned_data.get("format")
+        if upload and fmt == "auto":
+            # 循環インポート回避
+            from .importers import detect_format
+
+            detected = detect_format(upload.name)
+            if detected is None:
+                raise forms.ValidationError(
+                    "ファイル形式を判定できません。形式を選択してください。"
+                )
+            cleaned_data["format"] = detected
+        return cleaned_data
@@ -0,0 +1,145 @@
+"""
+X API の接続確認 (ヘルスチェック) の結果のキャッシュ
+
+接続確認 (TwitterAPIClient.test_connection) は verify_credentials と get_me の2回の通信を行う。
+process_tweets / auto_post は最後に確認できた結果を SystemSetting (キー: api_health) に
+JSON で保存し、次の場合だけ接続確認を行う。
+
+- 成功の記録がない、または API_HEALTH_TTL_SECONDS を過ぎている
+- 直近の接続確認・投稿が失敗している
+
+投稿の成功は接続できている証拠として成功を記録するため、通常の運用では接続確認は行われない。
+結果はアカウントごとに記録する (既定のアカウント以外のキーは api_health:<アカウント名>)。
+"""
+
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+HEALTH_SETTING_KEY = "api_health"
+
+
+def setting_key(account=None):
+    """account (None は既定のアカウント) の結果を保存する SystemSetting のキー"""
+    if account is None:
+        return HEALTH_SETTING_KEY
+    return f"{HEALTH_SETTING_KEY}:{account.name}"
+
+
+def load(account=None):
+    """保存されている接続確認の結果を返す (未記録・読み取れない場合は None)"""
+    from .models import SystemSetting  # 循環インポート回避
+
+    raw = SystemSetting.get_value(setting_key(account))
+    if not raw:
+        return None
+    try:
+        state = json.loads(raw)
+        state["checked_at"] = parse_datetime(state["checked_at"])
+    except (ValueError, KeyError, TypeError):
+        logger.warning(f"接続確認の記録を読み取れません: {raw[:100]}")
+        return None
+    if state["checked_at"] is None:
+        return None
+    return state
+
+
+def _save(state, account=None):
+    from .models import SystemSetting  # 循環インポート回避
+
+    key = setting_key(account)
+    value = json.dumps(state, ensure_ascii=False)
+    # 投稿のたびに呼ばれるため、既存の行は1回の UPDATE で更新する
+    updated = SystemSetting.objects.filter(key=key).update(
+        value=value, updated_at=timezone.now()
+    )
+    if not updated:
+        SystemSetting.set_value(
+            key,
+            value,
+            "X API の接続確認の結果 (process_tweets / auto_post が更新)",
+        )
+
+
+def record_success(user_id=None, source="probe", account=None):
+    """接続できたことを記録する (source: probe=接続確認, post=投稿の成功)"""
+    previous = load(account) or {}
+    _save(
+        {
+            "ok": True,
+            "checked_at": timezone.now().isoformat(),
+            # 投稿の成功では利用者 ID が分からないため、前回の値を引き継ぐ
+            "user_id": str(user_id) if user_id else previous.get("user_id"),
+            "source": source,
+            "error": "",
+        },
+        account,
+    )
+
+
+def record_failure(error, source="probe", account=None):
+    """接続確認・投稿の失敗を記録する (次回の実行で接続確認が行われる)"""
+    previous = load(account) or {}
+    _save(
+        {
+            "ok": False,
+            "checked_at": timezone.now().isoformat(),
+            "user_id": previous.get("user_id"),
+            "source": source,
+            "error": str(error)[:500],
+        },
+        account,
+    )
+
+
+def is_fresh(state, now=None):
+    """成功の記録が有効期限内か"""
+    if not state or not state.get("ok"):
+        return False
+    now = now or timezone.now()
+    ttl = timedelta(seconds=settings.API_HEALTH_TTL_SECONDS)
+    return now - state["checked_at"] < ttl
+
+
+def needs_probe(now=None, account=None):
+    """接続確認が必要か (理由をログに出力する)"""
+    state = load(account)
+    if state is None:
+        logger.info("接続確認の記録がないため、API接続テストを実行します。")
+        return True
+    checked_at = timezone.localtime(state["checked_at"])
+    if not state.get("ok"):
+        logger.info(
+            f"前回 ({checked_at:%m/%d %H:%M}) の接続確認・投稿が失敗しているため、"
+            "API接続テストを実行します。"
+        )
+        return True
+    if not is_fresh(state, now):
+        logger.info(
+            f"前回の接続確認 ({checked_at:%m/%d %H:%M}) から有効期限を過ぎたため、"
+            "API接続テストを実行します。"
+        )
+        return True
+    logger.info(
+        f"{checked_at:%m/%d %H:%M} に接続を確認済みのため、API接続テストはスキップします。"
+        f"(確認方法: {'投稿' if state.get('source') == 'post' else '接続テスト'})"
+    )
+    return False
+
+
+def probe(api_client):
+    """接続確認を行い、結果を記録して返す"""
+    account = api_client.account
+    result = api_client.test_connection()
+    if result["success"]:
+        record_success(result.get("user_id"), source="probe", account=account)
+    else:
+        record_failure(result["error"], source="probe", account=account)
+    return result
@@ -0,0 +1,257 @@
+"""
+投稿スケジュールの一括インポート処理
+
+CSV / JSONL を1行ずつ読み込みながら検証し、検証済みの行を
+``bulk_create`` でバッチ単位に登録する。
+"""
+
+import codecs
+import csv
+import json
+import logging
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .forms import ALLOWED_IMAGE_EXTENSIONS, MAX_IMAGE_SIZE
+from .models import TweetSchedule
+from .slots import SlotAllocator
+from .wakeup import notify_schedule_changed
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ("csv", "jsonl")
+DEFAULT_BATCH_SIZE = 500
+# 1日の投稿上限を超える行の扱い (reject: エラーにする, spill: 枠の空いている日に回す)
+OVERFLOW_CHOICES = ("reject", "spill")
+
+
+class ImportRowError(Exception):
+    """インポート対象の1行が不正な場合に送出される例外"""
+
+
+def is_utf8(chunks):
+    """
+    バイト列のチャンクがすべて UTF-8 (BOM 付きを含む) として読めるかを返す。
+    途中で読めない行があると、それまでのバッチが登録された状態で止まるため、登録の前に確認する。
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    try:
+        for chunk in chunks:
+            decoder.decode(chunk)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def detect_format(filename):
+    """ファイル名の拡張子からインポート形式を判定する (不明な場合は None)"""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    return None
+
+
+class ScheduleImporter:
+    """
+    CSV / JSONL 形式の投稿スケジュールをストリーミングで取り込むクラス。
+    各行は content, scheduled_time, image (任意) の項目を持つ。
+    account (Account) を指定した場合は、すべての行をそのアカウントの予約として登録する。
+    """
+
+    def __init__(
+        self,
+        batch_size=DEFAULT_BATCH_SIZE,
+        image_base_dir=None,
+        dry_run=False,
+        overflow="reject",
+        account=None,
+    ):
+        if overflow not in OVERFLOW_CHOICES:
+            raise ValueError(f"未対応の上限超過時の扱いです: {overflow}")
+        self.batch_size = batch_size
+        # 画像パスの相対指定は MEDIA_ROOT を基準に解決する
+        self.image_base_dir = str(image_base_dir or settings.MEDIA_ROOT)
+        self.dry_run = dry_run
+        self.overflow = overflow
+        self.account = account
+        self.content_max_length = TweetSchedule._meta.get_field("content").max_length
+
+    def iter_rows(self, lines, fmt):
+        """テキスト行のイテラブルから (行番号, 行データ) を順に返す"""
+        if fmt == "csv":
+            reader = csv.DictReader(lines)
+            for row in reader:
+                yield reader.line_num, row
+        elif fmt == "jsonl":
+            for line_no, line in enumerate(lines, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, ImportRowError(f"JSONの解析に失敗しました: {e.msg}")
+                    continue
+                if not isinstance(row, dict):
+                    yield line_no, ImportRowError(
+                        "各行はJSONオブジェクトである必要があります。"
+                    )
+                    continue
+                yield line_no, row
+        else:
+            raise ValueError(f"未対応のインポート形式です: {fmt}")
+
+    def _resolve_image_path(self, image_value):
+        """画像パスを検証し、絶対パスを返す"""
+        image_path = image_value
+        if not os.path.isabs(image_path):
+            image_path = os.path.join(self.image_base_dir, image_path)
+
+        ext = os.path.splitext(image_path)[1].lstrip(".").lower()
+        if ext not in ALLOWED_IMAGE_EXTENSIONS:
+            raise ImportRowError(
+                "対応している画像形式は、jpg、jpeg、png、gifのみです。"
+            )
+        try:
+            size = os.path.getsize(image_path)
+        except OSError:
+            raise ImportRowError(f"画像ファイルが見つかりません: {image_value}")
+        if size > MAX_IMAGE_SIZE:
+            raise ImportRowError("画像サイズは5MB以下にしてください。")
+        return image_path
+
+    def _text_value(self, row, key):
+        """項目の値を前後の空白を除いた文字列で返す (JSONL で文字列以外の値はエラー)"""
+        value = row.get(key)
+        if value is None:
+            return ""
+        if not isinstance(value, str):
+            raise ImportRowError(f"{key} は文字列で指定してください。")
+        return value.strip()
+
+    def validate_row(self, row, now):
+        """1行分のデータを検証し、未保存の TweetSchedule と画像パスを返す"""
+        content = self._text_value(row, "content")
+        if not content:
+            raise ImportRowError("投稿内容が空です。")
+        if len(content) > self.content_max_length:
+            raise ImportRowError(
+                f"投稿内容は{self.content_max_length}文字以内にしてください。"
+            )
+
+        raw_time = self._text_value(row, "scheduled_time")
+        if not raw_time:
+            raise ImportRowError("予定時刻が指定されていません。")
+        try:
+            scheduled_time = parse_datetime(raw_time)
+        except ValueError:
+            scheduled_time = None
+        if scheduled_time is None:
+            raise ImportRowError(f"予定時刻の形式が不正です: {raw_time}")
+        if timezone.is_naive(scheduled_time):
+            scheduled_time = timezone.make_aware(scheduled_time)
+        if scheduled_time < now:
+            raise ImportRowError("過去の時間は設定できません。")
+
+        image_path = None
+        image_value = self._text_value(row, "image")
+        if image_value:
+            image_path = self._resolve_image_path(image_value)
+
+        tweet = TweetSchedule(
+            account=self.account, content=content, scheduled_time=scheduled_time
+        )
+        return tweet, image_path
+
+    def assign_slot(self, tweet, allocator, result):
+        """1日の投稿上限を確認し、上限を超える行はエラーにするか枠の空いている日に回す"""
+        if allocator.take(tweet.scheduled_time):
+            return
+        day = timezone.localdate(tweet.scheduled_time)
+        if self.overflow == "spill":
+            scheduled_time = allocator.allocate(tweet.scheduled_time)
+            if scheduled_time is not None:
+                tweet.reschedule(scheduled_time)
+                result["spilled"] += 1
+                return
+        raise ImportRowError(
+            f"{day:%Y-%m-%d} は1日の投稿上限（{allocator.limit}件）まで予約済みです。"
+        )
+
+    def _flush(self, batch, result):
+        """検証済みのバッチを1トランザクションで登録する"""
+        if not batch:
+            return
+        if self.dry_run:
+            result["created"] += len(batch)
+            return
+
+        saved_files = []
+        try:
+            for _, tweet, image_path in batch:
+                if image_path:
+                    with open(image_path, "rb") as image_file:
+                        tweet.image.save(
+                            os.path.basename(image_path), File(image_file), save=False
+                        )
+                    saved_files.append(tweet.image.name)
+            with transaction.atomic():
+                TweetSchedule.objects.bulk_create(
+                    [tweet for _, tweet, _ in batch], batch_size=self.batch_size
+                )
+                # bulk_create はシグナルを送らないため、ディスパッチャーへ明示的に通知する
+                notify_schedule_changed()
+            result["created"] += len(batch)
+        except Exception as e:
+            logger.error(f"バッチ登録中にエラーが発生しました: {e}", exc_info=True)
+            # 登録できなかったバッチのコピー済み画像は削除する
+            storage = TweetSchedule._meta.get_field("image").storage
+            for name in saved_files:
+                storage.delete(name)
+            for line_no, _, _ in batch:
+                result["errors"].append((line_no, f"登録に失敗しました: {e}"))
+
+    def run(self, lines, fmt):
+        """
+        インポートを実行し、結果を辞書で返す。
+        戻り値: {"total": 件数, "created": 登録件数, "spilled": 別の日に回した件数,
+                 "errors": [(行番号, メッセージ), ...]}
+        """
+        result = {"total": 0, "created": 0, "spilled": 0, "errors": []}
+        now = timezone.now()
+        # 日ごとの予約数は最初の1回だけ集計し、以降は行ごとに手元で数える
+        allocator = SlotAllocator(account=self.account)
+        batch = []
+
+        for line_no, row in self.iter_rows(lines, fmt):
+            result["total"] += 1
+            try:
+                if isinstance(row, ImportRowError):
+                    raise row
+                tweet, image_path = self.validate_row(row, now)
+                self.assign_slot(tweet, allocator, result)
+            except ImportRowError as e:
+                result["errors"].append((line_no, str(e)))
+                continue
+
+            batch.append((line_no, tweet, image_path))
+            if len(batch) >= self.batch_size:
+                self._flush(batch, result)
+                batch = []
+
+        self._flush(batch, result)
+        result["errors"].sort()
+        logger.info(
+            f"スケジュールのインポートが完了しました: 全{result['total']}件, "
+            f"登録{result['created']}件 (別の日に回した行 {result['spilled']}件), "
+            f"エラー{len(result['errors'])}件"
+        )
+        return result
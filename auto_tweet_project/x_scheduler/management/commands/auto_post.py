@@ -1,14 +1,21 @@
 import glob
 import logging
 import os
-from pathlib import Path
+from datetime import datetime
 
 from django.conf import settings
 from django.core.files import File
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from django.utils import timezone
-from x_scheduler.models import DailyPostCounter, SystemSetting, TweetSchedule
+from x_scheduler import attempts, health
+from x_scheduler.analytics import PostingTimeRecommender
+from x_scheduler.management.profiling import ProfilingCommandMixin
+from x_scheduler.metrics import registry
+from x_scheduler.models import Account, DailyPostCounter, SystemSetting, TweetSchedule
+from x_scheduler.slots import SlotAllocator
 from x_scheduler.utils import TwitterAPIClient
+from x_scheduler.wakeup import notify_schedule_changed
 
 # ロガーの設定 (settings.py の設定を使用するように修正)
 logger = logging.getLogger(__name__)  # or logger = logging.getLogger('x_scheduler')
@@ -22,7 +29,7 @@ def extract_number(filename):
     return int(match.group(1)) if match else 0
 
 
-class Command(BaseCommand):
+class Command(ProfilingCommandMixin, BaseCommand):
     help = "指定されたテキストと画像を使って自動投稿を作成する"
 
     def add_arguments(self, parser):
@@ -62,11 +69,36 @@ class Command(BaseCommand):
         parser.add_argument(
             "--peak-hour",
             action="store_true",
-            help="ピーク時間帯（6時、12時、18時）の処理であることを示す",
+            help=f"ピーク時間帯（PEAK_HOURS: {'、'.join(f'{hour}時' for hour in settings.PEAK_HOURS)}）"
+            "の処理であることを示す",
+        )
+        parser.add_argument(
+            "--slots",
+            type=int,
+            default=None,
+            help="一括作成するスケジュール数（--interval 分間隔で本日中に配置）",
+        )
+        parser.add_argument(
+            "--until",
+            type=str,
+            default=None,
+            help="一括作成の終了時刻（HH:MM）。--slots 省略時はこの時刻までの枠をすべて作成",
+        )
+        parser.add_argument(
+            "--no-best-time",
+            action="store_true",
+            help="--slots で枠を選ぶときに、エンゲージメントの履歴による投稿時刻のおすすめを使わない"
+            "（常に現在時刻に近い枠から作成する）",
+        )
+        parser.add_argument(
+            "--account",
+            type=str,
+            default=None,
+            help="投稿・予約に使うアカウント名（省略時は既定のアカウント）",
         )
 
-    def _select_next_image(self, image_dir_path):
-        """指定されたディレクトリから次に使用する画像を選択し、パスと番号を返す。"""
+    def _list_catalog_images(self, image_dir_path):
+        """指定されたディレクトリの画像ファイルを番号順に並べて返す。"""
         # 画像ファイルのリストを取得（数字順にソート）
         image_files = sorted(glob.glob(os.path.join(image_dir_path, "image_*.png")))
         image_files.extend(
@@ -76,16 +108,23 @@ class Command(BaseCommand):
             sorted(glob.glob(os.path.join(image_dir_path, "image_*.jpeg")))
         )
 
-        if not image_files:
-            logger.warning(f"画像が見つかりません: {image_dir_path}")
-            return None, -1
-
         # 画像ファイルを番号でソート
         try:
             image_files = sorted(image_files, key=extract_number)
         except Exception as e:
             logger.error(f"画像ファイル名の数値抽出またはソート中にエラー: {e}")
-            pass
+
+        return image_files
+
+    def _select_next_images(self, image_dir_path, count):
+        """
+        指定されたディレクトリから次に使用する画像を count 枚選択し、
+        (パス, 番号) のリストを返す。最後の画像の次は最初の画像に戻る。
+        """
+        image_files = self._list_catalog_images(image_dir_path)
+        if not image_files:
+            logger.warning(f"画像が見つかりません: {image_dir_path}")
+            return []
 
         # 最後に使用した画像の番号を取得
         last_index_str = SystemSetting.get_value(
@@ -101,15 +140,12 @@ class Command(BaseCommand):
 
         logger.info(f"最後に使用した画像番号: {last_index}")
 
-        # 次の画像を選択
-        next_image_path = None
-        selected_image_number = -1
-        for image_file_path in image_files:
+        # 次の画像の位置を探す
+        start_position = None
+        for position, image_file_path in enumerate(image_files):
             try:
-                current_number = extract_number(image_file_path)
-                if current_number > last_index:
-                    next_image_path = image_file_path
-                    selected_image_number = current_number
+                if extract_number(image_file_path) > last_index:
+                    start_position = position
                     break
             except Exception as e:
                 logger.warning(
@@ -118,78 +154,213 @@ class Command(BaseCommand):
                 continue
 
         # 最後まで到達した場合は最初に戻る
-        if next_image_path is None:
-            if image_files:
-                next_image_path = image_files[0]
-                try:
-                    selected_image_number = extract_number(image_files[0])
+        if start_position is None:
+            start_position = 0
+            logger.info(
+                f"最後の画像まで使用したため、最初に戻ります: {os.path.basename(image_files[0])}"
+            )
+
+        selected = []
+        for offset in range(count):
+            image_file_path = image_files[(start_position + offset) % len(image_files)]
+            try:
+                selected_image_number = extract_number(image_file_path)
+            except Exception as e:
+                logger.error(
+                    f"画像の数値抽出エラー: {os.path.basename(image_file_path)}, {e}"
+                )
+                selected_image_number = -1
+            selected.append((image_file_path, selected_image_number))
+
+        return selected
+
+    def _select_next_image(self, image_dir_path):
+        """指定されたディレクトリから次に使用する画像を選択し、パスと番号を返す。"""
+        selected = self._select_next_images(image_dir_path, 1)
+        if not selected:
+            return None, -1
+        return selected[0]
+
+    def _resolve_until(self, now, until):
+        """--until (HH:MM) を本日の日時に変換する。省略時は本日の終わり。"""
+        local_now = timezone.localtime(now)
+        if until is None:
+            return local_now.replace(hour=23, minute=59, second=59, microsecond=0)
+        try:
+            until_time = datetime.strptime(until, "%H:%M").time()
+        except ValueError:
+            raise CommandError(f"--until は HH:MM 形式で指定してください: {until}")
+        return local_now.replace(
+            hour=until_time.hour, minute=until_time.minute, second=0, microsecond=0
+        )
+
+    def _create_batch_schedules(
+        self, text, image_dir, interval_minutes, slots, until, best_time=True
+    ):
+        """
+        複数の投稿枠を1回で計算し、まとめてスケジュールを作成する。
+        --slots の数より候補の枠が多い場合は、エンゲージメントの履歴から
+        反応の良い時間帯の枠を選ぶ (履歴が足りなければ現在時刻に近い枠から)。
+        """
+        if interval_minutes <= 0:
+            raise CommandError("--interval には1以上の値を指定してください。")
+        if slots is not None and slots <= 0:
+            raise CommandError("--slots には1以上の値を指定してください。")
+
+        now = timezone.now()
+        end_time = self._resolve_until(now, until)
+        if end_time <= now:
+            raise CommandError(f"--until の時刻はすでに過ぎています: {until}")
+
+        # 投稿枠の計算 (現在時刻から interval 分ごと、end_time まで)
+        interval = timezone.timedelta(minutes=interval_minutes)
+        slot_times = []
+        slot_time = now + interval
+        while slot_time <= end_time:
+            slot_times.append(slot_time)
+            slot_time += interval
+        if slots is not None and len(slot_times) > slots:
+            if best_time:
+                recommender = PostingTimeRecommender(account=self.account, now=now)
+                slot_times = recommender.choose(slot_times, slots)
+                if recommender.available:
                     logger.info(
-                        f"最後の画像まで使用したため、最初に戻ります: {os.path.basename(next_image_path)}"
+                        "エンゲージメントの履歴から投稿枠を選びました: "
+                        + ", ".join(f"{timezone.localtime(t):%H:%M}" for t in slot_times)
                     )
-                except Exception as e:
-                    logger.error(
-                        f"最初の画像の数値抽出エラー: {os.path.basename(image_files[0])}, {e}"
-                    )
-                    selected_image_number = -1
             else:
-                logger.error("画像選択中に予期せず画像リストが空になりました")
-                return None, -1
+                slot_times = slot_times[:slots]
 
-        return next_image_path, selected_image_number
+        # 各日の残り投稿枠 (投稿済み + 作成済みの予約を差し引く) に収まる枠だけを作成する
+        allocator = SlotAllocator(account=self.account)
+        requested_count = len(slot_times)
+        slot_times = [slot_time for slot_time in slot_times if allocator.take(slot_time)]
+        if len(slot_times) < requested_count:
+            logger.warning(
+                f"1日の投稿上限（{allocator.limit}）を考慮し、"
+                f"作成数を {requested_count} 件から {len(slot_times)} 件に減らします。"
+            )
+        if not slot_times:
+            logger.warning("作成可能な投稿枠がないため、処理を終了します。")
+            return 0
+
+        # 画像ディレクトリから使用する画像をまとめて選択
+        image_dir_path = os.path.join(settings.MEDIA_ROOT, image_dir)
+        if not os.path.exists(image_dir_path):
+            os.makedirs(image_dir_path)
+            logger.info(f"画像ディレクトリを作成しました: {image_dir_path}")
+        selected_images = self._select_next_images(image_dir_path, len(slot_times))
+        if not selected_images:
+            logger.error("使用する画像が見つからなかったため、処理を終了します。")
+            return 0
+
+        tweets = []
+        saved_image_names = []
+        try:
+            for scheduled_time, (image_path, _) in zip(slot_times, selected_images):
+                # 一括作成分は process_tweets で投稿されるよう pending とする
+                tweet = TweetSchedule(
+                    account=self.account,
+                    content=text,
+                    scheduled_time=scheduled_time,
+                    status="pending",
+                )
+                with open(image_path, "rb") as image_file:
+                    relative_image_path = os.path.join(
+                        image_dir, os.path.basename(image_path)
+                    )
+                    tweet.image.save(relative_image_path, File(image_file), save=False)
+                saved_image_names.append(tweet.image.name)
+                tweets.append(tweet)
+
+            last_image_path, last_image_number = selected_images[-1]
+            with transaction.atomic():
+                TweetSchedule.objects.bulk_create(tweets)
+                # bulk_create はシグナルを送らないため、ディスパッチャーへ明示的に通知する
+                notify_schedule_changed()
+                SystemSetting.set_value(
+                    "last_image_index",
+                    str(last_image_number),
+                    f"auto_post一括作成による更新 ({os.path.basename(last_image_path)})",
+                )
+        except Exception as e:
+            logger.error(f"スケジュールの一括作成中にエラー: {e}", exc_info=True)
+            # 保存に失敗した場合はコピー済みの画像を削除する
+            storage = TweetSchedule._meta.get_field("image").storage
+            for name in saved_image_names:
+                storage.delete(name)
+            return 0
+
+        logger.info(
+            f"投稿スケジュールを一括作成しました: {len(tweets)}件 "
+            f"({tweets[0].scheduled_time} 〜 {tweets[-1].scheduled_time})"
+        )
+        return len(tweets)
 
     def handle(self, *args, **options):
+        try:
+            with registry.timer("x_scheduler_auto_post_duration_seconds"):
+                self._run(options)
+        finally:
+            # 計測値はプロセス終了前に DB へ反映する
+            registry.flush()
+
+    def _run(self, options):
         text = options["text"]
         image_dir = options["image_dir"]
         post_now = options["post_now"]
         interval_minutes = options["interval"]
         skip_api_test = options["skip_api_test"]
         force_api_test = options["force_api_test"]
+        slots = options["slots"]
+        until = options["until"]
+        self.account = None
+        if options["account"]:
+            try:
+                self.account = Account.objects.get(name=options["account"], is_active=True)
+            except Account.DoesNotExist:
+                raise CommandError(f"有効なアカウントが見つかりません: {options['account']}")
+
+        # 一括作成モード (--slots / --until): スケジュール作成のみのため API は使用しない
+        if slots is not None or until is not None:
+            if post_now:
+                raise CommandError("--slots / --until は --post-now と同時に指定できません。")
+            created_count = self._create_batch_schedules(
+                text,
+                image_dir,
+                interval_minutes,
+                slots,
+                until,
+                best_time=not options["no_best_time"],
+            )
+            logger.info(f"auto_post コマンドの実行を終了します。(一括作成: {created_count}件)")
+            return
 
         # APIクライアントをインスタンス化
-        api_client = TwitterAPIClient()
+        api_client = TwitterAPIClient(self.account)
         if not api_client.api_v1 or not api_client.client_v2:
             logger.error("APIクライアントの初期化に失敗しました。処理を中断します。")
             return
 
         # API接続テストの処理 (api_client.test_connection を使用)
         if force_api_test or (not skip_api_test):
-            now_test = timezone.now()  # APIテスト用の時刻取得
-            today_str = now_test.date().isoformat()
-            last_test_date = SystemSetting.get_value("api_test_last_date")
-            already_tested_today = last_test_date == today_str
-
-            if not already_tested_today:
+            # 直近の接続確認・投稿の成功が有効期限内であれば省略する (--force-api-test で常に実行)
+            if force_api_test or health.needs_probe(account=self.account):
                 logger.info("API接続テストを実行しています...")
-                test_result = (
-                    api_client.test_connection()
-                )  # 修正: クラスのメソッドを使用
+                test_result = health.probe(api_client)
                 if test_result["success"]:
-                    # APIテスト成功時の処理 (変更なし)
-                    hour = now_test.hour
-                    time_of_day = (
-                        "morning"
-                        if 5 <= hour < 12
-                        else "afternoon" if 12 <= hour < 18 else "evening"
-                    )
-                    SystemSetting.set_value("api_test_last_date", today_str)
-                    SystemSetting.set_value("api_test_last_time_of_day", time_of_day)
-                    logger.info(f"API接続テスト成功")
+                    logger.info("API接続テスト成功")
                 else:
                     logger.error(f'API接続テスト失敗: {test_result["error"]}')
                     return  # APIテスト失敗時は終了
-            else:
-                logger.info(
-                    "今日はすでにAPI接続テストが完了しています。スキップします。"
-                )
         else:
             logger.info("API接続テストはスキップされました。")
 
         # 投稿数制限のチェック (変更なし)
-        counter = DailyPostCounter.get_today_counter()
+        counter = DailyPostCounter.get_today_counter(self.account)
         if counter.is_limit_reached:
-            # 修正: settings定数を参照
             logger.warning(
-                f"本日の投稿上限（{settings.MAX_DAILY_POSTS_PER_USER}）に達しました。投稿をスキップします。"
+                f"本日の投稿上限（{counter.limit}）に達しました。投稿をスキップします。"
             )
             return
 
@@ -222,11 +393,24 @@ class Command(BaseCommand):
                 f"スケジュール投稿モード: 予定時刻 = {scheduled_time} (現在時刻から{interval_minutes}分後)"
             )
 
+        # その日の投稿枠 (投稿済み + 作成済みの予約を差し引く) が残っていなければ作成しない
+        # (一括作成モードと同じく SlotAllocator で数え、投稿時の延期に頼らない)
+        allocator = SlotAllocator(account=self.account)
+        if not allocator.take(scheduled_time):
+            logger.warning(
+                f"{timezone.localdate(scheduled_time)} の投稿枠が残っていないため"
+                f"（1日の投稿上限: {allocator.limit}）、予約を作成せずに終了します。"
+            )
+            return
+
         # Determine initial status based on post_now
-        initial_status = 'pending' if post_now else 'scheduled'
+        # 即時投稿は投稿が終わるまで投稿中にしておく (待機中で保存すると、保存の通知を受けた
+        # ディスパッチャーや cron の process_tweets が同じ予約を二重に投稿するため)
+        initial_status = 'posting' if post_now else 'scheduled'
 
         # TweetScheduleオブジェクト作成 (status を設定)
         tweet = TweetSchedule(
+            account=self.account,
             content=text,
             scheduled_time=scheduled_time,
             status=initial_status # Set initial status
@@ -260,69 +444,105 @@ class Command(BaseCommand):
             # DB保存に失敗した場合、続行できないので終了
             return
 
+        # スケジュールのみの場合は、次回別の画像が選ばれるよう画像番号を更新
+        if not post_now:
+            SystemSetting.set_value(
+                "last_image_index",
+                str(selected_image_number),
+                f"auto_postスケジュール作成による更新 ({os.path.basename(next_image_path)})",
+            )
+            logger.info(f"最後に使用した画像番号を {selected_image_number} に更新しました。")
+
         # 即時投稿(--post-now)の場合の処理
         if post_now:
+            # 投稿の前に投稿枠を予約する (事前チェック後に他のプロセスが枠を使った場合に備える)
+            quota_date = DailyPostCounter.reserve(account=self.account)
+            if quota_date is None:
+                tweet.defer_to_next_day(
+                    f"本日の投稿上限（{counter.limit}）に達したため翌日に延期しました"
+                )
+                tweet.status = "pending"  # 翌日に process_tweets が投稿する
+                tweet.save()
+                logger.warning(
+                    f"本日の投稿上限に達したため、投稿を翌日に延期しました: ID={tweet.id}, Scheduled={tweet.scheduled_time}"
+                )
+                return
             logger.info(f"即時投稿処理を開始します: {tweet.id}")
-            try:
-                # APIクライアントを使って実際に投稿
-                with open(next_image_path, "rb") as image_file_for_upload: # 再度ファイルを開く
-                    logger.info(f"画像ファイルを開きます(投稿用): {next_image_path}")
-                    # API経由で投稿
-                    post_result = api_client.post_tweet_with_media(
-                        text=tweet.content, media_file=image_file_for_upload
-                    )
-
-                # 投稿成功時の処理
-                if post_result["success"]:
-                    tweet.status = "posted"
-                    tweet.posted_at = timezone.now()
-                    tweet.tweet_id = post_result.get("tweet_id") # tweet_idを取得して保存
-                    # --- 成功時の更新処理 ---
-                    # 1. DailyPostCounter をインクリメント
-                    counter.increment_post_count()
-                    logger.info(f"本日の投稿数をインクリメントしました。")
-                    # 2. SystemSetting の last_image_index を更新
-                    SystemSetting.set_value( # Update last index only on success
-                        "last_image_index",
-                        str(selected_image_number),
-                        f"auto_post成功による更新 ({os.path.basename(next_image_path)})",
-                    )
-                    logger.info(f"最後に使用した画像番号を {selected_image_number} に更新しました。")
-                    # 3. TweetSchedule のステータス等を保存
-                    tweet.save()
-                    logger.info(
-                        f"ツイート投稿成功: ID={tweet.id}, TweetID={tweet.tweet_id}"
-                    )
-                    logger.info(f"投稿に成功しました！今日の投稿数: {counter.post_count}/{settings.MAX_DAILY_POSTS_PER_USER}")
-
-                # 投稿失敗時の処理
-                else:
-                    error_message = post_result.get("error", "不明なエラー")
+            # 投稿試行をフェーズ別に計測し、PostingAttempt に記録する
+            with attempts.start("auto_post", tweet) as attempt:
+                try:
+                    # APIクライアントを使って実際に投稿
+                    with attempts.phase("open_image"):
+                        image_file_for_upload = open(next_image_path, "rb")  # 再度ファイルを開く
+                    with image_file_for_upload:
+                        logger.info(f"画像ファイルを開きます(投稿用): {next_image_path}")
+                        # API経由で画像をアップロードしてから投稿
+                        media = api_client.upload_media(
+                            filename=next_image_path, file=image_file_for_upload
+                        )
+                        post_result = api_client.post_tweet(
+                            text=tweet.content, media_ids=[media.media_id]
+                        )
+
+                    # 投稿成功時の処理
+                    if post_result["success"]:
+                        tweet.mark_posted()
+                        tweet.tweet_id = post_result.get("tweet_id") # tweet_idを取得して保存
+                        # --- 成功時の更新処理 ---
+                        # 1. DailyPostCounter は投稿前の予約で加算済み
+                        # 2. SystemSetting の last_image_index を更新
+                        SystemSetting.set_value( # Update last index only on success
+                            "last_image_index",
+                            str(selected_image_number),
+                            f"auto_post成功による更新 ({os.path.basename(next_image_path)})",
+                        )
+                        logger.info(f"最後に使用した画像番号を {selected_image_number} に更新しました。")
+                        # 3. TweetSchedule のステータス等を保存
+                        with attempts.phase("db_save"):
+                            tweet.save()
+                        # 4. 投稿の成功を接続確認の代わりに記録する
+                        health.record_success(source="post", account=self.account)
+                        attempt.success = True
+                        logger.info(
+                            f"ツイート投稿成功: ID={tweet.id}, TweetID={tweet.tweet_id}"
+                        )
+                        counter.refresh_from_db()
+                        logger.info(f"投稿に成功しました！今日の投稿数: {counter.post_count}/{counter.limit}")
+
+                    # 投稿失敗時の処理
+                    else:
+                        error_message = post_result.get("error", "不明なエラー")
+                        tweet.status = "failed"
+                        tweet.error_message = f"Tweet posting error (API): {error_message}" # Indicate API error
+                        # --- 失敗時の処理 ---
+                        # 予約した投稿枠を返却し、画像インデックスは更新しない
+                        DailyPostCounter.release(quota_date, account=self.account)
+                        with attempts.phase("db_save"):
+                            tweet.save() # エラーステータスを保存
+                        attempt.error_message = tweet.error_message
+                        # 次回の実行で接続確認を行わせる
+                        health.record_failure(error_message, source="post", account=self.account)
+                        logger.error(
+                            f"ツイート投稿失敗 (API): {tweet.id}, Error: {tweet.error_message}"
+                        )
+                        # 失敗を記録して終了
+
+                # 即時投稿時の try ブロックに対する一般的な Exception ハンドリング
+                except Exception as e:
+                    # 予期せぬエラーが発生した場合
+                    error_message = str(e)
                     tweet.status = "failed"
-                    tweet.error_message = f"Tweet posting error (API): {error_message}" # Indicate API error
+                    # traceback を含めると詳細がわかる
+                    import traceback
+                    tb_str = traceback.format_exc()
+                    tweet.error_message = f"Unexpected error during post: {error_message}\n{tb_str}"
                     # --- 失敗時の処理 ---
-                    # カウンター、画像インデックスは更新しない
+                    # 予約した投稿枠を返却し、画像インデックスは更新しない
+                    DailyPostCounter.release(quota_date, account=self.account)
                     tweet.save() # エラーステータスを保存
-                    logger.error(
-                        f"ツイート投稿失敗 (API): {tweet.id}, Error: {tweet.error_message}"
-                    )
+                    attempt.error_message = f"Unexpected error during post: {error_message}"
+                    logger.error(f"即時投稿中に予期せぬエラー: {tweet.id}, Error: {error_message}", exc_info=True)
                     # 失敗を記録して終了
 
-            # 即時投稿時の try ブロックに対する一般的な Exception ハンドリング
-            except Exception as e:
-                # 予期せぬエラーが発生した場合
-                error_message = str(e)
-                tweet.status = "failed"
-                # traceback を含めると詳細がわかる
-                import traceback
-                tb_str = traceback.format_exc()
-                tweet.error_message = f"Unexpected error during post: {error_message}
-{tb_str}"
-                # --- 失敗時の処理 ---
-                # カウンター、画像インデックスは更新しない
-                tweet.save() # エラーステータスを保存
-                logger.error(f"即時投稿中に予期せぬエラー: {tweet.id}, Error: {error_message}", exc_info=True)
-                # 失敗を記録して終了
-
         # コマンド終了ログ
         logger.info("auto_post コマンドの実行を終了します。")
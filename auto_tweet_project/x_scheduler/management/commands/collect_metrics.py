@@ -0,0 +1,79 @@
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from x_scheduler.engagement import BATCH_SIZE, collect
+from x_scheduler.management.profiling import ProfilingCommandMixin
+from x_scheduler.models import Account
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+
+class Command(ProfilingCommandMixin, BaseCommand):
+    help = f"投稿済みツイートの公開指標（いいね・表示回数など）を {BATCH_SIZE}件ずつまとめて取得して記録する"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=None,
+            help=f"投稿から何日以内のツイートを対象にするか（省略時は {settings.METRICS_COLLECT_DAYS}）",
+        )
+        parser.add_argument(
+            "--max-requests",
+            type=int,
+            default=None,
+            help="この実行での API の呼び出し回数の上限（残りは次回の実行で取得する）",
+        )
+        parser.add_argument(
+            "--max-wait",
+            type=int,
+            default=0,
+            help="レート制限の残り回数を使い切った場合に、リセットまで待つ最大秒数"
+            "（これより長ければ打ち切る。既定: 0）",
+        )
+        parser.add_argument(
+            "--account",
+            type=str,
+            default=None,
+            help="このアカウント名のツイートだけを対象にする",
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] is not None and options["days"] <= 0:
+            raise CommandError("--days には1以上の値を指定してください。")
+        if options["max_requests"] is not None and options["max_requests"] <= 0:
+            raise CommandError("--max-requests には1以上の値を指定してください。")
+
+        accounts = None
+        if options["account"]:
+            try:
+                accounts = [
+                    Account.objects.get(name=options["account"], is_active=True)
+                ]
+            except Account.DoesNotExist:
+                raise CommandError(
+                    f"有効なアカウントが見つかりません: {options['account']}"
+                )
+
+        result = collect(
+            days=options["days"],
+            max_requests=options["max_requests"],
+            max_wait_seconds=max(options["max_wait"], 0),
+            accounts=accounts,
+        )
+        self.stdout.write(
+            f"ツイート {result['tweets']}件の公開指標を {result['snapshots']}件記録しました"
+            f" (API 呼び出し {result['requests']}回)"
+            + (
+                f" 取得できなかった分 {result['missing']}件"
+                if result["missing"]
+                else ""
+            )
+            + (
+                f" 次回に回した分 {result['remaining']}件"
+                if result["remaining"]
+                else ""
+            )
+        )
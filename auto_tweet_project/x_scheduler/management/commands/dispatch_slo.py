@@ -0,0 +1,60 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from x_scheduler.slo import PERCENTILES, dispatch_lag_report
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "投稿遅延 (予定時刻から投稿まで) のパーセンタイルを集計し、SLO 違反を報告する"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=7, help="集計対象の日数（本日を含む）"
+        )
+        parser.add_argument(
+            "--by",
+            choices=("day", "hour"),
+            default="day",
+            help="集計単位（day: 日別, hour: 時間帯別）",
+        )
+        parser.add_argument(
+            "--fail-on-breach",
+            action="store_true",
+            help="SLO 違反がある場合に終了コード1で終了する（cron からの通知用）",
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] <= 0:
+            raise CommandError("--days には1以上の値を指定してください。")
+
+        report = dispatch_lag_report(days=options["days"], by=options["by"])
+        if not report["groups"]:
+            self.stdout.write("集計対象の投稿がありません。")
+            return
+
+        self.stdout.write(
+            f"SLO: p{report['percentile']} ≦ {report['threshold_seconds']:.0f}秒 (単位: 秒)"
+        )
+        header = ["区分", "件数"] + [f"p{p}" for p in PERCENTILES] + ["最大", "判定"]
+        self.stdout.write("\t".join(header))
+        for group in report["groups"]:
+            key = group["key"] if options["by"] == "day" else f"{group['key']}時"
+            row = [key, str(group["count"])]
+            row += [f"{group[f'p{p}']:.0f}" for p in PERCENTILES]
+            row += [f"{group['max']:.0f}", "違反" if group["breach"] else "OK"]
+            self.stdout.write("\t".join(row))
+
+        if report["breaches"]:
+            message = (
+                f"投稿遅延の SLO 違反 (p{report['percentile']} > "
+                f"{report['threshold_seconds']:.0f}秒): {', '.join(report['breaches'])}"
+            )
+            logger.warning(message)
+            if options["fail_on_breach"]:
+                raise CommandError(message)
+            self.stderr.write(message)
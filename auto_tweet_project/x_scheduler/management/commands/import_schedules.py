@@ -0,0 +1,107 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from x_scheduler.importers import (
+    DEFAULT_BATCH_SIZE,
+    OVERFLOW_CHOICES,
+    SUPPORTED_FORMATS,
+    ScheduleImporter,
+    detect_format,
+    is_utf8,
+)
+from x_scheduler.management.profiling import ProfilingCommandMixin
+from x_scheduler.models import Account
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+
+class Command(ProfilingCommandMixin, BaseCommand):
+    help = "CSV/JSONL ファイルから投稿スケジュールを一括登録する"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=str, help="インポートするファイルのパス")
+        parser.add_argument(
+            "--format",
+            choices=SUPPORTED_FORMATS,
+            default=None,
+            help="ファイル形式（省略時は拡張子から判定）",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="1トランザクションで登録する件数",
+        )
+        parser.add_argument(
+            "--image-base-dir",
+            type=str,
+            default=None,
+            help="相対指定された画像パスの基準ディレクトリ（省略時は MEDIA_ROOT）",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="検証のみ行い、登録はしない",
+        )
+        parser.add_argument(
+            "--account",
+            type=str,
+            default=None,
+            help="登録する予約のアカウント名（省略時は既定のアカウント）",
+        )
+        parser.add_argument(
+            "--overflow",
+            choices=OVERFLOW_CHOICES,
+            default="reject",
+            help="1日の投稿上限を超える行の扱い（reject: エラーにする, spill: 枠の空いている日の同じ時刻に登録する）",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or detect_format(path)
+        if fmt is None:
+            raise CommandError(
+                f"ファイル形式を判定できません: {path} (--format を指定してください)"
+            )
+        if options["batch_size"] <= 0:
+            raise CommandError("--batch-size には1以上の値を指定してください。")
+
+        account = None
+        if options["account"]:
+            try:
+                account = Account.objects.get(name=options["account"])
+            except Account.DoesNotExist:
+                raise CommandError(f"アカウントが見つかりません: {options['account']}")
+
+        importer = ScheduleImporter(
+            batch_size=options["batch_size"],
+            image_base_dir=options["image_base_dir"],
+            dry_run=options["dry_run"],
+            overflow=options["overflow"],
+            account=account,
+        )
+
+        logger.info(f"スケジュールのインポートを開始します: {path} (形式: {fmt})")
+        try:
+            # 途中の行で読めずに一部だけ登録されないよう、先にファイル全体の文字コードを確認する
+            with open(path, "rb") as f:
+                if not is_utf8(iter(lambda: f.read(64 * 1024), b"")):
+                    raise CommandError("ファイルは UTF-8 で保存してください。")
+            # utf-8-sig で BOM 付きファイルにも対応
+            with open(path, encoding="utf-8-sig", newline="") as f:
+                result = importer.run(f, fmt)
+        except OSError as e:
+            raise CommandError(f"ファイルを開けません: {e}")
+
+        for line_no, message in result["errors"]:
+            self.stderr.write(f"{line_no}行目: {message}")
+
+        label = "検証OK" if options["dry_run"] else "登録"
+        spilled = (
+            f" (別の日に回した行 {result['spilled']}件)" if result["spilled"] else ""
+        )
+        self.stdout.write(
+            f"全{result['total']}件中 {label}{result['created']}件{spilled}, "
+            f"エラー{len(result['errors'])}件"
+        )
@@ -0,0 +1,38 @@
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from x_scheduler.management.profiling import ProfilingCommandMixin
+from x_scheduler.recurrence import materialize
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+
+class Command(ProfilingCommandMixin, BaseCommand):
+    help = "先読み期間に入った繰り返しパターンの予約を作成する"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--horizon-hours",
+            type=float,
+            default=None,
+            help=f"予約を作成しておく先読み期間（時間、省略時は {settings.RECURRENCE_HORIZON_HOURS}）",
+        )
+
+    def handle(self, *args, **options):
+        horizon_hours = options["horizon_hours"]
+        if horizon_hours is not None and horizon_hours <= 0:
+            raise CommandError("--horizon-hours には0より大きい値を指定してください。")
+
+        result = materialize(horizon_hours=horizon_hours)
+        skipped = result["skipped_past"] + result["skipped_limit"]
+        self.stdout.write(
+            f"繰り返しパターン {result['patterns']}件から予約を {result['created']}件作成しました"
+            + (
+                f" (作成しなかった分 {skipped}件: 予定時刻超過 {result['skipped_past']}件,"
+                f" 投稿上限 {result['skipped_limit']}件)"
+                if skipped
+                else ""
+            )
+        )
@@ -0,0 +1,82 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from x_scheduler.attempts import PHASES
+from x_scheduler.metrics import percentile
+from x_scheduler.models import PostingAttempt
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 99)
+
+
+def _ms(value):
+    return "-" if value is None else f"{value * 1000:.0f}"
+
+
+class Command(BaseCommand):
+    help = "投稿試行の所要時間を日別・時間帯別のパーセンタイルで集計する"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=7, help="集計対象の日数（本日を含む）"
+        )
+        parser.add_argument(
+            "--by",
+            choices=("day", "hour"),
+            default="day",
+            help="集計単位（day: 日別, hour: 時間帯別）",
+        )
+        parser.add_argument(
+            "--source",
+            type=str,
+            default=None,
+            help="実行元で絞り込む（process_tweets / auto_post）",
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] <= 0:
+            raise CommandError("--days には1以上の値を指定してください。")
+
+        since = timezone.localtime().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        ) - timezone.timedelta(days=options["days"] - 1)
+        attempts = PostingAttempt.objects.filter(started_at__gte=since)
+        if options["source"]:
+            attempts = attempts.filter(source=options["source"])
+
+        fields = ["total_seconds"] + [f"{name}_seconds" for name in PHASES]
+        groups = {}
+        for row in attempts.values("started_at", "success", *fields).iterator():
+            local = timezone.localtime(row["started_at"])
+            if options["by"] == "day":
+                key = local.strftime("%Y-%m-%d")
+            else:
+                key = f"{local.hour:02d}時"
+            group = groups.setdefault(
+                key, {"count": 0, "success": 0, **{field: [] for field in fields}}
+            )
+            group["count"] += 1
+            group["success"] += int(row["success"])
+            for field in fields:
+                if row[field] is not None:
+                    group[field].append(row[field])
+
+        if not groups:
+            self.stdout.write("集計対象の投稿試行がありません。")
+            return
+
+        header = ["区分", "件数", "成功率"]
+        header += [f"合計p{p}" for p in PERCENTILES]
+        header += [f"{name} p90" for name in PHASES]
+        self.stdout.write("\t".join(header) + "\t(単位: ミリ秒)")
+        for key in sorted(groups):
+            group = groups[key]
+            for field in fields:
+                group[field].sort()
+            row = [key, str(group["count"]), f"{group['success'] / group['count']:.0%}"]
+            row += [_ms(percentile(group["total_seconds"], p)) for p in PERCENTILES]
+            row += [_ms(percentile(group[f"{name}_seconds"], 90)) for name in PHASES]
+            self.stdout.write("\t".join(row))
@@ -1,18 +1,33 @@
-from x_scheduler.utils import process_scheduled_tweets, TwitterAPIClient
+from x_scheduler import health
+from x_scheduler.catchup import plan_catch_up
+from x_scheduler.metrics import registry
+from x_scheduler.recurrence import materialize
+from x_scheduler.utils import (
+    RunBudget,
+    TwitterAPIClient,
+    account_label,
+    process_scheduled_tweets,
+)
 from django.conf import settings
+from django.db.models import Q
 import logging
 import time
 # import datetime # 未使用
 # import os # 未使用
-from x_scheduler.models import TweetSchedule, DailyPostCounter, SystemSetting
+from x_scheduler.models import Account, TweetSchedule, DailyPostCounter
 from django.utils import timezone
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from x_scheduler.management.profiling import ProfilingCommandMixin
 
 # ロガーの設定
 logger = logging.getLogger(__name__)
 
 
-class Command(BaseCommand):
+class ApiConnectionTestAborted(Exception):
+    """--abort-on-error の指定時に API 接続テストが失敗した"""
+
+
+class Command(ProfilingCommandMixin, BaseCommand):
     help = "待機中の予定時刻を過ぎたツイートを投稿する"
 
     def add_arguments(self, parser):
@@ -22,7 +37,8 @@ class Command(BaseCommand):
         parser.add_argument(
             "--abort-on-error",
             action="store_true",
-            help="API接続テストに失敗した場合に処理を中止する",
+            help="API接続テストに失敗した場合に、他のアカウントを含めて処理全体を中止する"
+            "（省略時は失敗したアカウントの予約だけを次回の実行に持ち越す）",
         )
         parser.add_argument(
             "--max-retries",
@@ -33,7 +49,9 @@ class Command(BaseCommand):
         parser.add_argument(
             "--peak-hour",
             action="store_true",
-            help="ピーク時間帯（6時、12時、18時）に実行する場合のフラグ",
+            help=f"ピーク時間帯（PEAK_HOURS: {'、'.join(f'{hour}時' for hour in settings.PEAK_HOURS)}）"
+            "に実行する場合のフラグ"
+            "（互換性のために受け付ける。API接続テストの要否は接続確認の有効期限で判定する）",
         )
         parser.add_argument(
             "--force-api-test",
@@ -41,35 +59,68 @@ class Command(BaseCommand):
             help="API接続テストを強制的に実行する",
         )
         parser.add_argument(
-            "--max-posts", type=int, default=None, help="この実行で処理する最大投稿数"
+            "--max-posts",
+            type=int,
+            default=None,
+            help="この実行で投稿を試みる最大件数（残りは次回の実行に持ち越す）",
+        )
+        parser.add_argument(
+            "--deadline",
+            type=float,
+            default=None,
+            help="この実行の開始からの秒数。過ぎたら新しい予約に手を付けず、残りは次回の実行に持ち越す",
+        )
+        parser.add_argument(
+            "--account",
+            type=str,
+            default=None,
+            help="このアカウント名の予約だけを処理する（省略時はすべてのアカウント。"
+            "アカウントごとに別のプロセスで並行して実行できる）",
+        )
+        parser.add_argument(
+            "--no-catch-up",
+            action="store_true",
+            help="予定時刻を過ぎた予約が多い場合の再配置を行わず、すべて投稿する",
         )
 
+    def _probe_account(self, options, api_client):
+        """
+        予約のあるアカウントごとに呼ばれ、必要であれば API 接続テストを行う。
+        戻り値: このアカウントの予約を投稿してよいか。
+        --abort-on-error の指定時に失敗した場合は、ApiConnectionTestAborted を送出して実行全体を中止する。
+        """
+        account = api_client.account
+        # 直近の接続確認・投稿の成功が有効期限内であれば省略する
+        if options["skip_api_test"] or (
+            not options["force_api_test"]
+            and not health.needs_probe(timezone.now(), account=account)
+        ):
+            logger.info(f"API接続テストはスキップします。(アカウント: {account_label(account)})")
+            return True
+        if not api_client.api_v1 or not api_client.client_v2:
+            logger.error(
+                f"APIクライアントの初期化に失敗しました。(アカウント: {account_label(account)})"
+            )
+            connected = False
+        else:
+            connected = self._perform_api_connection_test(options, api_client)
+        if not connected and options["abort_on_error"]:
+            raise ApiConnectionTestAborted()
+        return connected
+
     def _perform_api_connection_test(self, options, api_client):
         """API接続テストを実行し、成功/失敗を返す。APIクライアントを受け取るように変更。"""
         max_retries = options['max_retries']
-        abort_on_error = options['abort_on_error']
         # peak_hour = options['peak_hour'] # 未使用のためコメントアウト
         retry_count = 0
         
         logger.info("API接続テストを実行します。")
         while retry_count <= max_retries:
             try:
-                # 修正: 引数で受け取った api_client のメソッドを使用
-                test_result = api_client.test_connection()
+                # 接続確認の結果は health に記録され、有効期限内の実行では接続確認を省略する
+                test_result = health.probe(api_client)
                 if test_result["success"]:
                     logger.info("X APIに正常に接続できました。")
-                    today_str = timezone.now().date().isoformat()
-                    hour = timezone.now().hour
-                    time_of_day = (
-                        "morning"
-                        if 5 <= hour < 12
-                        else "afternoon" if 12 <= hour < 18 else "evening"
-                    )
-                    SystemSetting.set_value("api_test_last_date", today_str)
-                    SystemSetting.set_value("api_test_last_time_of_day", time_of_day)
-                    logger.info(
-                        f"API接続テスト実行済みとしてマーク: {today_str} ({time_of_day})"
-                    )
                     return True  # 接続成功
                 else:
                     # エラーメッセージは test_connection 内でログ出力されるはず
@@ -97,141 +148,132 @@ class Command(BaseCommand):
                     time.sleep(5 * retry_count)
 
         # ループ終了後 (失敗時)
-        if abort_on_error:
-            logger.error(
-                "API接続テストに失敗し、abort-on-errorが指定されているため処理を中止します。"
-            )
-            return False  # 接続失敗 (処理中止)
-        else:
-            logger.warning("API接続テストに失敗しましたが、処理を続行します。")
-            return True  # 接続失敗だが処理は続行
+        logger.warning(
+            f"API接続テストに失敗したため、このアカウント ({account_label(api_client.account)}) "
+            "の予約は次回の実行に持ち越します。"
+        )
+        return False
 
     def handle(self, *args, **options):
+        for name in ("max_posts", "deadline"):
+            if options[name] is not None and options[name] <= 0:
+                raise CommandError(
+                    f"--{name.replace('_', '-')} には0より大きい値を指定してください。"
+                )
+        self.account = None
+        if options["account"]:
+            try:
+                self.account = Account.objects.get(name=options["account"], is_active=True)
+            except Account.DoesNotExist:
+                raise CommandError(f"有効なアカウントが見つかりません: {options['account']}")
+        # 所要時間の上限はコマンドの開始 (API 接続テストを含む) から数える
+        self.budget = RunBudget(
+            max_posts=options["max_posts"], deadline_seconds=options["deadline"]
+        )
+        try:
+            with registry.timer("x_scheduler_process_tweets_duration_seconds"):
+                self._process(options)
+        finally:
+            # 計測値はプロセス終了前に DB へ反映する
+            registry.flush()
+
+    def _all_due_accounts_at_limit(self, pending_tweets, counter):
+        """
+        予定時刻を過ぎた予約のあるアカウントが、すべて本日の投稿上限に達しているかを返す。
+        counter は self.account (未指定なら既定のアカウント) のカウンター。
+        """
+        if self.account is not None:
+            return counter.is_limit_reached
+        account_ids = set(
+            pending_tweets.order_by().values_list("account", flat=True).distinct()
+        )
+        if None in account_ids and not counter.is_limit_reached:
+            return False
+        return all(
+            DailyPostCounter.get_today_counter(account).is_limit_reached
+            for account in Account.objects.filter(pk__in=account_ids - {None})
+        )
+
+    def _process(self, options):
         try:
-            skip_api_test = options['skip_api_test']
             # abort_on_error = options['abort_on_error'] # _perform_api_connection_test に渡されるが、このスコープでは未使用
             force_api_test = options['force_api_test']
-            peak_hour = options['peak_hour'] # APIテスト判定ロジックで必要
-            # max_posts = options.get('max_posts') # 現状未使用のためコメントアウト
-            
-            # APIクライアントをインスタンス化
-            api_client = TwitterAPIClient()
-            if not api_client.api_v1 or not api_client.client_v2:
-                logger.error(
-                    "APIクライアントの初期化に失敗しました。処理を中断します。"
-                )
-                return
 
             # --- APIキーログ出力 (削除) ---
             # logger.info(f"APIキー: {settings.X_API_KEY[:5]}... (最初の5文字のみ表示)")
 
-            # --- API接続テストの要否判定 --- (変更なし)
             now = timezone.now()
-            today_str = now.date().isoformat()
-            hour = now.hour
-            current_time_of_day = (
-                "morning"
-                if 5 <= hour < 12
-                else "afternoon" if 12 <= hour < 18 else "evening"
-            )
+            # --- 繰り返しパターンの予約の作成 ---
+            # 先読み期間に入った分だけを作成する (作成する分がなければクエリ1回)
+            materialize(now)
+
+            # 無効なアカウントの予約は投稿されないため数えない (process_scheduled_tweets と同じ条件)
             pending_tweets = TweetSchedule.objects.filter(
-                status="pending", scheduled_time__lte=now
+                Q(account=None) | Q(account__is_active=True),
+                status="pending",
+                scheduled_time__lte=now,
             )
-            pending_count = pending_tweets.count()
-            logger.info(f"処理対象のツイート数(テスト判定前): {pending_count}")
-            if pending_count == 0 and not force_api_test:
+            if self.account is not None:
+                pending_tweets = pending_tweets.filter(account=self.account)
+            # --account を指定した場合はそのアカウントの予約だけを処理する
+            accounts = [self.account] if self.account is not None else None
+            # 件数は process_scheduled_tweets 側で数えるため、ここでは有無だけを確認する
+            has_pending = pending_tweets.exists()
+            logger.info(f"処理対象のツイート(テスト判定前): {'あり' if has_pending else 'なし'}")
+            if not has_pending:
+                if force_api_test:
+                    # 処理対象がなくても、指定されたアカウント (未指定なら既定のアカウント) の接続を確認する
+                    self._probe_account(options, TwitterAPIClient(self.account))
+                    return
+                # 何もすることがない実行では API クライアントを生成しない (tweepy の import も行わない)
                 logger.info(
-                    "処理対象ツイートがなく、強制実行もないためAPI接続テストをスキップします"
+                    "処理対象ツイートがなく、強制実行もないため処理を終了します"
                 )
-                skip_api_test = True
-            last_test_date = SystemSetting.get_value("api_test_last_date")
-            already_tested_today = last_test_date == today_str
-            last_time_of_day = SystemSetting.get_value("api_test_last_time_of_day", "")
-            peak_hour_tested = (
-                already_tested_today and current_time_of_day == last_time_of_day
-            )
-            if already_tested_today:
-                logger.info(
-                    f"本日はすでにAPI接続テストを実施済みです。最後にテストした時間帯: {last_time_of_day}"
-                )
-            should_skip_test = skip_api_test or (
-                already_tested_today and (not peak_hour or peak_hour_tested)
-            )
+                return
 
-            # --- API接続テスト実行 --- (変更: api_client を渡す)
-            if not should_skip_test:
-                if not self._perform_api_connection_test(options, api_client):
-                    return  # テスト失敗 and abort の場合
-            else:
-                logger.info("API接続テストはスキップします。")
+            # --- 遅延分の再配置 ---
+            # スリープ明けなどで予定時刻を過ぎた予約がたまっていれば、まとめて投稿せずに分散させる
+            if has_pending and not options["no_catch_up"]:
+                plan_catch_up(now, accounts=accounts)
 
-            # --- 投稿数制限チェック --- (変更なし)
-            counter = DailyPostCounter.get_today_counter()
-            if counter.is_limit_reached:
+            # --- 投稿数制限チェック ---
+            # 投稿枠の予約は process_scheduled_tweets がアカウントごと・1件ごとに行う。
+            # 予約のあるすべてのアカウントが上限に達していれば、API の初期化・接続テストを
+            # 行わず、予約の延期だけを行う。
+            counter = DailyPostCounter.get_today_counter(self.account)
+            if has_pending and self._all_due_accounts_at_limit(pending_tweets, counter):
                 logger.warning(
-                    f"本日の投稿上限（{settings.MAX_DAILY_POSTS_PER_USER}）に達しています。残り投稿数: {counter.remaining_posts}"
-                )
-            else:
-                logger.info(
-                    f"本日の投稿数: {counter.post_count}/{settings.MAX_DAILY_POSTS_PER_USER}, 残り: {counter.remaining_posts}"
+                    "予約のあるすべてのアカウントが本日の投稿上限に達しています。"
+                    "処理対象のツイートは翌日に延期します。"
                 )
+                process_scheduled_tweets(budget=self.budget, accounts=accounts)
+                return
+            logger.info(
+                f"本日の投稿数: {counter.post_count}/{counter.limit}, 残り: {counter.remaining_posts}"
+            )
 
             # --- ツイート処理実行 ---
             logger.info("スケジュールされたツイートを処理します")
-
-            # process_scheduled_tweets は内部で再度クエリ＆APIクライアント初期化を行うため、
-            # ここでの追加のフィルタリングやAPIクライアントの受け渡しは不要。
-            # ただし、投稿制限の事前チェックは有効。
-            available_posts = counter.remaining_posts
-            if available_posts <= 0:
-                logger.warning(
-                    "本日の投稿可能数が0のため、ツイート処理をスキップします。"
-                )
-                return
-            else:
-                logger.info(f"本日の残り投稿可能数: {available_posts}")
-                # process_scheduled_tweets 側で最終的な投稿数制限がかかることに注意。
-
-            # utils.process_scheduled_tweets を呼び出す (これは内部で TwitterAPIClient を使う)
-            processed_count = process_scheduled_tweets()
-
-            # 投稿カウントを更新 (utils側でやったので不要？ いや、DailyPostCounter の更新はこちらでやるべきか)
-            # → DailyPostCounter の更新は utils 側ではなく、呼び出し側 (コマンド) の責務とする方が良い。
-            #   utils.process_scheduled_tweets は純粋にツイート処理に専念する。
-            #   ただし、現状の utils.process_scheduled_tweets は成功カウントを返すだけなので、
-            #   どのツイートが成功したかの情報がない。これを改善する必要がある。
-            #
-            #   一旦、現状の動作を維持し、戻り値の件数だけカウントアップする。
-            #   (リファクタリングの余地あり)
-            if processed_count > 0:
-                logger.info(
-                    f"utils.process_scheduled_tweets が {processed_count} 件の処理を報告しました。カウンターを更新します。"
-                )
-                # DailyPostCounter を最新の状態にする
-                counter = DailyPostCounter.get_today_counter()
-                initial_count = counter.post_count
-                target_count = min(
-                    initial_count + processed_count, settings.MAX_DAILY_POSTS_PER_USER
-                )
-                incremented = 0
-                # 実際にカウントを増やす (上限を超えないように)
-                for _ in range(target_count - initial_count):
-                    counter.increment_count()
-                    incremented += 1
-
-                if incremented > 0:
-                    # counter = DailyPostCounter.get_today_counter() # DBから再取得して確認
-                    logger.info(
-                        f"投稿カウンターを {incremented} 件増加させました。現在の投稿数: {counter.post_count}/{settings.MAX_DAILY_POSTS_PER_USER}"
-                    )
-                else:
-                    logger.info(
-                        "投稿カウンターの増加はありませんでした（既に上限 or 処理件数0）。"
-                    )
+            # 投稿枠の予約とカウンターの更新は process_scheduled_tweets 内で1件ごとに行われる
+            # API クライアントの生成と接続テストは、予約のあるアカウントごとに行われる
+            processed_count = process_scheduled_tweets(
+                budget=self.budget,
+                accounts=accounts,
+                probe=lambda api_client: self._probe_account(options, api_client),
+            )
 
             logger.info(
                 f"{processed_count}件のスケジュールされたツイート処理が試行されました。"
             )  # ログメッセージ変更
+            if self.budget.deferred:
+                logger.warning(
+                    f"実行の上限（--max-posts / --deadline）に達したため、"
+                    f"{self.budget.deferred}件の予約を次回の実行に持ち越しました。"
+                )
+        except ApiConnectionTestAborted:
+            logger.error(
+                "API接続テストに失敗し、abort-on-errorが指定されているため処理を中止します。"
+            )
         except Exception as e:
             logger.exception(
                 f"ツイート処理コマンド全体で予期せぬエラーが発生しました: {str(e)}"
@@ -0,0 +1,48 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from x_scheduler.analytics import PostingTimeRecommender
+from x_scheduler.models import Account
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+WEEKDAY_NAMES = "月火水木金土日"
+
+
+class Command(BaseCommand):
+    help = "エンゲージメントの履歴から、反応の良い曜日・時間帯を表示する"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top", type=int, default=10, help="表示する時間帯の数（既定: 10）"
+        )
+        parser.add_argument(
+            "--account",
+            type=str,
+            default=None,
+            help="このアカウント名の履歴を使う（省略時は既定のアカウント）",
+        )
+
+    def handle(self, *args, **options):
+        if options["top"] <= 0:
+            raise CommandError("--top には1以上の値を指定してください。")
+        account = None
+        if options["account"]:
+            try:
+                account = Account.objects.get(name=options["account"])
+            except Account.DoesNotExist:
+                raise CommandError(f"アカウントが見つかりません: {options['account']}")
+
+        recommender = PostingTimeRecommender(account=account)
+        top_hours = recommender.top_hours(options["top"])
+        if not top_hours:
+            self.stdout.write(
+                f"公開指標のある投稿が {recommender.min_posts}件未満のため、おすすめを出せません。"
+                "collect_metrics で公開指標を記録してください。"
+            )
+            return
+
+        self.stdout.write("曜日\t時刻\t投稿1件あたりのエンゲージメント")
+        for weekday, hour, score in top_hours:
+            self.stdout.write(f"{WEEKDAY_NAMES[weekday]}\t{hour:02d}時\t{score:.1f}")
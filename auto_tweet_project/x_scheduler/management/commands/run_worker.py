@@ -0,0 +1,62 @@
+import logging
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from x_scheduler.wakeup import WakeupListener
+from x_scheduler.worker import ALLOWED_COMMANDS, Dispatcher, WorkerServer
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "常駐ワーカーを起動し、Unix ドメインソケットで "
+        f"{' / '.join(ALLOWED_COMMANDS)} の実行要求を待ち受ける"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--socket",
+            default=None,
+            help="待ち受けるソケットのパス（既定: settings.WORKER_SOCKET_PATH）",
+        )
+        parser.add_argument(
+            "--dispatch",
+            action="store_true",
+            help="予約の予定時刻に process_tweets を実行する（予約の変更通知で予定を計算し直す）",
+        )
+
+    def handle(self, *args, **options):
+        socket_path = options["socket"] or settings.WORKER_SOCKET_PATH
+        try:
+            server = WorkerServer(socket_path)
+        except (OSError, RuntimeError) as e:
+            raise CommandError(f"ワーカーを起動できません: {e}")
+        if options["dispatch"]:
+            # 二重起動でないことを確認してから通知用ソケットを作る
+            try:
+                server.dispatcher = Dispatcher(WakeupListener())
+            except OSError as e:
+                server.server_close()
+                raise CommandError(f"通知用ソケットを作成できません: {e}")
+
+        # launchd / systemd からの停止 (SIGTERM) でもソケットファイルを片付けて終了する
+        def stop(signum, frame):
+            raise SystemExit(0)
+
+        signal.signal(signal.SIGTERM, stop)
+
+        mode = "ディスパッチあり" if server.dispatcher else "要求の実行のみ"
+        logger.info(f"ワーカーを起動しました: {socket_path} ({mode})")
+        self.stdout.write(
+            f"ワーカーを起動しました: {socket_path} ({mode}, Ctrl+C で終了)"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            logger.info("ワーカーを終了しました")
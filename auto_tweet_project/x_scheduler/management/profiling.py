@@ -0,0 +1,197 @@
+"""
+管理コマンド共通のプロファイリング機能
+
+ProfilingCommandMixin を継承したコマンドは、ソースを変更せずに次のオプションで計測できる。
+  --profile       : cProfile で計測し、pstats のバイナリ (.prof) と上位関数の一覧 (.txt) を保存
+  --trace-queries : 実行された SQL を1件ずつ所要時間・呼び出し元付きで記録し (_queries.log)、
+                    同じ形の SQL が繰り返し実行された箇所を N+1 の疑いとして報告
+出力先は settings.PROFILE_OUTPUT_DIR で、終了時に概要を標準エラーに表示する。
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import time
+import traceback
+from collections import defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+# 同じ形の SQL がこの回数以上実行されたら N+1 の疑いとして報告する
+N_PLUS_ONE_THRESHOLD = 5
+# .txt と概要に表示する関数・SQL の件数
+PROFILE_TOP_N = 30
+SUMMARY_TOP_N = 5
+
+# IN 句のプレースホルダー数の違いは同じ形の SQL として扱う
+_IN_CLAUSE_RE = re.compile(r"IN \((?:%s|\?)(?:, (?:%s|\?))*\)")
+_PROJECT_DIR = str(settings.BASE_DIR)
+
+
+def normalize_sql(sql):
+    """パラメーターの個数に依存しない SQL の形を返す"""
+    return _IN_CLAUSE_RE.sub("IN (...)", sql)
+
+
+def _call_site():
+    """SQL を発行したプロジェクト内の呼び出し元 (ファイル:行番号)"""
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        if frame.filename.startswith(_PROJECT_DIR) and frame.filename != __file__:
+            return f"{os.path.relpath(frame.filename, _PROJECT_DIR)}:{frame.lineno}"
+    return "?"
+
+
+class QueryTracer:
+    """connection.execute_wrapper に登録し、実行された SQL と所要時間を記録する"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                {
+                    "alias": context["connection"].alias,
+                    "sql": sql,
+                    "duration": time.perf_counter() - start,
+                    "site": _call_site(),
+                }
+            )
+
+    @property
+    def total_time(self):
+        return sum(query["duration"] for query in self.queries)
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """同じ呼び出し元から同じ形の SQL が threshold 回以上実行された箇所を返す"""
+        groups = defaultdict(list)
+        for query in self.queries:
+            groups[(query["site"], normalize_sql(query["sql"]))].append(query)
+        suspects = [
+            (site, sql, len(queries), sum(q["duration"] for q in queries))
+            for (site, sql), queries in groups.items()
+            if len(queries) >= threshold
+        ]
+        return sorted(suspects, key=lambda suspect: suspect[2], reverse=True)
+
+    def write_log(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for i, query in enumerate(self.queries, 1):
+                f.write(
+                    f"{i}\t{query['duration'] * 1000:.2f}ms\t{query['alias']}\t"
+                    f"{query['site']}\t{query['sql']}\n"
+                )
+            f.write(
+                f"\n# 合計: {len(self.queries)}件, {self.total_time * 1000:.2f}ms\n"
+            )
+            for site, sql, count, duration in self.repeated():
+                f.write(
+                    f"# N+1 の疑い: {site} で {count}回 "
+                    f"({duration * 1000:.2f}ms): {sql}\n"
+                )
+
+
+class ProfilingCommandMixin:
+    """管理コマンドに --profile / --trace-queries オプションを追加する Mixin"""
+
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        parser.add_argument(
+            "--profile",
+            action="store_true",
+            help="cProfile で計測し、結果を PROFILE_OUTPUT_DIR に保存する",
+        )
+        parser.add_argument(
+            "--trace-queries",
+            action="store_true",
+            help="実行した SQL と所要時間を記録し、N+1 の疑いを報告する",
+        )
+        return parser
+
+    def _profile_output_base(self):
+        output_dir = Path(settings.PROFILE_OUTPUT_DIR)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        command_name = self.__module__.rsplit(".", 1)[-1]
+        stamp = timezone.localtime().strftime("%Y%m%d_%H%M%S")
+        return output_dir / f"{command_name}_{stamp}_{os.getpid()}"
+
+    def execute(self, *args, **options):
+        profile = options.get("profile")
+        trace_queries = options.get("trace_queries")
+        if not profile and not trace_queries:
+            return super().execute(*args, **options)
+
+        profiler = cProfile.Profile() if profile else None
+        tracer = QueryTracer() if trace_queries else None
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                if tracer:
+                    for connection in connections.all():
+                        stack.enter_context(connection.execute_wrapper(tracer))
+                if profiler:
+                    profiler.enable()
+                    stack.callback(profiler.disable)
+                return super().execute(*args, **options)
+        finally:
+            # 計測結果の保存に失敗しても、コマンドの結果 (戻り値・例外) は変えない
+            try:
+                self._write_profile_report(
+                    profiler, tracer, time.perf_counter() - start
+                )
+            except Exception:
+                logger.error("計測結果を保存できませんでした", exc_info=True)
+
+    def _write_profile_report(self, profiler, tracer, elapsed):
+        base = self._profile_output_base()
+        lines = [f"実行時間: {elapsed:.3f}秒"]
+
+        if profiler:
+            profiler.dump_stats(f"{base}.prof")
+            text = io.StringIO()
+            stats = pstats.Stats(profiler, stream=text)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_TOP_N)
+            with open(f"{base}.txt", "w", encoding="utf-8") as f:
+                f.write(text.getvalue())
+            lines.append(f"プロファイル: {base}.prof / {base}.txt")
+            top = sorted(
+                stats.stats.items(), key=lambda item: item[1][3], reverse=True
+            )[:SUMMARY_TOP_N]
+            for (filename, lineno, func), (_, calls, _, cumtime, _) in top:
+                lines.append(
+                    f"  {cumtime:.3f}秒 {calls}回 {func} "
+                    f"({os.path.basename(filename)}:{lineno})"
+                )
+
+        if tracer:
+            tracer.write_log(f"{base}_queries.log")
+            lines.append(
+                f"SQL: {len(tracer.queries)}件, 合計 {tracer.total_time * 1000:.2f}ms "
+                f"({base}_queries.log)"
+            )
+            slowest = sorted(tracer.queries, key=lambda q: q["duration"], reverse=True)
+            for query in slowest[:SUMMARY_TOP_N]:
+                lines.append(
+                    f"  {query['duration'] * 1000:.2f}ms {query['site']} "
+                    f"{query['sql'][:120]}"
+                )
+            for site, sql, count, duration in tracer.repeated():
+                lines.append(
+                    f"  N+1 の疑い: {site} で {count}回 "
+                    f"({duration * 1000:.2f}ms): {sql[:120]}"
+                )
+
+        self.stderr.write("\n".join(lines))
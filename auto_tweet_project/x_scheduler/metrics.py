@@ -0,0 +1,247 @@
+"""
+投稿処理のメトリクス
+
+各プロセス (process_tweets / auto_post / Web) は計測値をプロセス内のレジストリに
+ためておき、flush() で MetricValue テーブルへ加算する。
+/scheduler/metrics/ はテーブルの累積値と、キューの状態をその場で集計した値を
+Prometheus のテキスト形式で返す。
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Min, Q, Value, When
+from django.utils import timezone
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+# ヒストグラムのバケット上限（秒）
+HISTOGRAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+
+# 累積値として DB に保存するヒストグラム
+HISTOGRAMS = {
+    "x_scheduler_media_upload_seconds": "画像アップロード (media_upload) の所要時間",
+    "x_scheduler_create_tweet_seconds": "ツイート投稿 (create_tweet) の所要時間",
+    "x_scheduler_dispatch_lag_seconds": "予定時刻から投稿処理開始までの遅延",
+    "x_scheduler_process_tweets_duration_seconds": "process_tweets コマンドの実行時間",
+    "x_scheduler_auto_post_duration_seconds": "auto_post コマンドの実行時間",
+}
+
+# 最後に記録した値を DB に保存するゲージ
+GAUGES = {
+    "x_scheduler_rate_limit_remaining": "X API のレート制限の残り回数 (エンドポイント別)",
+    "x_scheduler_budget_deferred_tweets": (
+        "直近の process_tweets で実行の上限 (--max-posts / --deadline) により"
+        "次回に持ち越した予約の件数"
+    ),
+}
+
+
+def percentile(sorted_values, p):
+    """ソート済みの値から最近順位法でパーセンタイル値を返す (空の場合は None)"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _format_value(value):
+    """Prometheus 形式の数値表現 (整数値は小数点なし)"""
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _bucket_labels(upper_bound):
+    return f'le="{_format_value(upper_bound)}"'
+
+
+class MetricsRegistry:
+    """
+    プロセス内で計測値を集めるレジストリ。
+    ヒストグラムはバケット・合計・件数の加算値として保持し、flush() でまとめて DB に反映する。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._increments = defaultdict(float)
+        self._gauges = {}
+
+    def observe(self, name, value):
+        """ヒストグラムに1件の観測値を追加する"""
+        with self._lock:
+            for upper_bound in HISTOGRAM_BUCKETS:
+                if value <= upper_bound:
+                    bucket = (f"{name}_bucket", _bucket_labels(upper_bound))
+                    self._increments[bucket] += 1
+            self._increments[(f"{name}_bucket", 'le="+Inf"')] += 1
+            self._increments[(f"{name}_sum", "")] += value
+            self._increments[(f"{name}_count", "")] += 1
+
+    def set_gauge(self, name, value, labels=""):
+        """ゲージの値を記録する"""
+        with self._lock:
+            self._gauges[(name, labels)] = value
+
+    @contextmanager
+    def timer(self, name):
+        """with ブロックの所要時間をヒストグラムに記録する"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def flush(self):
+        """ためた計測値を DB に反映し、レジストリを空にする"""
+        from .models import MetricValue  # 循環インポート回避
+
+        with self._lock:
+            increments, self._increments = self._increments, defaultdict(float)
+            gauges, self._gauges = self._gauges, {}
+        if not increments and not gauges:
+            return
+
+        now = timezone.now()
+        keys = set(increments) | set(gauges)
+        target = Q()
+        for name, labels in keys:
+            target |= Q(name=name, labels=labels)
+        try:
+            with transaction.atomic():
+                # 未作成の行を 0 で作成してから、加算・設定をそれぞれ1回の UPDATE で行う
+                MetricValue.objects.bulk_create(
+                    [MetricValue(name=name, labels=labels) for name, labels in keys],
+                    ignore_conflicts=True,
+                )
+                if increments:
+                    MetricValue.objects.filter(target).update(
+                        value=F("value") + _per_row(increments, default=0),
+                        updated_at=now,
+                    )
+                if gauges:
+                    MetricValue.objects.filter(target).update(
+                        value=_per_row(gauges, default=F("value")), updated_at=now
+                    )
+        except Exception as e:
+            # メトリクスの保存失敗で投稿処理を止めない
+            logger.error(f"メトリクスの保存中にエラー: {e}")
+
+
+def _per_row(values, default):
+    """(name, labels) ごとの値を返す CASE 式"""
+    return Case(
+        *[
+            When(name=name, labels=labels, then=Value(float(value)))
+            for (name, labels), value in values.items()
+        ],
+        default=default,
+        output_field=FloatField(),
+    )
+
+
+registry = MetricsRegistry()
+
+
+def record_rate_limit(response, *args, **kwargs):
+    """requests のレスポンスフックとして、レート制限ヘッダーをゲージに記録する"""
+    remaining = response.headers.get("x-rate-limit-remaining")
+    if remaining is not None:
+        try:
+            endpoint = urlparse(response.url).path
+            registry.set_gauge(
+                "x_scheduler_rate_limit_remaining",
+                int(remaining),
+                labels=f'endpoint="{endpoint}"',
+            )
+        except ValueError:
+            pass
+    return response
+
+
+def _family_name(name):
+    """サンプル名から所属するメトリクス名を返す (_bucket / _sum / _count を除く)"""
+    for suffix in ("_bucket", "_sum", "_count"):
+        if name.endswith(suffix) and name[: -len(suffix)] in HISTOGRAMS:
+            return name[: -len(suffix)]
+    return name
+
+
+def _sample(name, value, labels=""):
+    label_part = f"{{{labels}}}" if labels else ""
+    return f"{name}{label_part} {_format_value(value)}"
+
+
+def render_metrics():
+    """Prometheus テキスト形式のメトリクスを生成する"""
+    from .models import DailyPostCounter, MetricValue, TweetSchedule
+
+    now = timezone.now()
+    lines = []
+
+    # キューの状態はその場で集計する (1クエリ)
+    queue = TweetSchedule.objects.filter(status="pending").aggregate(
+        depth=Count("id"),
+        oldest_due=Min("scheduled_time", filter=Q(scheduled_time__lte=now)),
+    )
+    lag = (now - queue["oldest_due"]).total_seconds() if queue["oldest_due"] else 0
+    # 投稿数・上限は既定のアカウントの値 (アカウントごとの値は管理画面で確認する)
+    counter = DailyPostCounter.objects.filter(
+        account=None, date=timezone.localdate()
+    ).first()
+    post_count = counter.post_count if counter else 0
+    live_gauges = (
+        ("x_scheduler_pending_queue_depth", "待機中の予約数", queue["depth"]),
+        (
+            "x_scheduler_oldest_due_lag_seconds",
+            "予定時刻を過ぎて待機中の最も古い予約の遅延",
+            lag,
+        ),
+        ("x_scheduler_daily_posts_used", "本日の投稿数", post_count),
+        (
+            "x_scheduler_daily_posts_limit",
+            "1日の投稿上限",
+            settings.MAX_DAILY_POSTS_PER_USER,
+        ),
+    )
+    for name, help_text, value in live_gauges:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(_sample(name, value))
+
+    # 累積値を名前ごとにまとめる
+    samples = defaultdict(list)
+    for name, labels, value in MetricValue.objects.values_list(
+        "name", "labels", "value"
+    ):
+        samples[_family_name(name)].append((name, labels, value))
+
+    for family, help_text in HISTOGRAMS.items():
+        if family not in samples:
+            continue
+        lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} histogram")
+        values = {(name, labels): value for name, labels, value in samples[family]}
+        # 観測値のないバケットも 0 として出力する
+        for labels in [_bucket_labels(b) for b in HISTOGRAM_BUCKETS] + ['le="+Inf"']:
+            name = f"{family}_bucket"
+            lines.append(_sample(name, values.get((name, labels), 0), labels))
+        for suffix in ("_sum", "_count"):
+            lines.append(_sample(family + suffix, values.get((family + suffix, ""), 0)))
+
+    for family, help_text in GAUGES.items():
+        if family not in samples:
+            continue
+        lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} gauge")
+        for name, labels, value in sorted(samples[family]):
+            lines.append(_sample(name, value, labels))
+
+    return "\n".join(lines) + "\n"
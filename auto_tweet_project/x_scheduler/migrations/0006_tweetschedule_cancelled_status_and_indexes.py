@@ -0,0 +1,38 @@
+# Generated by Django 5.1.8 on 2026-10-19 16:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("x_scheduler", "0005_remove_dailypostcounter_max_daily_posts"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="tweetschedule",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "待機中"),
+                    ("posted", "投稿済み"),
+                    ("failed", "失敗"),
+                    ("cancelled", "キャンセル"),
+                ],
+                default="pending",
+                max_length=10,
+                verbose_name="ステータス",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tweetschedule",
+            index=models.Index(fields=["scheduled_time"], name="tweet_sched_time_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="tweetschedule",
+            index=models.Index(
+                fields=["status", "scheduled_time"], name="tweet_status_time_idx"
+            ),
+        ),
+    ]
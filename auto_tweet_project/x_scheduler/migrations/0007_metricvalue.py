@@ -0,0 +1,49 @@
+# Generated by Django 5.1.8 on 2026-10-19 16:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("x_scheduler", "0006_tweetschedule_cancelled_status_and_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MetricValue",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, verbose_name="メトリクス名")),
+                (
+                    "labels",
+                    models.CharField(
+                        blank=True, default="", max_length=200, verbose_name="ラベル"
+                    ),
+                ),
+                ("value", models.FloatField(default=0, verbose_name="値")),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新日時"),
+                ),
+            ],
+            options={
+                "verbose_name": "メトリクス",
+                "verbose_name_plural": "メトリクス一覧",
+                "ordering": ["name", "labels"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("name", "labels"), name="unique_metric_name_labels"
+                    )
+                ],
+            },
+        ),
+    ]
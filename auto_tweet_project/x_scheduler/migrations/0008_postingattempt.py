@@ -0,0 +1,109 @@
+# Generated by Django 5.1.8 on 2026-10-19 16:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("x_scheduler", "0007_metricvalue"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PostingAttempt",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("source", models.CharField(max_length=30, verbose_name="実行元")),
+                (
+                    "started_at",
+                    models.DateTimeField(db_index=True, verbose_name="開始日時"),
+                ),
+                ("success", models.BooleanField(default=False, verbose_name="成功")),
+                (
+                    "error_message",
+                    models.TextField(
+                        blank=True, default="", verbose_name="エラーメッセージ"
+                    ),
+                ),
+                (
+                    "open_image_seconds",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="画像オープン(秒)"
+                    ),
+                ),
+                (
+                    "media_upload_seconds",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="画像アップロード(秒)"
+                    ),
+                ),
+                (
+                    "create_tweet_seconds",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="ツイート投稿(秒)"
+                    ),
+                ),
+                (
+                    "db_save_seconds",
+                    models.FloatField(blank=True, null=True, verbose_name="DB保存(秒)"),
+                ),
+                ("total_seconds", models.FloatField(verbose_name="合計(秒)")),
+                (
+                    "bytes_uploaded",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="アップロードサイズ(バイト)"
+                    ),
+                ),
+                (
+                    "http_status",
+                    models.PositiveSmallIntegerField(
+                        blank=True, null=True, verbose_name="HTTPステータス"
+                    ),
+                ),
+                (
+                    "rate_limit_limit",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="レート制限の上限"
+                    ),
+                ),
+                (
+                    "rate_limit_remaining",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="レート制限の残り"
+                    ),
+                ),
+                (
+                    "rate_limit_reset",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="レート制限のリセット時刻"
+                    ),
+                ),
+                (
+                    "tweet",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="attempts",
+                        to="x_scheduler.tweetschedule",
+                        verbose_name="ツイート予約",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "投稿試行",
+                "verbose_name_plural": "投稿試行一覧",
+                "ordering": ["-started_at"],
+            },
+        ),
+    ]
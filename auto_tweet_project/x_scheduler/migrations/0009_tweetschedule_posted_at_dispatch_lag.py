@@ -0,0 +1,28 @@
+# Generated by Django 5.1.8 on 2026-10-19 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("x_scheduler", "0008_postingattempt"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tweetschedule",
+            name="dispatch_lag",
+            field=models.DurationField(
+                blank=True,
+                help_text="予定時刻から実際に投稿されるまでの時間",
+                null=True,
+                verbose_name="投稿遅延",
+            ),
+        ),
+        migrations.AddField(
+            model_name="tweetschedule",
+            name="posted_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="投稿日時"),
+        ),
+    ]
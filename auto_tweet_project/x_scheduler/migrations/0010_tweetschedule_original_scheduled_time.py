@@ -0,0 +1,23 @@
+# Generated by Django 5.1.8 on 2026-10-19 16:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("x_scheduler", "0009_tweetschedule_posted_at_dispatch_lag"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tweetschedule",
+            name="original_scheduled_time",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="投稿上限による延期や遅延分の再配置で予定時刻を変更した場合の、最初の予定時刻",
+                null=True,
+                verbose_name="元の予定時刻",
+            ),
+        ),
+    ]
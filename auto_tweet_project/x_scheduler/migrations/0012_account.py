@@ -0,0 +1,124 @@
+# Generated by Django 5.1.8 on 2026-10-19 17:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("x_scheduler", "0011_recurringpattern"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Account",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.SlugField(unique=True, verbose_name="アカウント名")),
+                (
+                    "credentials_prefix",
+                    models.CharField(
+                        help_text="X_BRAND_A とすると .env の X_BRAND_A_API_KEY などを使います",
+                        max_length=50,
+                        verbose_name="認証情報の接頭辞",
+                    ),
+                ),
+                (
+                    "max_daily_posts",
+                    models.PositiveIntegerField(
+                        blank=True,
+                        help_text="空欄の場合は MAX_DAILY_POSTS の値を使います",
+                        null=True,
+                        verbose_name="1日の投稿上限",
+                    ),
+                ),
+                (
+                    "is_active",
+                    models.BooleanField(
+                        default=True,
+                        help_text="無効なアカウントの予約は投稿されません",
+                        verbose_name="有効",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="作成日時"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新日時"),
+                ),
+            ],
+            options={
+                "verbose_name": "アカウント",
+                "verbose_name_plural": "アカウント一覧",
+                "ordering": ["name"],
+            },
+        ),
+        migrations.AlterField(
+            model_name="dailypostcounter",
+            name="date",
+            field=models.DateField(verbose_name="日付"),
+        ),
+        migrations.AddField(
+            model_name="dailypostcounter",
+            name="account",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="daily_counters",
+                to="x_scheduler.account",
+                verbose_name="アカウント",
+            ),
+        ),
+        migrations.AddField(
+            model_name="recurringpattern",
+            name="account",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="空欄の場合は既定のアカウントで投稿します",
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="recurring_patterns",
+                to="x_scheduler.account",
+                verbose_name="アカウント",
+            ),
+        ),
+        migrations.AddField(
+            model_name="tweetschedule",
+            name="account",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="空欄の場合は既定のアカウントで投稿します",
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="tweet_schedules",
+                to="x_scheduler.account",
+                verbose_name="アカウント",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailypostcounter",
+            constraint=models.UniqueConstraint(
+                fields=("account", "date"), name="daily_counter_account_date_uniq"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailypostcounter",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("account__isnull", True)),
+                fields=("date",),
+                name="daily_counter_default_date_uniq",
+            ),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.1.8 on 2026-10-19 17:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("x_scheduler", "0012_account"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tweetschedule",
+            name="tweet_id",
+            field=models.CharField(
+                blank=True,
+                help_text="投稿した X のツイートの ID",
+                max_length=32,
+                null=True,
+                verbose_name="ツイートID",
+            ),
+        ),
+        migrations.CreateModel(
+            name="EngagementSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("collected_at", models.DateTimeField(verbose_name="取得日時")),
+                (
+                    "impression_count",
+                    models.PositiveIntegerField(default=0, verbose_name="表示回数"),
+                ),
+                (
+                    "like_count",
+                    models.PositiveIntegerField(default=0, verbose_name="いいね"),
+                ),
+                (
+                    "retweet_count",
+                    models.PositiveIntegerField(default=0, verbose_name="リポスト"),
+                ),
+                (
+                    "reply_count",
+                    models.PositiveIntegerField(default=0, verbose_name="返信"),
+                ),
+                (
+                    "quote_count",
+                    models.PositiveIntegerField(default=0, verbose_name="引用"),
+                ),
+                (
+                    "bookmark_count",
+                    models.PositiveIntegerField(default=0, verbose_name="ブックマーク"),
+                ),
+                (
+                    "tweet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="engagement_snapshots",
+                        to="x_scheduler.tweetschedule",
+                        verbose_name="ツイート予約",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "エンゲージメント記録",
+                "verbose_name_plural": "エンゲージメント記録一覧",
+                "ordering": ["-collected_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["tweet", "collected_at"],
+                        name="engagement_tweet_time_idx",
+                    )
+                ],
+            },
+        ),
+    ]
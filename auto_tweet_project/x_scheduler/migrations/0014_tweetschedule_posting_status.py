@@ -0,0 +1,29 @@
+# Generated by Django 5.1.8 on 2026-10-19 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("x_scheduler", "0013_engagement_snapshot"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="tweetschedule",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "待機中"),
+                    ("posting", "投稿中"),
+                    ("posted", "投稿済み"),
+                    ("failed", "失敗"),
+                    ("cancelled", "キャンセル"),
+                ],
+                default="pending",
+                max_length=10,
+                verbose_name="ステータス",
+            ),
+        ),
+    ]
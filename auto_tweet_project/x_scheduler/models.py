@@ -1,13 +1,20 @@
+import calendar
 import logging
+import os
 import uuid
+from datetime import date, datetime, timedelta
 from pathlib import Path
 
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.utils import timezone
 from django.core.files import File
 import re
 
+from .recurrence import compile_template, render_template
+
 # ロガーの設定
 logger = logging.getLogger(__name__)
 
@@ -24,23 +31,113 @@ def get_image_path(instance, filename):
     return str(path.relative_to(settings.MEDIA_ROOT))  # MEDIA_ROOT からの相対パスを返す
 
 
+class Account(models.Model):
+    """
+    投稿に使う X のアカウント。
+    認証情報は DB に保存せず、.env の「<接頭辞>_API_KEY」「<接頭辞>_API_SECRET」
+    「<接頭辞>_ACCESS_TOKEN」「<接頭辞>_ACCESS_TOKEN_SECRET」から読み込む。
+    アカウントを指定しない予約・カウンターは、X_API_KEY などで設定した既定のアカウントのものになる。
+    """
+
+    CREDENTIAL_NAMES = ("API_KEY", "API_SECRET", "ACCESS_TOKEN", "ACCESS_TOKEN_SECRET")
+
+    name = models.SlugField("アカウント名", max_length=50, unique=True)
+    credentials_prefix = models.CharField(
+        "認証情報の接頭辞",
+        max_length=50,
+        help_text="X_BRAND_A とすると .env の X_BRAND_A_API_KEY などを使います",
+    )
+    max_daily_posts = models.PositiveIntegerField(
+        "1日の投稿上限",
+        blank=True,
+        null=True,
+        help_text="空欄の場合は MAX_DAILY_POSTS の値を使います",
+    )
+    is_active = models.BooleanField(
+        "有効", default=True, help_text="無効なアカウントの予約は投稿されません"
+    )
+    created_at = models.DateTimeField("作成日時", auto_now_add=True)
+    updated_at = models.DateTimeField("更新日時", auto_now=True)
+
+    class Meta:
+        verbose_name = "アカウント"
+        verbose_name_plural = "アカウント一覧"
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def daily_limit(self):
+        """1日の投稿上限"""
+        if self.max_daily_posts is None:
+            return settings.MAX_DAILY_POSTS_PER_USER
+        return self.max_daily_posts
+
+    def credentials(self):
+        """.env から読み込んだ認証情報 (api_key, api_secret, access_token, access_token_secret)"""
+        return {
+            name.lower(): os.getenv(f"{self.credentials_prefix}_{name}")
+            for name in self.CREDENTIAL_NAMES
+        }
+
+
+def daily_limit_for(account):
+    """account (None は既定のアカウント) の1日の投稿上限"""
+    if account is None:
+        return settings.MAX_DAILY_POSTS_PER_USER
+    return account.daily_limit
+
+
 class TweetSchedule(models.Model):
     """予約投稿のスケジュールを管理するモデル"""
 
     STATUS_CHOICES = (
         ("pending", "待機中"),
+        ("posting", "投稿中"),
         ("posted", "投稿済み"),
         ("failed", "失敗"),
+        ("cancelled", "キャンセル"),
     )
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    account = models.ForeignKey(
+        Account,
+        verbose_name="アカウント",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="tweet_schedules",
+        help_text="空欄の場合は既定のアカウントで投稿します",
+    )
     content = models.TextField("投稿内容", max_length=280)  # Xの文字制限
     image = models.ImageField("画像", upload_to=get_image_path, blank=True, null=True)
     scheduled_time = models.DateTimeField("予定時刻")
+    original_scheduled_time = models.DateTimeField(
+        "元の予定時刻",
+        blank=True,
+        null=True,
+        help_text="投稿上限による延期や遅延分の再配置で予定時刻を変更した場合の、最初の予定時刻",
+    )
     status = models.CharField(
         "ステータス", max_length=10, choices=STATUS_CHOICES, default="pending"
     )
     error_message = models.TextField("エラーメッセージ", blank=True, null=True)
+    posted_at = models.DateTimeField("投稿日時", blank=True, null=True)
+    dispatch_lag = models.DurationField(
+        "投稿遅延", blank=True, null=True, help_text="予定時刻から実際に投稿されるまでの時間"
+    )
+    tweet_id = models.CharField(
+        "ツイートID", max_length=32, blank=True, null=True, help_text="投稿した X のツイートの ID"
+    )
+    recurring_pattern = models.ForeignKey(
+        "RecurringPattern",
+        verbose_name="繰り返しパターン",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="tweet_schedules",
+    )
     created_at = models.DateTimeField("作成日時", auto_now_add=True)
     updated_at = models.DateTimeField("更新日時", auto_now=True)
 
@@ -48,6 +145,13 @@ class TweetSchedule(models.Model):
         verbose_name = "ツイート予約"
         verbose_name_plural = "ツイート予約一覧"
         ordering = ["-scheduled_time"]
+        indexes = [
+            # 一覧の並び順と、ステータス＋予定時刻での絞り込み (投稿処理・管理画面) 用
+            models.Index(fields=["scheduled_time"], name="tweet_sched_time_idx"),
+            models.Index(
+                fields=["status", "scheduled_time"], name="tweet_status_time_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.content[:30]}... ({self.get_status_display()}) - {self.scheduled_time.strftime('%Y-%m-%d %H:%M')}"
@@ -67,6 +171,45 @@ class TweetSchedule(models.Model):
         """画像が添付されているかどうかを確認"""
         return bool(self.image)
 
+    def claim(self):
+        """
+        待機中の予約を投稿中にする (1回の UPDATE)。他のプロセスが先に投稿を始めていた場合は
+        False を返す。投稿中の予約はディスパッチャーや process_tweets の対象にならない。
+        """
+        claimed = type(self).objects.filter(pk=self.pk, status="pending").update(
+            status="posting", updated_at=timezone.now()
+        )
+        if claimed:
+            self.status = "posting"
+        return bool(claimed)
+
+    def mark_posted(self, posted_at=None):
+        """
+        投稿済みにし、投稿日時と予定時刻からの遅延を記録する (保存は呼び出し側で行う)。
+        予定時刻を変更した予約の遅延は、最初の予定時刻から計算する。
+        """
+        self.status = "posted"
+        self.error_message = ""
+        self.posted_at = posted_at or timezone.now()
+        planned = self.original_scheduled_time or self.scheduled_time
+        self.dispatch_lag = max(self.posted_at - planned, timedelta(0))
+
+    def reschedule(self, scheduled_time):
+        """予定時刻を変更し、最初の予定時刻を残す (保存は呼び出し側で行う)"""
+        if self.original_scheduled_time is None:
+            self.original_scheduled_time = self.scheduled_time
+        self.scheduled_time = scheduled_time
+
+    def defer_to_next_day(self, reason):
+        """
+        予定時刻を翌日の同じ時刻に延期する (保存は呼び出し側で行う)。
+        前日以前の予約も、延期後は翌日になるように日数をずらす。
+        """
+        scheduled = timezone.localtime(self.scheduled_time)
+        next_day = timezone.localdate() + timedelta(days=1)
+        self.reschedule(scheduled + timedelta(days=(next_day - scheduled.date()).days))
+        self.error_message = reason
+
     def save(self, *args, **kwargs):
         """保存時の処理をオーバーライド"""
         if self.image:
@@ -74,10 +217,153 @@ class TweetSchedule(models.Model):
         super().save(*args, **kwargs)
 
 
+class RecurringPattern(models.Model):
+    """
+    繰り返し投稿のパターン。
+    次回の投稿時刻 (next_fire_at) だけを保持し、recurrence.materialize() が
+    先読み期間 (RECURRENCE_HORIZON_HOURS) に入った分の TweetSchedule を作成して次回の時刻を進める。
+    """
+
+    FREQUENCY_CHOICES = (
+        ("daily", "毎日"),
+        ("weekly", "毎週"),
+        ("monthly", "毎月"),
+    )
+    WEEKDAY_CHOICES = (
+        (0, "月曜日"),
+        (1, "火曜日"),
+        (2, "水曜日"),
+        (3, "木曜日"),
+        (4, "金曜日"),
+        (5, "土曜日"),
+        (6, "日曜日"),
+    )
+    # 変更すると次回の投稿時刻を計算し直す項目
+    SCHEDULE_FIELDS = ("frequency", "time", "weekday", "day_of_month", "is_active")
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField("パターン名", max_length=100)
+    frequency = models.CharField("頻度", max_length=10, choices=FREQUENCY_CHOICES)
+    time = models.TimeField("時刻")
+    weekday = models.IntegerField(
+        "曜日", choices=WEEKDAY_CHOICES, blank=True, null=True, help_text="毎週の場合に指定"
+    )
+    day_of_month = models.IntegerField(
+        "日付",
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(1), MaxValueValidator(31)],
+        help_text="毎月の場合に指定（1-31）。月末より後の日付はその月の末日になります",
+    )
+    account = models.ForeignKey(
+        Account,
+        verbose_name="アカウント",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="recurring_patterns",
+        help_text="空欄の場合は既定のアカウントで投稿します",
+    )
+    content_template = models.TextField(
+        "投稿内容テンプレート",
+        max_length=280,
+        help_text="投稿内容のテンプレート。{date}は日付、{time}は時刻に置換されます。",
+    )
+    image = models.ImageField("画像", upload_to=get_image_path, blank=True, null=True)
+    is_active = models.BooleanField("有効", default=True)
+    next_fire_at = models.DateTimeField(
+        "次回の投稿時刻",
+        blank=True,
+        null=True,
+        help_text="まだ予約を作成していない次回の投稿時刻 (無効なパターンは空)",
+    )
+    created_at = models.DateTimeField("作成日時", auto_now_add=True)
+    updated_at = models.DateTimeField("更新日時", auto_now=True)
+
+    class Meta:
+        verbose_name = "繰り返しパターン"
+        verbose_name_plural = "繰り返しパターン一覧"
+        ordering = ["-created_at"]
+        indexes = [
+            # 先読み期間に入ったパターンの検索用
+            models.Index(
+                fields=["is_active", "next_fire_at"], name="recurring_next_fire_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.get_frequency_display()} {self.time:%H:%M})"
+
+    def clean(self):
+        errors = {}
+        if self.frequency == "weekly" and self.weekday is None:
+            errors["weekday"] = "毎週の場合は曜日を指定してください。"
+        if self.frequency == "monthly" and self.day_of_month is None:
+            errors["day_of_month"] = "毎月の場合は日付を指定してください。"
+        try:
+            compile_template(self.content_template or "")
+        except ValueError as e:
+            errors["content_template"] = str(e)
+        else:
+            # {date} は展開後に長くなるため、展開した内容で文字数を確認する
+            if len(render_template(self.content_template or "", timezone.now())) > 280:
+                errors["content_template"] = "展開後の投稿内容が280文字を超えます。"
+        if errors:
+            raise ValidationError(errors)
+
+    def _fire_on_or_after(self, day):
+        """day 以降で最初に投稿する日付"""
+        if self.frequency == "weekly":
+            return day + timedelta(days=(self.weekday - day.weekday()) % 7)
+        if self.frequency == "monthly":
+            year, month = day.year, day.month
+            while True:
+                last_day = calendar.monthrange(year, month)[1]
+                candidate = date(year, month, min(self.day_of_month, last_day))
+                if candidate >= day:
+                    return candidate
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return day
+
+    def next_fire_after(self, after):
+        """after より後の最初の投稿時刻"""
+        day = self._fire_on_or_after(timezone.localdate(after))
+        while True:
+            candidate = timezone.make_aware(datetime.combine(day, self.time))
+            if candidate > after:
+                return candidate
+            day = self._fire_on_or_after(day + timedelta(days=1))
+
+    def reset_next_fire(self, now=None):
+        """現在時刻を基準に次回の投稿時刻を計算し直す (保存は呼び出し側で行う)"""
+        self.next_fire_at = (
+            self.next_fire_after(now or timezone.now()) if self.is_active else None
+        )
+
+    def render_content(self, when):
+        """when の予約の投稿内容"""
+        return render_template(self.content_template, when)
+
+    def save(self, *args, **kwargs):
+        if self.is_active and self.next_fire_at is None:
+            self.reset_next_fire()
+        elif not self.is_active:
+            self.next_fire_at = None
+        super().save(*args, **kwargs)
+
+
 class DailyPostCounter(models.Model):
-    """日次の投稿カウントを管理するモデル"""
+    """日次の投稿カウントをアカウントごとに管理するモデル (account が空なら既定のアカウント)"""
 
-    date = models.DateField("日付", unique=True)
+    account = models.ForeignKey(
+        Account,
+        verbose_name="アカウント",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="daily_counters",
+    )
+    date = models.DateField("日付")
     post_count = models.IntegerField("投稿回数", default=0)
     created_at = models.DateTimeField("作成日時", auto_now_add=True)
     updated_at = models.DateTimeField("更新日時", auto_now=True)
@@ -86,19 +372,65 @@ class DailyPostCounter(models.Model):
         verbose_name = "日次投稿カウンター"
         verbose_name_plural = "日次投稿カウンター"
         ordering = ["-date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "date"], name="daily_counter_account_date_uniq"
+            ),
+            # NULL 同士は一意制約で重複とみなされないため、既定のアカウントは別に制約する
+            models.UniqueConstraint(
+                fields=["date"],
+                condition=models.Q(account__isnull=True),
+                name="daily_counter_default_date_uniq",
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.date.strftime('%Y-%m-%d')}: {self.post_count}/{settings.MAX_DAILY_POSTS_PER_USER}"
+        prefix = f"{self.account}: " if self.account_id else ""
+        return f"{prefix}{self.date.strftime('%Y-%m-%d')}: {self.post_count}/{self.limit}"
+
+    @property
+    def limit(self):
+        """このカウンターのアカウントの1日の投稿上限"""
+        return daily_limit_for(self.account if self.account_id else None)
 
     @classmethod
-    def get_today_counter(cls):
+    def get_today_counter(cls, account=None):
         """本日のカウンターを取得または作成"""
         today = timezone.localdate()
         counter, created = cls.objects.get_or_create(
-            date=today, defaults={"post_count": 0}
+            account=account, date=today, defaults={"post_count": 0}
         )
         return counter
 
+    @classmethod
+    def reserve(cls, date=None, account=None):
+        """
+        投稿枠を1件予約し、予約した日付を返す (上限に達している場合は None)。
+        上限未満の場合だけ加算する条件付きの UPDATE で行うため、
+        複数のプロセスから同時に呼ばれても上限を超えない。
+        """
+        date = date or timezone.localdate()
+        if cls._increment_if_available(date, account):
+            return date
+        # その日のカウンターがまだない場合に備えて作成し、もう一度だけ試す
+        cls.objects.get_or_create(
+            account=account, date=date, defaults={"post_count": 0}
+        )
+        return date if cls._increment_if_available(date, account) else None
+
+    @classmethod
+    def _increment_if_available(cls, date, account):
+        return cls.objects.filter(
+            account=account, date=date, post_count__lt=daily_limit_for(account)
+        ).update(post_count=models.F("post_count") + 1, updated_at=timezone.now())
+
+    @classmethod
+    def release(cls, date, account=None):
+        """予約した投稿枠を返却する (投稿に失敗した場合)"""
+        cls.objects.filter(account=account, date=date, post_count__gt=0).update(
+            post_count=models.F("post_count") - 1, updated_at=timezone.now()
+        )
+
     def increment_count(self):
         """このインスタンスの投稿カウントを1増やす"""
         self.post_count += 1
@@ -107,12 +439,12 @@ class DailyPostCounter(models.Model):
     @property
     def remaining_posts(self):
         """残りの投稿可能数を返す"""
-        return max(0, settings.MAX_DAILY_POSTS_PER_USER - self.post_count)
+        return max(0, self.limit - self.post_count)
 
     @property
     def is_limit_reached(self):
         """投稿上限に達したかどうかを返す"""
-        return self.post_count >= settings.MAX_DAILY_POSTS_PER_USER
+        return self.post_count >= self.limit
 
 
 class SystemSetting(models.Model):
@@ -147,3 +479,103 @@ class SystemSetting(models.Model):
             key=key, defaults={"value": value, "description": description}
         )
         return obj
+
+
+class PostingAttempt(models.Model):
+    """投稿1回ごとのフェーズ別所要時間とレスポンス情報"""
+
+    tweet = models.ForeignKey(
+        TweetSchedule,
+        verbose_name="ツイート予約",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="attempts",
+    )
+    source = models.CharField("実行元", max_length=30)
+    started_at = models.DateTimeField("開始日時", db_index=True)
+    success = models.BooleanField("成功", default=False)
+    error_message = models.TextField("エラーメッセージ", blank=True, default="")
+    open_image_seconds = models.FloatField("画像オープン(秒)", null=True, blank=True)
+    media_upload_seconds = models.FloatField("画像アップロード(秒)", null=True, blank=True)
+    create_tweet_seconds = models.FloatField("ツイート投稿(秒)", null=True, blank=True)
+    db_save_seconds = models.FloatField("DB保存(秒)", null=True, blank=True)
+    total_seconds = models.FloatField("合計(秒)")
+    bytes_uploaded = models.PositiveIntegerField("アップロードサイズ(バイト)", default=0)
+    http_status = models.PositiveSmallIntegerField("HTTPステータス", null=True, blank=True)
+    rate_limit_limit = models.IntegerField("レート制限の上限", null=True, blank=True)
+    rate_limit_remaining = models.IntegerField("レート制限の残り", null=True, blank=True)
+    rate_limit_reset = models.IntegerField("レート制限のリセット時刻", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "投稿試行"
+        verbose_name_plural = "投稿試行一覧"
+        ordering = ["-started_at"]
+
+    def __str__(self):
+        result = "成功" if self.success else "失敗"
+        return f"{self.started_at.strftime('%Y-%m-%d %H:%M:%S')} {self.source} ({result}, {self.total_seconds:.2f}秒)"
+
+
+class EngagementSnapshot(models.Model):
+    """投稿済みツイートの公開指標 (public_metrics) を collect_metrics で取得した時点の値"""
+
+    tweet = models.ForeignKey(
+        TweetSchedule,
+        verbose_name="ツイート予約",
+        on_delete=models.CASCADE,
+        related_name="engagement_snapshots",
+    )
+    collected_at = models.DateTimeField("取得日時")
+    impression_count = models.PositiveIntegerField("表示回数", default=0)
+    like_count = models.PositiveIntegerField("いいね", default=0)
+    retweet_count = models.PositiveIntegerField("リポスト", default=0)
+    reply_count = models.PositiveIntegerField("返信", default=0)
+    quote_count = models.PositiveIntegerField("引用", default=0)
+    bookmark_count = models.PositiveIntegerField("ブックマーク", default=0)
+
+    # public_metrics のキーと同名のフィールド
+    METRIC_FIELDS = (
+        "impression_count",
+        "like_count",
+        "retweet_count",
+        "reply_count",
+        "quote_count",
+        "bookmark_count",
+    )
+
+    class Meta:
+        verbose_name = "エンゲージメント記録"
+        verbose_name_plural = "エンゲージメント記録一覧"
+        ordering = ["-collected_at"]
+        indexes = [
+            # ツイートごとの時系列と、最後に取得した日時の集計用
+            models.Index(
+                fields=["tweet", "collected_at"], name="engagement_tweet_time_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.collected_at.strftime('%Y-%m-%d %H:%M')} {self.tweet_id} (いいね {self.like_count})"
+
+
+class MetricValue(models.Model):
+    """プロセスをまたいで集計するメトリクスの累積値"""
+
+    name = models.CharField("メトリクス名", max_length=100)
+    labels = models.CharField("ラベル", max_length=200, blank=True, default="")
+    value = models.FloatField("値", default=0)
+    updated_at = models.DateTimeField("更新日時", auto_now=True)
+
+    class Meta:
+        verbose_name = "メトリクス"
+        verbose_name_plural = "メトリクス一覧"
+        ordering = ["name", "labels"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "labels"], name="unique_metric_name_labels"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name}{{{self.labels}}} = {self.value}"
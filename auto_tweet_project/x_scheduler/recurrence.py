@@ -0,0 +1,173 @@
+"""
+繰り返し投稿 (RecurringPattern) の予約の作成
+
+繰り返しパターンは将来の全日程を展開せず、次回の投稿時刻 (next_fire_at、索引付き) だけを持つ。
+materialize() は現在時刻から RECURRENCE_HORIZON_HOURS 時間以内に次回の投稿時刻が来る
+パターンだけを取得し、その範囲の分の TweetSchedule を作成して next_fire_at を範囲の後に進める。
+process_tweets とディスパッチャー (run_worker --dispatch) の再計画のたびに呼ばれ、
+作成する分がない場合のクエリは索引を使った1回だけになる。
+
+- 投稿内容の {date} / {time} はパターンごとに1回だけ解析したテンプレートから展開する
+- 範囲内の予約は画像のコピーを含めて用意し、1回の bulk_create で登録する
+- 次回の投稿時刻は「読み込んだ値のままなら更新する」条件付き UPDATE で進めるため、
+  複数のプロセスが同時に実行しても同じ予約が重複して作成されない
+- 予定時刻を過ぎた分 (長時間停止していた場合) は作成しない
+- 1日の投稿上限 (slots.SlotAllocator でパターンのアカウントごとに確認) を超える分は作成しない
+"""
+
+import logging
+import os
+from datetime import timedelta
+from functools import lru_cache
+from string import Formatter
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .slots import SlotAllocator
+from .wakeup import notify_schedule_changed
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+# テンプレートで使える置換項目と書式
+TEMPLATE_FIELDS = {
+    "date": "%Y/%m/%d",
+    "time": "%H:%M",
+}
+
+
+@lru_cache(maxsize=256)
+def compile_template(template):
+    """
+    投稿内容のテンプレートを (文字列, 置換項目) の組のタプルに分解する。
+    使えない置換項目があれば ValueError を送出する。
+    """
+    parts = []
+    for literal, field, format_spec, conversion in Formatter().parse(template):
+        if field is not None and (
+            field not in TEMPLATE_FIELDS or format_spec or conversion
+        ):
+            raise ValueError(
+                f"テンプレートで使える置換項目は {{date}} と {{time}} だけです: {{{field}}}"
+            )
+        parts.append((literal, field))
+    return tuple(parts)
+
+
+def render_template(template, when):
+    """テンプレートの {date} / {time} を when (現地時刻) で置き換える"""
+    local = timezone.localtime(when)
+    values = {field: local.strftime(fmt) for field, fmt in TEMPLATE_FIELDS.items()}
+    return "".join(
+        literal + (values[field] if field else "")
+        for literal, field in compile_template(template)
+    )
+
+
+def _copy_image(pattern, tweet):
+    """パターンの画像を予約ごとにコピーする (予約の削除・編集時に画像が削除されるため)"""
+    with pattern.image.storage.open(pattern.image.name, "rb") as image_file:
+        tweet.image.save(
+            os.path.basename(pattern.image.name), File(image_file), save=False
+        )
+
+
+def materialize(now=None, horizon_hours=None):
+    """
+    先読み期間に入った繰り返しパターンの予約を作成する。
+    戻り値: {"patterns": 対象のパターン数, "created": 作成した予約数,
+             "skipped_past": 予定時刻を過ぎていて作成しなかった数,
+             "skipped_limit": 投稿上限のため作成しなかった数}
+    """
+    from .models import RecurringPattern, TweetSchedule  # 循環インポート回避
+
+    now = now or timezone.now()
+    horizon_hours = (
+        settings.RECURRENCE_HORIZON_HOURS if horizon_hours is None else horizon_hours
+    )
+    result = {"patterns": 0, "created": 0, "skipped_past": 0, "skipped_limit": 0}
+    if horizon_hours <= 0:
+        return result
+    horizon = now + timedelta(hours=horizon_hours)
+
+    patterns = list(
+        RecurringPattern.objects.filter(is_active=True, next_fire_at__lte=horizon)
+        .select_related("account")
+        .order_by("next_fire_at")
+    )
+    if not patterns:
+        return result
+
+    # 投稿枠はアカウントごとに数える
+    allocators = {}
+    saved_files = []
+    tweets = []
+    try:
+        with transaction.atomic():
+            for pattern in patterns:
+                due = []
+                fire_at = pattern.next_fire_at
+                while fire_at <= horizon:
+                    due.append(fire_at)
+                    fire_at = pattern.next_fire_after(fire_at)
+                # 別のプロセスが先に進めていれば、そちらで作成済みのため何もしない
+                claimed = RecurringPattern.objects.filter(
+                    pk=pattern.pk, next_fire_at=pattern.next_fire_at
+                ).update(next_fire_at=fire_at, updated_at=now)
+                if not claimed:
+                    continue
+                result["patterns"] += 1
+
+                allocator = allocators.get(pattern.account_id)
+                if allocator is None:
+                    allocator = allocators[pattern.account_id] = SlotAllocator(
+                        account=pattern.account
+                    )
+                for when in due:
+                    if when < now:
+                        result["skipped_past"] += 1
+                        continue
+                    if not allocator.take(when):
+                        result["skipped_limit"] += 1
+                        logger.warning(
+                            f"繰り返しパターン「{pattern.name}」の "
+                            f"{timezone.localtime(when):%m/%d %H:%M} の予約は、"
+                            f"1日の投稿上限（{allocator.limit}件）に達しているため作成しません"
+                        )
+                        continue
+                    tweet = TweetSchedule(
+                        account=pattern.account,
+                        content=pattern.render_content(when),
+                        scheduled_time=when,
+                        recurring_pattern=pattern,
+                    )
+                    if pattern.image:
+                        _copy_image(pattern, tweet)
+                        saved_files.append(tweet.image.name)
+                    tweets.append(tweet)
+
+            TweetSchedule.objects.bulk_create(tweets)
+    except Exception:
+        # 登録できなかった予約のコピー済み画像は削除する
+        storage = TweetSchedule._meta.get_field("image").storage
+        for name in saved_files:
+            storage.delete(name)
+        raise
+
+    result["created"] = len(tweets)
+    if tweets:
+        # bulk_create はシグナルを送らないため、ディスパッチャーへ明示的に通知する
+        notify_schedule_changed()
+    if result["skipped_past"]:
+        logger.warning(
+            f"予定時刻を過ぎた繰り返し投稿 {result['skipped_past']}件は作成しませんでした"
+        )
+    if result["patterns"]:
+        logger.info(
+            f"繰り返しパターン {result['patterns']}件から予約を {len(tweets)}件作成しました"
+            f" ({timezone.localtime(horizon):%m/%d %H:%M} まで)"
+        )
+    return result
@@ -0,0 +1,42 @@
+"""
+予約の変更をディスパッチャーに通知するシグナルハンドラー (apps.XSchedulerConfig.ready で登録)
+"""
+
+import contextvars
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import TweetSchedule
+from .wakeup import notify_schedule_changed
+
+# 予定時刻の再計算が必要な状態 (投稿済み・失敗への更新では通知しない)
+WAKEUP_STATUSES = ("pending",)
+
+# 一括操作の間は1行ごとの通知を止める (呼び出し側が最後に1回だけ通知する)
+_suppressed = contextvars.ContextVar("schedule_wakeup_suppressed", default=False)
+
+
+@contextmanager
+def suppress_wakeup():
+    """ブロック内の save() / delete() ではディスパッチャーへ通知しない"""
+    token = _suppressed.set(True)
+    try:
+        yield
+    finally:
+        _suppressed.reset(token)
+
+
+@receiver(post_save, sender=TweetSchedule, dispatch_uid="x_scheduler_schedule_saved")
+def schedule_saved(sender, instance, using, **kwargs):
+    if not _suppressed.get() and instance.status in WAKEUP_STATUSES:
+        notify_schedule_changed(using=using)
+
+
+@receiver(
+    post_delete, sender=TweetSchedule, dispatch_uid="x_scheduler_schedule_deleted"
+)
+def schedule_deleted(sender, instance, using, **kwargs):
+    if not _suppressed.get() and instance.status in WAKEUP_STATUSES:
+        notify_schedule_changed(using=using)
@@ -0,0 +1,56 @@
+"""
+投稿遅延 (dispatch lag) の SLO 集計
+
+TweetSchedule.dispatch_lag (予定時刻 → 実際の投稿) を投稿日時の日別・時間帯別に
+集計し、settings.DISPATCH_LAG_SLO_PERCENTILE のパーセンタイル値が
+settings.DISPATCH_LAG_SLO_SECONDS を超えた区分を SLO 違反として返す。
+"""
+
+from django.conf import settings
+from django.utils import timezone
+
+from .metrics import percentile
+from .models import TweetSchedule
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def dispatch_lag_report(days=7, by="day"):
+    """
+    直近 days 日間 (本日を含む) の投稿遅延を集計する。
+    戻り値: 閾値・対象パーセンタイルと、区分ごとの件数・パーセンタイル (秒)・違反有無
+    """
+    threshold = settings.DISPATCH_LAG_SLO_SECONDS
+    target = settings.DISPATCH_LAG_SLO_PERCENTILE
+    since = timezone.localtime().replace(
+        hour=0, minute=0, second=0, microsecond=0
+    ) - timezone.timedelta(days=days - 1)
+
+    lags_by_key = {}
+    posted = (
+        TweetSchedule.objects.filter(posted_at__gte=since, dispatch_lag__isnull=False)
+        .values_list("posted_at", "dispatch_lag")
+        .iterator()
+    )
+    for posted_at, lag in posted:
+        local = timezone.localtime(posted_at)
+        key = local.strftime("%Y-%m-%d") if by == "day" else f"{local.hour:02d}"
+        lags_by_key.setdefault(key, []).append(lag.total_seconds())
+
+    groups = []
+    for key in sorted(lags_by_key):
+        lags = sorted(lags_by_key[key])
+        group = {"key": key, "count": len(lags), "max": lags[-1]}
+        for p in PERCENTILES:
+            group[f"p{p}"] = percentile(lags, p)
+        group["breach"] = percentile(lags, target) > threshold
+        groups.append(group)
+
+    return {
+        "by": by,
+        "days": days,
+        "threshold_seconds": threshold,
+        "percentile": target,
+        "groups": groups,
+        "breaches": [group["key"] for group in groups if group["breach"]],
+    }
@@ -0,0 +1,95 @@
+"""
+日ごとの投稿上限を考慮した投稿枠の割り当て
+
+予約を作成する前に、その日の投稿枠 (MAX_DAILY_POSTS_PER_USER から投稿済み数と
+作成済みの予約数を差し引いた数) が残っているかを確認する。上限を超える予約は
+作成時に拒否するか、枠の空いている日の同じ時刻に回す (投稿時の延期に頼らない)。
+
+日ごとの件数は最初に使うときに1回の GROUP BY で読み込み、以後は割り当てのたびに
+手元の件数を更新するため、一括作成でも1件ごとのクエリは発生しない。
+投稿枠はアカウントごとに数える (account が None なら既定のアカウント)。
+"""
+
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# 投稿枠を使用する予約の状態
+BOOKED_STATUSES = ("pending", "scheduled")
+
+
+class SlotAllocator:
+    """日ごとの投稿枠を数え、新しい予約に枠を割り当てるクラス"""
+
+    def __init__(self, limit=None, exclude_ids=(), since=None, account=None):
+        from .models import daily_limit_for  # 循環インポート回避
+
+        self.account = account
+        self.limit = daily_limit_for(account) if limit is None else limit
+        # 編集中・再配置中の予約は自分自身の枠を数えない
+        self.exclude_ids = [pk for pk in exclude_ids if pk is not None]
+        self.since = since or timezone.localdate()
+        self._counts = None
+
+    def _load(self):
+        """since 以降の日ごとの予約数と投稿済み数を読み込む"""
+        from .models import DailyPostCounter, TweetSchedule  # 循環インポート回避
+
+        start = timezone.make_aware(datetime.combine(self.since, time.min))
+        booked = TweetSchedule.objects.filter(
+            account=self.account,
+            status__in=BOOKED_STATUSES,
+            scheduled_time__gte=start,
+        )
+        if self.exclude_ids:
+            booked = booked.exclude(pk__in=self.exclude_ids)
+        counts = Counter(
+            dict(
+                booked.annotate(day=TruncDate("scheduled_time"))
+                .values("day")
+                .annotate(count=Count("id"))
+                .values_list("day", "count")
+            )
+        )
+        for day, post_count in DailyPostCounter.objects.filter(
+            account=self.account, date__gte=self.since
+        ).values_list("date", "post_count"):
+            counts[day] += post_count
+        return counts
+
+    @property
+    def counts(self):
+        if self._counts is None:
+            self._counts = self._load()
+        return self._counts
+
+    def remaining(self, day):
+        """day の残り投稿枠"""
+        return max(0, self.limit - self.counts[day])
+
+    def take(self, when):
+        """when の日に枠があれば1件分を確保して True を返す"""
+        day = timezone.localdate(when)
+        if self.remaining(day) <= 0:
+            return False
+        self.counts[day] += 1
+        return True
+
+    def next_free(self, when):
+        """when 以降で枠の残っている日の同じ時刻を返す (確保はしない)。上限が0以下なら None"""
+        if self.limit <= 0:
+            return None
+        candidate = when
+        while self.remaining(timezone.localdate(candidate)) <= 0:
+            candidate += timedelta(days=1)
+        return candidate
+
+    def allocate(self, when):
+        """when 以降で最初に空いている枠を確保し、その時刻を返す。上限が0以下なら None"""
+        candidate = self.next_free(when)
+        if candidate is not None:
+            self.take(candidate)
+        return candidate
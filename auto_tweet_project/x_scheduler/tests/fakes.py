@@ -0,0 +1,100 @@
+"""テスト用の X API クライアント (tweepy.API / tweepy.Client の代わり)"""
+
+import itertools
+
+from requests.structures import CaseInsensitiveDict
+
+
+class FakeResponse:
+    """tweepy の Response 相当"""
+
+    def __init__(self, data):
+        self.data = data
+        self.headers = CaseInsensitiveDict()
+
+
+class FakeHTTPResponse:
+    """レスポンスフックに渡す requests.Response 相当"""
+
+    def __init__(self, url, headers):
+        self.url = url
+        self.status_code = 200
+        self.headers = CaseInsensitiveDict(headers)
+
+
+class FakeSession:
+    """requests.Session の hooks だけを持つセッション"""
+
+    def __init__(self):
+        self.hooks = {"response": []}
+
+
+class FakeMedia:
+    def __init__(self, media_id):
+        self.media_id = media_id
+
+
+class FakeUser:
+    screen_name = "fake_user"
+    id = 1
+
+
+class FakeTweepyAPI:
+    """tweepy.API (v1.1) の代わりに、ネットワークに接続せず即座に応答する"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self):
+        self.session = FakeSession()
+        self.uploaded = []
+
+    def verify_credentials(self):
+        return FakeUser()
+
+    def media_upload(self, filename, file=None):
+        self.uploaded.append(filename)
+        return FakeMedia(next(self._ids))
+
+
+class FakeTweepyClient:
+    """tweepy.Client (v2) の代わりに、ネットワークに接続せず即座に応答する"""
+
+    _ids = itertools.count(1000)
+
+    def __init__(self):
+        self.session = FakeSession()
+        self.tweets = []
+        # get_tweets で返す公開指標 (ツイートID → public_metrics) と呼び出し履歴
+        self.public_metrics = {}
+        self.lookups = []
+        # 設定するとツイート取得ごとに減らし、レート制限ヘッダーとしてフックに渡す
+        self.rate_limit_remaining = None
+        self.rate_limit_reset = 0
+
+    def get_me(self):
+        return FakeResponse({"id": "1"})
+
+    def create_tweet(self, text, media_ids=None):
+        self.tweets.append((text, media_ids))
+        return FakeResponse({"id": str(next(self._ids)), "text": text})
+
+    def get_tweets(self, ids, tweet_fields=None, user_auth=False):
+        self.lookups.append(list(ids))
+        if self.rate_limit_remaining is not None:
+            self.rate_limit_remaining -= 1
+            response = FakeHTTPResponse(
+                "https://api.x.com/2/tweets",
+                {
+                    "x-rate-limit-remaining": str(self.rate_limit_remaining),
+                    "x-rate-limit-reset": str(self.rate_limit_reset),
+                },
+            )
+            for hook in self.session.hooks["response"]:
+                hook(response)
+        return FakeResponse(
+            [
+                {"id": tweet_id, "public_metrics": self.public_metrics[tweet_id]}
+                for tweet_id in ids
+                if tweet_id in self.public_metrics
+            ]
+        )
@@ -0,0 +1,275 @@
+import os
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from freezegun import freeze_time
+
+from .. import health
+from ..models import Account, DailyPostCounter, TweetSchedule
+from ..slots import SlotAllocator
+from ..utils import (
+    RunBudget,
+    TwitterAPIClient,
+    account_label,
+    disable_client_reuse,
+    enable_client_reuse,
+    process_scheduled_tweets,
+)
+from .fakes import FakeTweepyAPI, FakeTweepyClient
+
+
+def _local(hour, day=3):
+    return timezone.make_aware(datetime(2025, 4, day, hour))
+
+
+class AccountModelTest(TestCase):
+    """アカウントと、アカウントごとの投稿カウンターのテストクラス"""
+
+    def setUp(self):
+        self.account = Account.objects.create(
+            name="brand-a", credentials_prefix="X_BRAND_A", max_daily_posts=2
+        )
+
+    @patch.dict(
+        os.environ,
+        {
+            "X_BRAND_A_API_KEY": "key",
+            "X_BRAND_A_API_SECRET": "secret",
+            "X_BRAND_A_ACCESS_TOKEN": "token",
+            "X_BRAND_A_ACCESS_TOKEN_SECRET": "token-secret",
+        },
+    )
+    def test_credentials_from_env(self):
+        self.assertEqual(
+            self.account.credentials(),
+            {
+                "api_key": "key",
+                "api_secret": "secret",
+                "access_token": "token",
+                "access_token_secret": "token-secret",
+            },
+        )
+
+    @override_settings(MAX_DAILY_POSTS_PER_USER=5)
+    def test_daily_limit(self):
+        self.assertEqual(self.account.daily_limit, 2)
+        self.account.max_daily_posts = None
+        self.assertEqual(self.account.daily_limit, 5)
+
+    @override_settings(MAX_DAILY_POSTS_PER_USER=1)
+    def test_counters_are_per_account(self):
+        self.assertIsNotNone(DailyPostCounter.reserve(account=self.account))
+        self.assertIsNotNone(DailyPostCounter.reserve(account=self.account))
+        self.assertIsNone(DailyPostCounter.reserve(account=self.account))
+        # 既定のアカウントの枠は別に数える
+        self.assertIsNotNone(DailyPostCounter.reserve())
+        self.assertIsNone(DailyPostCounter.reserve())
+
+        self.assertTrue(
+            DailyPostCounter.get_today_counter(self.account).is_limit_reached
+        )
+        self.assertEqual(DailyPostCounter.objects.count(), 2)
+
+    @freeze_time("2025-04-03 01:00:00")
+    def test_slot_allocator_per_account(self):
+        TweetSchedule.objects.create(
+            account=self.account, content="予約", scheduled_time=_local(12)
+        )
+        TweetSchedule.objects.create(content="既定", scheduled_time=_local(13))
+        self.assertEqual(
+            SlotAllocator(account=self.account).remaining(_local(0).date()), 1
+        )
+        self.assertEqual(SlotAllocator(limit=2).remaining(_local(0).date()), 1)
+
+
+class ClientPoolTest(TestCase):
+    """アカウントごとの API クライアントの使い回しのテストクラス"""
+
+    def setUp(self):
+        self.brand_a = Account.objects.create(name="brand-a", credentials_prefix="X_A")
+        self.brand_b = Account.objects.create(name="brand-b", credentials_prefix="X_B")
+        patcher = patch.object(
+            TwitterAPIClient, "_initialize_client_v2", lambda self: FakeTweepyClient()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        enable_client_reuse()
+        self.addCleanup(disable_client_reuse)
+
+    def test_clients_are_cached_per_account(self):
+        first = TwitterAPIClient(self.brand_a).client_v2
+        self.assertIs(TwitterAPIClient(self.brand_a).client_v2, first)
+        self.assertIsNot(TwitterAPIClient(self.brand_b).client_v2, first)
+        self.assertIsNot(TwitterAPIClient().client_v2, first)
+
+
+@freeze_time("2025-04-03 01:00:00")
+@override_settings(MAX_DAILY_POSTS_PER_USER=10)
+class MultiAccountDispatchTest(TestCase):
+    """複数アカウントの予約の投稿のテストクラス"""
+
+    def setUp(self):
+        self.clients = {}
+
+        def client_for(client):
+            return self.clients.setdefault(
+                account_label(client.account), FakeTweepyClient()
+            )
+
+        for patcher in (
+            patch.object(
+                TwitterAPIClient, "_initialize_api_v1", lambda self: FakeTweepyAPI()
+            ),
+            patch.object(TwitterAPIClient, "_initialize_client_v2", client_for),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.brand_a = Account.objects.create(name="brand-a", credentials_prefix="X_A")
+        self.brand_b = Account.objects.create(
+            name="brand-b", credentials_prefix="X_B", max_daily_posts=1
+        )
+        due = timezone.now() - timedelta(minutes=30)
+        # brand-a の予約が最も多く、最も古い
+        for i in range(4):
+            TweetSchedule.objects.create(
+                account=self.brand_a,
+                content=f"A{i}",
+                scheduled_time=due - timedelta(minutes=10 - i),
+            )
+        for i in range(2):
+            TweetSchedule.objects.create(
+                account=self.brand_b,
+                content=f"B{i}",
+                scheduled_time=due + timedelta(minutes=i),
+            )
+        TweetSchedule.objects.create(content="既定", scheduled_time=due)
+
+    def _posted(self, label):
+        client = self.clients.get(label)
+        return [text for text, _ in client.tweets] if client else []
+
+    def test_each_account_posts_with_its_own_client_and_quota(self):
+        self.assertEqual(process_scheduled_tweets(), 6)
+        self.assertEqual(self._posted("brand-a"), ["A0", "A1", "A2", "A3"])
+        self.assertEqual(self._posted("default"), ["既定"])
+        # brand-b は上限1件のため、残りは翌日に延期される
+        self.assertEqual(self._posted("brand-b"), ["B0"])
+        deferred = TweetSchedule.objects.get(content="B1")
+        self.assertEqual(deferred.status, "pending")
+        self.assertIn("本日の投稿上限（1）", deferred.error_message)
+
+        self.assertEqual(DailyPostCounter.get_today_counter(self.brand_a).post_count, 4)
+        self.assertEqual(DailyPostCounter.get_today_counter().post_count, 1)
+        # 接続確認の結果もアカウントごとに記録される
+        self.assertEqual(health.load(self.brand_a)["source"], "post")
+        self.assertEqual(health.load()["source"], "post")
+
+    def test_budget_is_shared_fairly(self):
+        budget = RunBudget(max_posts=3)
+        self.assertEqual(process_scheduled_tweets(budget=budget), 3)
+        # 予約の多い brand-a だけが進むのではなく、各アカウントから1件ずつ投稿される
+        self.assertEqual(self._posted("brand-a"), ["A0"])
+        self.assertEqual(self._posted("brand-b"), ["B0"])
+        self.assertEqual(self._posted("default"), ["既定"])
+        self.assertEqual(budget.deferred, 4)
+
+    def test_budget_counts_only_reserved_posts(self):
+        counter = DailyPostCounter.get_today_counter(self.brand_b)
+        counter.post_count = 1
+        counter.save()
+        budget = RunBudget(max_posts=3)
+        # 上限に達した brand-b の予約は延期され、実行の上限には数えない
+        self.assertEqual(process_scheduled_tweets(budget=budget), 3)
+        self.assertEqual(self._posted("brand-a"), ["A0", "A1"])
+        self.assertEqual(self._posted("default"), ["既定"])
+        self.assertEqual(budget.claimed, 3)
+
+    def test_inactive_account_is_skipped(self):
+        Account.objects.filter(pk=self.brand_a.pk).update(is_active=False)
+        self.assertEqual(process_scheduled_tweets(), 2)
+        self.assertEqual(
+            TweetSchedule.objects.filter(
+                account=self.brand_a, status="pending"
+            ).count(),
+            4,
+        )
+
+    def test_process_tweets_for_one_account(self):
+        call_command(
+            "process_tweets", "--skip-api-test", "--no-catch-up", "--account", "brand-a"
+        )
+        self.assertEqual(self._posted("brand-a"), ["A0", "A1", "A2", "A3"])
+        self.assertEqual(
+            TweetSchedule.objects.exclude(account=self.brand_a)
+            .filter(status="posted")
+            .count(),
+            0,
+        )
+
+    def test_process_tweets_when_default_account_is_at_limit(self):
+        counter = DailyPostCounter.get_today_counter()
+        counter.post_count = counter.limit
+        counter.save()
+        call_command(
+            "process_tweets", "--skip-api-test", "--no-catch-up", "--max-posts", "2"
+        )
+        # 既定のアカウントが上限でも、他のアカウントは --max-posts の範囲で投稿する
+        self.assertEqual(self._posted("brand-a"), ["A0"])
+        self.assertEqual(self._posted("brand-b"), ["B0"])
+        self.assertEqual(self._posted("default"), [])
+
+    def _run_with_probe(self, *args, failing=()):
+        """接続テストの結果をアカウントごとに差し替えて process_tweets を実行する"""
+
+        def test_connection(client):
+            if account_label(client.account) in failing:
+                return {"success": False, "error": "401 Unauthorized"}
+            return {"success": True, "error": "", "user_id": "1"}
+
+        with patch.object(
+            TwitterAPIClient,
+            "test_connection",
+            autospec=True,
+            side_effect=test_connection,
+        ) as mock_test, patch(
+            "x_scheduler.management.commands.process_tweets.time.sleep"
+        ):
+            call_command("process_tweets", "--no-catch-up", "--max-retries", "0", *args)
+        return sorted(
+            account_label(call.args[0].account) for call in mock_test.mock_calls
+        )
+
+    def test_process_tweets_probes_only_accounts_with_due_tweets(self):
+        TweetSchedule.objects.filter(account=None).delete()
+        probed = self._run_with_probe(failing=("default",))
+        # 予約のない既定のアカウントは接続テストを行わず、失敗も記録されない
+        self.assertEqual(probed, ["brand-a", "brand-b"])
+        self.assertIsNone(health.load())
+        self.assertEqual(self._posted("brand-a"), ["A0", "A1", "A2", "A3"])
+
+    def test_process_tweets_skips_account_whose_probe_fails(self):
+        probed = self._run_with_probe(failing=("brand-b",))
+        self.assertEqual(probed, ["brand-a", "brand-b", "default"])
+        # 接続テストに失敗したアカウントの予約だけが pending のまま残る
+        self.assertEqual(self._posted("brand-b"), [])
+        self.assertEqual(
+            TweetSchedule.objects.filter(
+                account=self.brand_b, status="pending"
+            ).count(),
+            2,
+        )
+        self.assertEqual(self._posted("brand-a"), ["A0", "A1", "A2", "A3"])
+        self.assertEqual(self._posted("default"), ["既定"])
+        self.assertFalse(health.load(self.brand_b)["ok"])
+
+    def test_process_tweets_abort_on_error(self):
+        self._run_with_probe("--abort-on-error", failing=("brand-b",))
+        self.assertFalse(TweetSchedule.objects.filter(status="posted").exists())
+
+    def test_process_tweets_unknown_account(self):
+        with self.assertRaises(CommandError):
+            call_command("process_tweets", "--account", "missing")
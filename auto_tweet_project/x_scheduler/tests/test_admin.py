@@ -0,0 +1,113 @@
+import os
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.admin import helpers
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import EngagementSnapshot, PostingAttempt, TweetSchedule
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class TweetScheduleAdminActionTest(TestCase):
+    """TweetScheduleAdmin の一括操作のテストクラス"""
+
+    def setUp(self):
+        user = get_user_model().objects.create_superuser("admin", "", "password")
+        self.client.force_login(user)
+        self.url = reverse("admin:x_scheduler_tweetschedule_changelist")
+        self.scheduled_time = timezone.now() + timezone.timedelta(hours=1)
+        self.pending = TweetSchedule.objects.create(
+            content="待機中", scheduled_time=self.scheduled_time
+        )
+        self.failed = TweetSchedule.objects.create(
+            content="失敗",
+            scheduled_time=self.scheduled_time,
+            status="failed",
+            error_message="APIエラー",
+        )
+
+    def _run_action(self, action, tweets, **extra):
+        data = {
+            "action": action,
+            helpers.ACTION_CHECKBOX_NAME: [str(t.pk) for t in tweets],
+            **extra,
+        }
+        return self.client.post(self.url, data, follow=True)
+
+    def test_retry_failed(self):
+        """失敗した予約だけが待機中に戻ることをテスト"""
+        self._run_action("retry_failed", [self.pending, self.failed])
+        self.failed.refresh_from_db()
+        self.assertEqual(self.failed.status, "pending")
+        self.assertIsNone(self.failed.error_message)
+
+    def test_shift_scheduled_time(self):
+        """待機中の予約の予定時刻が指定した分数だけずれることをテスト"""
+        old_updated_at = self.pending.updated_at
+        self._run_action(
+            "shift_scheduled_time", [self.pending, self.failed], offset_minutes="30"
+        )
+        self.pending.refresh_from_db()
+        self.failed.refresh_from_db()
+        self.assertEqual(
+            self.pending.scheduled_time,
+            self.scheduled_time + timezone.timedelta(minutes=30),
+        )
+        self.assertGreater(self.pending.updated_at, old_updated_at)
+        self.assertEqual(self.failed.scheduled_time, self.scheduled_time)
+
+    def test_shift_requires_offset(self):
+        """分数が指定されない場合は何も変更されないことをテスト"""
+        response = self._run_action("shift_scheduled_time", [self.pending])
+        self.assertContains(response, "ずらす分数を指定してください。")
+        self.pending.refresh_from_db()
+        self.assertEqual(self.pending.scheduled_time, self.scheduled_time)
+
+    def test_cancel_pending(self):
+        """待機中の予約だけがキャンセルされることをテスト"""
+        self._run_action("cancel_pending", [self.pending, self.failed])
+        self.pending.refresh_from_db()
+        self.failed.refresh_from_db()
+        self.assertEqual(self.pending.status, "cancelled")
+        self.assertEqual(self.failed.status, "failed")
+
+    def test_purge_with_media(self):
+        """予約と画像ファイルがまとめて削除されることをテスト"""
+        self.pending.image = SimpleUploadedFile("image.png", b"dummy image")
+        self.pending.save()
+        image_path = os.path.join(settings.MEDIA_ROOT, self.pending.image.name)
+        self.assertTrue(os.path.exists(image_path))
+
+        attempt = PostingAttempt.objects.create(
+            tweet=self.failed,
+            source="process_tweets",
+            started_at=timezone.now(),
+            total_seconds=1.0,
+        )
+        EngagementSnapshot.objects.create(
+            tweet=self.failed, collected_at=timezone.now()
+        )
+
+        second = TweetSchedule.objects.create(
+            content="待機中2", scheduled_time=self.scheduled_time
+        )
+
+        with patch("x_scheduler.wakeup.publish") as mock_publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self._run_action(
+                    "purge_with_media", [self.pending, second, self.failed]
+                )
+        # 削除した行ごとではなく、まとめて1回だけ通知する
+        mock_publish.assert_called_once()
+
+        self.assertFalse(TweetSchedule.objects.exists())
+        self.assertFalse(os.path.exists(image_path))
+        # 投稿試行の記録は残し、公開指標は予約とともに削除する
+        attempt.refresh_from_db()
+        self.assertIsNone(attempt.tweet)
+        self.assertFalse(EngagementSnapshot.objects.exists())
@@ -0,0 +1,208 @@
+import shutil
+import tempfile
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from freezegun import freeze_time
+
+from ..analytics import PostingTimeRecommender, hour_of_week, score_hours
+from ..models import EngagementSnapshot, TweetSchedule
+from ..slots import SlotAllocator
+
+
+def _local(hour, day=3, month=4):
+    return timezone.make_aware(datetime(2025, month, day, hour))
+
+
+class ScoreHoursTest(TestCase):
+    """時間枠ごとのスコア計算のテストクラス"""
+
+    def test_recent_posts_weigh_more(self):
+        now = _local(10).timestamp()
+        year_ago, yesterday = now - 365 * 86400, now - 86400
+        scores = score_hours(
+            np.array([0, 0, 1, 1]),
+            np.array([year_ago, yesterday, yesterday, yesterday]),
+            np.array([100.0, 0.0, 10.0, 10.0]),
+            now,
+            half_life_days=30,
+        )
+        self.assertEqual(scores.shape, (168,))
+        # 重みがなければ枠0の平均 (50) が高いが、1年前の投稿はほとんど数えない
+        self.assertGreater(scores[1], scores[0])
+
+    def test_sparse_hours_are_shrunk_to_overall_mean(self):
+        now = _local(10).timestamp()
+        scores = score_hours(
+            np.array([0, 1, 1, 1, 1]),
+            np.full(5, now),
+            np.array([50.0, 10.0, 10.0, 10.0, 10.0]),
+            now,
+            half_life_days=30,
+        )
+        # 1件だけの枠は平均 (18) に寄せられ、投稿のない枠は平均になる
+        self.assertLess(scores[0], 50)
+        self.assertAlmostEqual(scores[100], 18)
+
+    def test_zero_total_weight(self):
+        now = _local(10).timestamp()
+        # 重みが 0 にアンダーフローするほど古い投稿だけでも NaN にならない
+        scores = score_hours(
+            np.array([0, 1]),
+            np.full(2, now - 365 * 86400),
+            np.array([10.0, 20.0]),
+            now,
+            half_life_days=0.1,
+        )
+        self.assertFalse(np.isnan(scores).any())
+        self.assertAlmostEqual(scores[0], 15)
+
+
+# 2025-04-03 (木) 10:00 (JST)
+@freeze_time("2025-04-03 01:00:00")
+@override_settings(
+    ENGAGEMENT_MIN_POSTS=4, ENGAGEMENT_HALF_LIFE_DAYS=30, SECURE_SSL_REDIRECT=False
+)
+class PostingTimeRecommenderTest(TestCase):
+    """投稿時刻のおすすめのテストクラス"""
+
+    def _post(self, when, likes):
+        tweet = TweetSchedule.objects.create(
+            content="過去の投稿",
+            scheduled_time=when,
+            status="posted",
+            posted_at=when,
+            tweet_id=str(when.timestamp()),
+        )
+        EngagementSnapshot.objects.create(
+            tweet=tweet, collected_at=when, like_count=likes // 2
+        )
+        # 最新 (最大) の値を使う
+        EngagementSnapshot.objects.create(
+            tweet=tweet, collected_at=timezone.now(), like_count=likes, reply_count=1
+        )
+
+    def setUp(self):
+        for day in (20, 27):
+            self._post(_local(21, day=day, month=3), likes=20)  # 木曜 21時
+            self._post(_local(11, day=day, month=3), likes=0)  # 木曜 11時
+        for day in (24, 31):
+            self._post(_local(13, day=day, month=3), likes=15)  # 月曜 13時
+
+    def test_top_hours(self):
+        with self.assertNumQueries(1):
+            top_hours = PostingTimeRecommender().top_hours(3)
+        self.assertEqual(
+            [(weekday, hour) for weekday, hour, _ in top_hours],
+            [(3, 21), (0, 13), (0, 0)],
+        )
+        self.assertEqual(hour_of_week(_local(21)), 3 * 24 + 21)
+
+    def test_choose_keeps_time_order(self):
+        candidates = [_local(hour) for hour in (11, 12, 21, 22)]
+        # 投稿のない時間帯は平均、木曜11時は平均より低い
+        self.assertEqual(
+            PostingTimeRecommender().choose(candidates, 2), [_local(12), _local(21)]
+        )
+
+    def test_upcoming(self):
+        recommender = PostingTimeRecommender()
+        self.assertEqual(recommender.upcoming(timezone.now(), count=1), [_local(21)])
+        # 投稿枠の残っていない日の時刻は返さない
+        self.assertEqual(
+            recommender.upcoming(timezone.now(), allocator=SlotAllocator(limit=0)), []
+        )
+
+    @override_settings(ENGAGEMENT_MIN_POSTS=10)
+    def test_not_enough_history(self):
+        recommender = PostingTimeRecommender()
+        self.assertFalse(recommender.available)
+        candidates = [_local(hour) for hour in (11, 12, 21)]
+        self.assertEqual(recommender.choose(candidates, 2), candidates[:2])
+        self.assertEqual(recommender.upcoming(timezone.now()), [])
+
+    def test_other_account_history_is_not_used(self):
+        from ..models import Account
+
+        account = Account.objects.create(name="brand-a", credentials_prefix="X_A")
+        self.assertFalse(PostingTimeRecommender(account=account).available)
+
+    def test_auto_post_slots_use_best_hours(self):
+        media_root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, media_root)
+        (media_root / "images").mkdir()
+        (media_root / "images" / "image_1.png").write_text("test image")
+
+        with override_settings(MEDIA_ROOT=media_root, MAX_DAILY_POSTS_PER_USER=10):
+            call_command(
+                "auto_post",
+                "--text=おすすめ",
+                "--image-dir=images",
+                "--slots=2",
+                "--interval=60",
+                "--until=23:00",
+            )
+            self.assertEqual(
+                list(
+                    TweetSchedule.objects.filter(content="おすすめ")
+                    .order_by("scheduled_time")
+                    .values_list("scheduled_time", flat=True)
+                ),
+                [_local(12), _local(21)],
+            )
+
+            TweetSchedule.objects.filter(content="おすすめ").delete()
+            call_command(
+                "auto_post",
+                "--text=おすすめ",
+                "--image-dir=images",
+                "--slots=2",
+                "--interval=60",
+                "--until=23:00",
+                "--no-best-time",
+            )
+            self.assertEqual(
+                list(
+                    TweetSchedule.objects.filter(content="おすすめ")
+                    .order_by("scheduled_time")
+                    .values_list("scheduled_time", flat=True)
+                ),
+                [_local(11), _local(12)],
+            )
+
+    def test_create_page_suggests_best_time(self):
+        response = self.client.get(reverse("x_scheduler:schedule_create"))
+        self.assertEqual(response.context["recommended_times"][0], _local(21))
+        self.assertEqual(
+            timezone.localtime(response.context["form"].initial["scheduled_time"]),
+            _local(21),
+        )
+        self.assertContains(response, 'data-value="2025-04-03T21:00"')
+
+    def test_create_page_uses_selected_account(self):
+        from ..models import Account
+
+        account = Account.objects.create(name="brand-a", credentials_prefix="X_A")
+        url = reverse("x_scheduler:schedule_create")
+        # brand-a には履歴がないため、既定のアカウントのおすすめは出さない
+        response = self.client.get(url, {"account": account.pk})
+        self.assertEqual(response.context["recommended_times"], [])
+        self.assertEqual(response.context["form"].initial["account"], account)
+        self.assertNotIn("scheduled_time", response.context["form"].initial)
+
+        response = self.client.post(url, {"account": account.pk, "content": ""})
+        self.assertEqual(response.context["recommended_times"], [])
+        # 不正な値は既定のアカウントとして扱う
+        response = self.client.get(url, {"account": "x"})
+        self.assertEqual(response.context["recommended_times"][0], _local(21))
+
+    def test_command(self):
+        out = StringIO()
+        call_command("recommend_times", "--top", "1", stdout=out)
+        self.assertIn("木\t21時", out.getvalue())
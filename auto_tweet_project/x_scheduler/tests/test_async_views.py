@@ -0,0 +1,103 @@
+import os
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncRequestFactory, TestCase
+from django.utils import timezone
+
+from .. import async_views
+from ..models import Account, TweetSchedule
+
+
+class AsyncScheduleViewsTest(TestCase):
+    """非同期版スケジュール画面のテストクラス"""
+
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+
+    def tearDown(self):
+        for tweet in TweetSchedule.objects.all():
+            if tweet.image:
+                tweet.image.delete(save=False)
+
+    def _request(self, method, path, data=None):
+        """メッセージストレージ付きのリクエストを作成"""
+        if method == "post":
+            request = self.factory.post(path, data or {})
+        else:
+            request = self.factory.get(path)
+        request._messages = CookieStorage(request)
+        return request
+
+    async def test_schedule_list(self):
+        """一覧ページが非同期 ORM で取得した予約を表示することをテスト"""
+        await TweetSchedule.objects.acreate(
+            content="非同期一覧テスト",
+            scheduled_time=timezone.now() + timezone.timedelta(hours=1),
+        )
+        response = await async_views.schedule_list(self._request("get", "/scheduler/"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("非同期一覧テスト", response.content.decode())
+
+    async def test_schedule_list_conditional_get(self):
+        """変更がない場合に If-None-Match で 304 が返ることをテスト"""
+        await TweetSchedule.objects.acreate(
+            content="条件付きGETテスト",
+            scheduled_time=timezone.now() + timezone.timedelta(hours=1),
+        )
+        response = await async_views.schedule_list(self._request("get", "/scheduler/"))
+        etag = response.headers["ETag"]
+        self.assertIn("Last-Modified", response.headers)
+
+        request = self.factory.get("/scheduler/", headers={"if-none-match": etag})
+        request._messages = CookieStorage(request)
+        response = await async_views.schedule_list(request)
+        self.assertEqual(response.status_code, 304)
+
+    async def test_schedule_create(self):
+        """作成ページの POST で予約が保存されることをテスト"""
+        scheduled_time = timezone.localtime() + timezone.timedelta(hours=2)
+        request = self._request(
+            "post",
+            "/scheduler/create/",
+            {
+                "content": "非同期作成テスト",
+                "scheduled_time": scheduled_time.strftime("%Y-%m-%dT%H:%M"),
+            },
+        )
+        response = await async_views.schedule_create(request)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(
+            await TweetSchedule.objects.filter(content="非同期作成テスト").aexists()
+        )
+
+    async def test_schedule_create_page_with_account(self):
+        """作成ページの GET で選んだアカウントが初期値になることをテスト"""
+        account = await Account.objects.acreate(
+            name="brand-a", credentials_prefix="X_A"
+        )
+        request = self._request("get", f"/scheduler/create/?account={account.pk}")
+        response = await async_views.schedule_create(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'<option value="{account.pk}" selected>')
+
+    async def test_schedule_delete_removes_image(self):
+        """削除時に画像ファイルも削除されることをテスト"""
+        tweet = TweetSchedule(
+            content="非同期削除テスト",
+            scheduled_time=timezone.now() + timezone.timedelta(hours=1),
+        )
+        tweet.image = SimpleUploadedFile("image.png", b"dummy image")
+        await tweet.asave()
+        image_path = os.path.join(settings.MEDIA_ROOT, tweet.image.name)
+        self.assertTrue(os.path.exists(image_path))
+
+        request = self._request("post", f"/scheduler/delete/{tweet.pk}/")
+        response = await async_views.schedule_delete(request, pk=tweet.pk)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(await TweetSchedule.objects.filter(pk=tweet.pk).aexists())
+        self.assertFalse(os.path.exists(image_path))
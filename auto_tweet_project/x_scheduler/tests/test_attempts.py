@@ -0,0 +1,84 @@
+from unittest.mock import MagicMock, patch
+
+import tweepy
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import attempts
+from ..models import PostingAttempt, TweetSchedule
+from ..utils import TwitterAPIClient, process_scheduled_tweets
+
+
+class AttemptRecorderTest(TestCase):
+    """投稿試行の計測のテストクラス"""
+
+    def test_start_saves_phase_timings_and_response(self):
+        """ブロック内のフェーズ時間とレスポンス情報が1行に保存されることをテスト"""
+        response = MagicMock(status_code=201)
+        response.headers = {
+            "x-rate-limit-limit": "100",
+            "x-rate-limit-remaining": "99",
+            "x-rate-limit-reset": "1700000000",
+        }
+        with attempts.start("process_tweets") as attempt:
+            with attempts.phase("create_tweet"):
+                attempts.record_response(response)
+            attempts.add_bytes_uploaded(1024)
+            attempt.success = True
+
+        row = PostingAttempt.objects.get()
+        self.assertTrue(row.success)
+        self.assertEqual(row.source, "process_tweets")
+        self.assertEqual(row.http_status, 201)
+        self.assertEqual(row.rate_limit_remaining, 99)
+        self.assertEqual(row.rate_limit_reset, 1700000000)
+        self.assertEqual(row.bytes_uploaded, 1024)
+        self.assertIsNotNone(row.create_tweet_seconds)
+        self.assertIsNone(row.media_upload_seconds)
+        self.assertGreaterEqual(row.total_seconds, row.create_tweet_seconds)
+
+    def test_start_records_exception(self):
+        """ブロック内の例外が失敗として記録され、再送出されることをテスト"""
+        with self.assertRaises(RuntimeError):
+            with attempts.start("auto_post"):
+                raise RuntimeError("予期せぬエラー")
+        row = PostingAttempt.objects.get()
+        self.assertFalse(row.success)
+        self.assertEqual(row.error_message, "予期せぬエラー")
+
+    def test_phase_without_attempt_is_noop(self):
+        """計測中でなければフェーズ計測が何もしないことをテスト"""
+        with attempts.phase("media_upload"):
+            attempts.add_bytes_uploaded(10)
+        self.assertIsNone(attempts.current())
+        self.assertFalse(PostingAttempt.objects.exists())
+
+
+class ProcessScheduledTweetsAttemptTest(TestCase):
+    """process_scheduled_tweets が投稿試行を記録することのテストクラス"""
+
+    @patch.object(TwitterAPIClient, "_initialize_client_v2")
+    @patch.object(TwitterAPIClient, "_initialize_api_v1")
+    def test_records_attempt_per_tweet(self, mock_init_api, mock_init_client):
+        mock_init_api.return_value = MagicMock(spec=tweepy.API)
+        mock_client = MagicMock(spec=tweepy.Client)
+        mock_client.create_tweet.return_value = MagicMock(data={"id": "1"})
+        mock_init_client.return_value = mock_client
+        tweet = TweetSchedule.objects.create(
+            content="計測テスト",
+            scheduled_time=timezone.now() - timezone.timedelta(minutes=1),
+        )
+
+        self.assertEqual(process_scheduled_tweets(), 1)
+
+        row = PostingAttempt.objects.get()
+        self.assertEqual(row.tweet, tweet)
+        self.assertTrue(row.success)
+        self.assertIsNotNone(row.create_tweet_seconds)
+        self.assertIsNotNone(row.db_save_seconds)
+
+        # 投稿日時と予定時刻からの遅延も記録される
+        tweet.refresh_from_db()
+        self.assertEqual(tweet.status, "posted")
+        self.assertEqual(tweet.dispatch_lag, tweet.posted_at - tweet.scheduled_time)
+        self.assertGreaterEqual(tweet.dispatch_lag.total_seconds(), 60)
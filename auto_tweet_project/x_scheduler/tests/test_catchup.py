@@ -0,0 +1,185 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from freezegun import freeze_time
+
+from ..catchup import plan_catch_up, spread_times
+from ..models import Account, DailyPostCounter, TweetSchedule
+from ..utils import TwitterAPIClient
+from .fakes import FakeTweepyAPI, FakeTweepyClient
+
+
+def _local(hour, minute=0, day=3):
+    return timezone.make_aware(datetime(2025, 4, day, hour, minute))
+
+
+class SpreadTimesTest(TestCase):
+    """再配置先の時刻の計算のテストクラス"""
+
+    def test_even_spacing_without_peak_hours(self):
+        times = spread_times(4, _local(10), _local(14))
+        self.assertEqual(times, [_local(10), _local(11), _local(12), _local(13)])
+
+    def test_peak_hours_are_denser(self):
+        # 12時台は重みが3倍のため、他の時間帯の3倍の件数が入る
+        times = spread_times(6, _local(10), _local(14), peak_hours=[12])
+        self.assertEqual(
+            times,
+            [
+                _local(10),
+                _local(11),
+                _local(12),
+                _local(12, 20),
+                _local(12, 40),
+                _local(13),
+            ],
+        )
+
+
+# 2025-04-03 10:00 (JST)
+@freeze_time("2025-04-03 01:00:00")
+@override_settings(
+    CATCHUP_THRESHOLD=5,
+    CATCHUP_WINDOW_HOURS=4,
+    PEAK_HOURS=[],
+    MAX_DAILY_POSTS_PER_USER=16,
+)
+class PlanCatchUpTest(TestCase):
+    """遅延分の再配置のテストクラス"""
+
+    def _overdue(self, count):
+        return [
+            TweetSchedule.objects.create(
+                content=f"遅延{i}", scheduled_time=_local(2) + timedelta(minutes=i)
+            )
+            for i in range(count)
+        ]
+
+    def test_small_backlog_is_left_alone(self):
+        tweets = self._overdue(5)
+        result = plan_catch_up()
+        self.assertEqual(result["overdue"], 5)
+        self.assertEqual(result["spread"], 0)
+        for tweet in tweets:
+            tweet.refresh_from_db()
+            self.assertIsNone(tweet.original_scheduled_time)
+
+    @override_settings(CATCHUP_THRESHOLD=0)
+    def test_disabled(self):
+        self._overdue(10)
+        self.assertEqual(plan_catch_up()["overdue"], 0)
+
+    @patch("x_scheduler.catchup.notify_schedule_changed")
+    def test_backlog_is_spread_over_window(self, mock_notify):
+        tweets = self._overdue(8)
+        # 対象の取得・各日の予定数・投稿済み数・一括更新
+        with self.assertNumQueries(4):
+            result = plan_catch_up()
+        self.assertEqual(result["spread"], 8)
+        self.assertEqual(result["deferred"], 0)
+        mock_notify.assert_called_once()
+
+        for i, tweet in enumerate(tweets):
+            original = tweet.scheduled_time
+            tweet.refresh_from_db()
+            # 古い予約から順に、現在時刻から30分間隔で配置される
+            self.assertEqual(
+                tweet.scheduled_time, _local(10) + timedelta(minutes=30 * i)
+            )
+            self.assertEqual(tweet.original_scheduled_time, original)
+        # 現在時刻に配置された1件だけが投稿対象になる
+        self.assertEqual(
+            TweetSchedule.objects.filter(scheduled_time__lte=timezone.now()).count(), 1
+        )
+
+    def test_keeps_first_original_time(self):
+        first = _local(1)
+        tweets = self._overdue(6)
+        TweetSchedule.objects.filter(pk=tweets[0].pk).update(
+            original_scheduled_time=first
+        )
+        plan_catch_up()
+        tweets[0].refresh_from_db()
+        self.assertEqual(tweets[0].original_scheduled_time, first)
+
+    @override_settings(MAX_DAILY_POSTS_PER_USER=5)
+    def test_daily_limit_defers_overflow(self):
+        DailyPostCounter.objects.create(date=_local(10).date(), post_count=1)
+        TweetSchedule.objects.create(content="予定どおり", scheduled_time=_local(20))
+        tweets = self._overdue(6)
+
+        result = plan_catch_up()
+        # 上限5 - 投稿済み1 - 予定済み1 = 3件分の枠
+        self.assertEqual(result["spread"], 3)
+        self.assertEqual(result["deferred"], 3)
+        for tweet in tweets[3:]:
+            original = tweet.scheduled_time
+            tweet.refresh_from_db()
+            self.assertEqual(tweet.scheduled_time, original + timedelta(days=1))
+            self.assertEqual(tweet.original_scheduled_time, original)
+            self.assertIn("翌日以降に延期", tweet.error_message)
+        tweets[0].refresh_from_db()
+        self.assertIsNone(tweets[0].error_message)
+
+    def test_account_without_slots_is_deferred(self):
+        account = Account.objects.create(
+            name="brand-a", credentials_prefix="X_A", max_daily_posts=0
+        )
+        tweets = self._overdue(6)
+        TweetSchedule.objects.filter(pk=tweets[0].pk).update(account=account)
+
+        result = plan_catch_up()
+        self.assertEqual(result["spread"], 5)
+        self.assertEqual(result["deferred"], 1)
+        tweets[0].refresh_from_db()
+        self.assertEqual(tweets[0].scheduled_time, _local(2, day=4))
+        self.assertIn("投稿上限（0）", tweets[0].error_message)
+
+    def test_scoped_to_accounts(self):
+        account = Account.objects.create(name="brand-a", credentials_prefix="X_A")
+        tweets = self._overdue(7)
+        TweetSchedule.objects.filter(pk=tweets[0].pk).update(account=account)
+
+        # brand-a の遅延分は1件のみのため、既定のアカウントの予約は再配置しない
+        self.assertEqual(plan_catch_up(accounts=[account])["overdue"], 1)
+        self.assertEqual(plan_catch_up(accounts=[None])["spread"], 6)
+        tweets[0].refresh_from_db()
+        self.assertEqual(tweets[0].scheduled_time, _local(2))
+
+
+@freeze_time("2025-04-03 01:00:00")
+@override_settings(
+    CATCHUP_THRESHOLD=5, CATCHUP_WINDOW_HOURS=6, MAX_DAILY_POSTS_PER_USER=16
+)
+class ProcessTweetsCatchUpTest(TestCase):
+    """process_tweets からの再配置のテストクラス"""
+
+    def setUp(self):
+        for patcher in (
+            patch.object(
+                TwitterAPIClient, "_initialize_api_v1", lambda self: FakeTweepyAPI()
+            ),
+            patch.object(
+                TwitterAPIClient,
+                "_initialize_client_v2",
+                lambda self: FakeTweepyClient(),
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        TweetSchedule.objects.bulk_create(
+            TweetSchedule(content=f"遅延{i}", scheduled_time=_local(2))
+            for i in range(8)
+        )
+
+    def test_posts_only_first_slot(self):
+        call_command("process_tweets", "--skip-api-test")
+        self.assertEqual(TweetSchedule.objects.filter(status="posted").count(), 1)
+        self.assertEqual(TweetSchedule.objects.filter(status="pending").count(), 7)
+
+    def test_no_catch_up_posts_everything(self):
+        call_command("process_tweets", "--skip-api-test", "--no-catch-up")
+        self.assertEqual(TweetSchedule.objects.filter(status="posted").count(), 8)
@@ -2,13 +2,18 @@ import os
 from io import StringIO
 from unittest.mock import patch, MagicMock
 
-from django.core.management import call_command
+from django.core.management import CommandError, call_command
 from django.test import TestCase
 from django.utils import timezone
 from django.conf import settings
 from freezegun import freeze_time
 
-from x_scheduler.models import TweetSchedule, DailyPostCounter, SystemSetting
+from x_scheduler.models import (
+    DailyPostCounter,
+    PostingAttempt,
+    SystemSetting,
+    TweetSchedule,
+)
 
 # TODO: Add tests for process_tweets command
 
@@ -101,9 +106,16 @@ class AutoPostCommandTest(TestCase):
             mock_media_info.media_id = 11111
             mock_api_instance.upload_media.return_value = mock_media_info
             # post_tweet の戻り値を設定
-            mock_post_response = MagicMock()
-            mock_post_response.data = {"id": "12345", "text": "テスト投稿(即時)"}
-            mock_api_instance.post_tweet.return_value = mock_post_response
+            pending_during_post = []
+
+            def post_tweet(**kwargs):
+                # 投稿中の予約は process_tweets の対象 (待機中) になっていないこと
+                pending_during_post.append(
+                    TweetSchedule.objects.filter(status="pending").count()
+                )
+                return {"success": True, "error": "", "tweet_id": "12345"}
+
+            mock_api_instance.post_tweet.side_effect = post_tweet
 
             out = StringIO()
             call_command(
@@ -121,6 +133,8 @@ class AutoPostCommandTest(TestCase):
             expected_time = timezone.now()
             self.assertAlmostEqual(tweet.scheduled_time, expected_time, delta=timezone.timedelta(seconds=1))
             self.assertEqual(tweet.status, 'posted')
+            self.assertEqual(tweet.tweet_id, "12345")
+            self.assertEqual(pending_during_post, [0])
             self.assertTrue(os.path.exists(tweet.image.path))
             self.assertTrue(tweet.image.name.startswith("tweet_images/"))
             self.assertTrue(tweet.image.name.endswith(".jpg"))
@@ -188,7 +202,311 @@ class AutoPostCommandTest(TestCase):
             mock_api_instance.upload_media.assert_not_called()
             mock_api_instance.post_tweet.assert_not_called()
 
+    @freeze_time("2025-04-04 10:00:00")  # JST 19:00
+    def test_auto_post_slots_batch(self):
+        """--slots で本日中の複数の投稿枠が一括作成されることをテスト"""
+        with patch("x_scheduler.management.commands.auto_post.TwitterAPIClient") as MockTwitterAPIClient:
+            call_command(
+                "auto_post",
+                "--text=一括テスト",
+                f"--image-dir={self.image_dir_name}",
+                "--slots=5",
+            )
+
+            # 一括作成モードでは API クライアントは使用しない
+            MockTwitterAPIClient.assert_not_called()
+
+        # 19:00 から 90分間隔で本日中に収まるのは 20:30, 22:00, 23:30 の3枠
+        tweets = list(TweetSchedule.objects.order_by("scheduled_time"))
+        self.assertEqual(len(tweets), 3)
+        for i, tweet in enumerate(tweets, start=1):
+            self.assertEqual(tweet.status, "pending")
+            self.assertEqual(
+                tweet.scheduled_time,
+                timezone.now() + timezone.timedelta(minutes=90 * i),
+            )
+        # 画像は番号順に選ばれ、最後まで使うと最初に戻る
+        self.assertEqual(
+            [os.path.splitext(t.image.name)[1] for t in tweets], [".jpg", ".png", ".jpg"]
+        )
+        self.assertEqual(SystemSetting.get_value("last_image_index"), "1")
+
+    @freeze_time("2025-04-04 01:00:00")  # JST 10:00
+    def test_auto_post_slots_respects_daily_limit(self):
+        """--until の枠数が本日の残り投稿可能数で制限されることをテスト"""
+        counter = DailyPostCounter.get_today_counter()
+        counter.post_count = 3
+        counter.save()
+        TweetSchedule.objects.create(
+            content="予約済み",
+            scheduled_time=timezone.now() + timezone.timedelta(hours=1),
+        )
+
+        call_command(
+            "auto_post",
+            "--text=上限テスト",
+            f"--image-dir={self.image_dir_name}",
+            "--until=18:00",
+            "--interval=60",
+        )
+
+        # 上限5 - 投稿済み3 - 予約済み1 = 1件のみ作成される
+        self.assertEqual(TweetSchedule.objects.filter(content="上限テスト").count(), 1)
+
+    @freeze_time("2025-04-04 01:00:00")  # JST 10:00
+    def test_auto_post_single_shot_respects_booked_slots(self):
+        """予約済みの枠で本日が埋まっている場合、1件ずつの作成でも予約を作らないことをテスト"""
+        counter = DailyPostCounter.get_today_counter()
+        counter.post_count = 2
+        counter.save()
+        for hour in range(3):
+            TweetSchedule.objects.create(
+                content="予約済み",
+                scheduled_time=timezone.now() + timezone.timedelta(hours=hour + 3),
+            )
+
+        with patch(
+            "x_scheduler.management.commands.auto_post.TwitterAPIClient"
+        ) as MockTwitterAPIClient:
+            mock_api_instance = MockTwitterAPIClient.return_value
+            mock_api_instance.api_v1 = True
+            mock_api_instance.client_v2 = True
+            call_command(
+                "auto_post",
+                "--text=上限テスト",
+                f"--image-dir={self.image_dir_name}",
+                "--skip-api-test",
+            )
+
+        # 上限5 = 投稿済み2 + 予約済み3 のため、作成されない
+        self.assertFalse(TweetSchedule.objects.filter(content="上限テスト").exists())
+        self.assertEqual(SystemSetting.get_value("last_image_index"), "0")
+
     # --- 他のテストケースを追加 ---
     # TODO: test_auto_post_no_image_found (画像なし)
     # TODO: test_auto_post_api_init_fail (API初期化失敗)
-    # TODO: test_auto_post_with_options (オプション指定) 
\ No newline at end of file
+    # TODO: test_auto_post_with_options (オプション指定) 
+
+
+class ImportSchedulesCommandTest(TestCase):
+    """import_schedules コマンドのテストクラス"""
+
+    def setUp(self):
+        import tempfile
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.image_dir_name = "test_import_images"
+        self.image_dir_path = os.path.join(settings.MEDIA_ROOT, self.image_dir_name)
+        os.makedirs(self.image_dir_path, exist_ok=True)
+        with open(os.path.join(self.image_dir_path, "image_1.png"), "w") as f:
+            f.write("test image 1")
+
+    def tearDown(self):
+        import shutil
+
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        shutil.rmtree(self.image_dir_path, ignore_errors=True)
+        for tweet in TweetSchedule.objects.all():
+            if tweet.image:
+                tweet.image.delete(save=False)
+        TweetSchedule.objects.all().delete()
+
+    def _write(self, filename, text):
+        path = os.path.join(self.tmp_dir, filename)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    @freeze_time("2025-04-04 10:00:00")
+    def test_import_csv_with_errors(self):
+        """CSV の正常行が登録され、不正行が行番号付きで報告されることをテスト"""
+        path = self._write(
+            "schedules.csv",
+            "content,scheduled_time,image\n"
+            f"画像付き,2025-04-05T09:00:00,{self.image_dir_name}/image_1.png\n"
+            "テキストのみ,2025-04-05 12:00,\n"
+            "過去の投稿,2025-04-01T09:00:00,\n"
+            ",2025-04-05T09:00:00,\n"
+            "画像なし,2025-04-05T09:00:00,missing.png\n",
+        )
+        out, err = StringIO(), StringIO()
+        call_command("import_schedules", path, "--batch-size=1", stdout=out, stderr=err)
+
+        self.assertEqual(TweetSchedule.objects.count(), 2)
+        with_image = TweetSchedule.objects.get(content="画像付き")
+        self.assertEqual(with_image.status, "pending")
+        self.assertTrue(with_image.image.name.startswith("tweet_images/"))
+        self.assertTrue(os.path.exists(with_image.image.path))
+        self.assertFalse(TweetSchedule.objects.get(content="テキストのみ").image)
+
+        errors = err.getvalue()
+        self.assertIn("4行目", errors)
+        self.assertIn("5行目", errors)
+        self.assertIn("6行目", errors)
+        self.assertIn("全5件中 登録2件, エラー3件", out.getvalue())
+
+    @freeze_time("2025-04-04 10:00:00")
+    def test_import_jsonl_dry_run(self):
+        """JSONL を --dry-run で検証した場合、登録されないことをテスト"""
+        path = self._write(
+            "schedules.jsonl",
+            '{"content": "一件目", "scheduled_time": "2025-04-05T09:00:00+09:00"}\n'
+            "\n"
+            "not json\n"
+            '{"content": "二件目", "scheduled_time": "2025-04-06T09:00:00"}\n',
+        )
+        out, err = StringIO(), StringIO()
+        call_command("import_schedules", path, "--dry-run", stdout=out, stderr=err)
+
+        self.assertEqual(TweetSchedule.objects.count(), 0)
+        self.assertIn("3行目", err.getvalue())
+        self.assertIn("全3件中 検証OK2件, エラー1件", out.getvalue())
+
+    @freeze_time("2025-04-04 10:00:00")
+    def test_import_jsonl_non_string_values(self):
+        """JSONL で文字列以外の値を指定した行がエラーとして報告されることをテスト"""
+        path = self._write(
+            "schedules.jsonl",
+            '{"content": 123, "scheduled_time": "2025-04-05T09:00:00"}\n'
+            '{"content": "時刻が数値", "scheduled_time": 20250405}\n'
+            '{"content": "正常", "scheduled_time": "2025-04-05T09:00:00"}\n',
+        )
+        out, err = StringIO(), StringIO()
+        call_command("import_schedules", path, stdout=out, stderr=err)
+
+        self.assertIn("1行目: content は文字列で指定してください。", err.getvalue())
+        self.assertIn("2行目: scheduled_time は文字列で指定してください。", err.getvalue())
+        self.assertIn("全3件中 登録1件, エラー2件", out.getvalue())
+
+    @freeze_time("2025-04-04 10:00:00")
+    def test_import_non_utf8_file_registers_nothing(self):
+        """UTF-8 でないファイルは1件も登録せずにエラーにすることをテスト"""
+        path = os.path.join(self.tmp_dir, "schedules.csv")
+        with open(path, "wb") as f:
+            f.write("content,scheduled_time\n一件目,2025-04-05T09:00:00\n".encode("utf-8"))
+            f.write("二件目,2025-04-05T10:00:00\n".encode("cp932"))
+
+        with self.assertRaisesMessage(CommandError, "UTF-8"):
+            call_command("import_schedules", path, "--batch-size=1")
+        self.assertEqual(TweetSchedule.objects.count(), 0)
+
+
+class PostingReportCommandTest(TestCase):
+    """posting_report コマンドのテストクラス"""
+
+    def _attempt(self, started_at, total, success=True):
+        return PostingAttempt.objects.create(
+            source="process_tweets",
+            started_at=started_at,
+            success=success,
+            total_seconds=total,
+            create_tweet_seconds=total / 2,
+        )
+
+    @freeze_time("2025-04-04 10:00:00")
+    def test_report_by_day(self):
+        """日別にパーセンタイルと成功率が集計されることをテスト"""
+        now = timezone.now()
+        for total in (0.1, 0.2, 0.3, 1.0):
+            self._attempt(now, total)
+        self._attempt(now - timezone.timedelta(days=1), 2.0, success=False)
+        # 集計期間外
+        self._attempt(now - timezone.timedelta(days=30), 9.0)
+
+        out = StringIO()
+        call_command("posting_report", "--days=2", stdout=out)
+        lines = out.getvalue().splitlines()
+
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(
+            lines[1].split("\t")[:6],
+            ["2025-04-03", "1", "0%", "2000", "2000", "2000"],
+        )
+        self.assertEqual(
+            lines[2].split("\t")[:6],
+            ["2025-04-04", "4", "100%", "200", "1000", "1000"],
+        )
+
+    @freeze_time("2025-04-04 10:00:00")
+    def test_report_by_hour(self):
+        """時間帯別に集計されることをテスト"""
+        self._attempt(timezone.now(), 0.5)
+        out = StringIO()
+        call_command("posting_report", "--by=hour", stdout=out)
+        # TIME_ZONE (Asia/Tokyo) の時間帯で集計される
+        self.assertTrue(out.getvalue().splitlines()[1].startswith("19時\t1\t"))
+
+
+class ProfilingOptionsTest(TestCase):
+    """管理コマンドの --profile / --trace-queries オプションのテストクラス"""
+
+    def setUp(self):
+        import tempfile
+
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def test_profile_and_trace_queries(self):
+        """プロファイルと SQL ログが保存され、N+1 の疑いが報告されることをテスト"""
+        import tempfile
+
+        now = timezone.localtime()
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".csv", delete=False, encoding="utf-8"
+        ) as f:
+            f.write("content,scheduled_time\n")
+            for i in range(6):
+                scheduled = now + timezone.timedelta(hours=i + 1)
+                f.write(f"投稿{i},{scheduled.strftime('%Y-%m-%d %H:%M')}\n")
+            path = f.name
+
+        err = StringIO()
+        try:
+            with self.settings(PROFILE_OUTPUT_DIR=self.output_dir):
+                call_command(
+                    "import_schedules",
+                    path,
+                    "--batch-size=1",
+                    "--profile",
+                    "--trace-queries",
+                    stdout=StringIO(),
+                    stderr=err,
+                )
+        finally:
+            os.remove(path)
+
+        files = sorted(os.listdir(self.output_dir))
+        self.assertEqual(len(files), 3)
+        self.assertTrue(files[0].startswith("import_schedules_"))
+        self.assertEqual(
+            [os.path.splitext(name)[1] for name in files], [".prof", ".txt", ".log"]
+        )
+        summary = err.getvalue()
+        self.assertIn("SQL:", summary)
+        # 1件ずつの bulk_create が同じ箇所から繰り返し実行される
+        self.assertIn("N+1 の疑い: x_scheduler/importers.py", summary)
+
+    def test_report_failure_keeps_command_result(self):
+        """計測結果を保存できなくても、コマンド自体の例外が変わらないことをテスト"""
+        # 出力先にファイルを指定して、ディレクトリを作成できないようにする
+        output_file = os.path.join(self.output_dir, "not_a_directory")
+        with open(output_file, "w") as f:
+            f.write("")
+
+        with self.settings(PROFILE_OUTPUT_DIR=output_file):
+            with self.assertLogs(
+                "x_scheduler.management.profiling", level="ERROR"
+            ) as cm:
+                with self.assertRaisesMessage(CommandError, "--batch-size"):
+                    call_command(
+                        "import_schedules",
+                        "schedules.csv",
+                        "--batch-size=0",
+                        "--profile",
+                        stderr=StringIO(),
+                    )
+        self.assertIn("計測結果を保存できませんでした", cm.output[0])
@@ -0,0 +1,141 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from freezegun import freeze_time
+
+from ..engagement import LookupGovernor, collect
+from ..models import EngagementSnapshot, TweetSchedule
+from ..utils import TwitterAPIClient, process_scheduled_tweets
+from .fakes import FakeTweepyAPI, FakeTweepyClient
+
+
+def _metrics(likes):
+    return {
+        "impression_count": likes * 10,
+        "like_count": likes,
+        "retweet_count": 1,
+        "reply_count": 0,
+        "quote_count": 0,
+        "bookmark_count": 0,
+    }
+
+
+@freeze_time("2025-04-03 01:00:00")
+@override_settings(METRICS_COLLECT_DAYS=7)
+class CollectMetricsTest(TestCase):
+    """投稿済みツイートの公開指標の収集のテストクラス"""
+
+    def setUp(self):
+        client_v2 = self.client_v2 = FakeTweepyClient()
+        for patcher in (
+            patch.object(
+                TwitterAPIClient, "_initialize_api_v1", lambda self: FakeTweepyAPI()
+            ),
+            patch.object(
+                TwitterAPIClient, "_initialize_client_v2", lambda self: client_v2
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _posted(self, count, days_ago=1):
+        posted_at = timezone.now() - timedelta(days=days_ago)
+        TweetSchedule.objects.bulk_create(
+            TweetSchedule(
+                content=f"投稿{i}",
+                scheduled_time=posted_at,
+                status="posted",
+                posted_at=posted_at,
+                tweet_id=f"{days_ago}{i:04d}",
+            )
+            for i in range(count)
+        )
+        for i in range(count):
+            self.client_v2.public_metrics[f"{days_ago}{i:04d}"] = _metrics(i)
+
+    def test_post_stores_tweet_id(self):
+        tweet = TweetSchedule.objects.create(
+            content="ID を保存", scheduled_time=timezone.now() - timedelta(minutes=1)
+        )
+        process_scheduled_tweets()
+        tweet.refresh_from_db()
+        self.assertTrue(tweet.tweet_id)
+
+    def test_lookups_are_batched(self):
+        self._posted(250)
+        # 対象の取得と、100件ずつの取得結果の一括登録
+        with self.assertNumQueries(4):
+            result = collect()
+        self.assertEqual([len(ids) for ids in self.client_v2.lookups], [100, 100, 50])
+        self.assertEqual(result["requests"], 3)
+        self.assertEqual(result["snapshots"], 250)
+        snapshot = EngagementSnapshot.objects.get(tweet__tweet_id="10003")
+        self.assertEqual(snapshot.like_count, 3)
+        self.assertEqual(snapshot.impression_count, 30)
+        self.assertEqual(snapshot.collected_at, timezone.now())
+
+    def test_snapshots_form_time_series(self):
+        self._posted(2)
+        collect()
+        self.client_v2.public_metrics["10001"] = _metrics(5)
+        with freeze_time("2025-04-03 07:00:00"):
+            collect()
+        self.assertEqual(
+            list(
+                EngagementSnapshot.objects.filter(tweet__tweet_id="10001")
+                .order_by("collected_at")
+                .values_list("like_count", flat=True)
+            ),
+            [1, 5],
+        )
+
+    def test_old_and_deleted_tweets(self):
+        self._posted(2)
+        self._posted(1, days_ago=10)
+        # 削除済みのツイートは取得結果に含まれない
+        del self.client_v2.public_metrics["10000"]
+        result = collect()
+        self.assertEqual(result["tweets"], 2)
+        self.assertEqual(result["missing"], 1)
+        self.assertEqual(EngagementSnapshot.objects.count(), 1)
+
+    def test_stops_at_rate_limit_and_resumes_with_uncollected(self):
+        self._posted(250)
+        self.client_v2.rate_limit_remaining = 1
+        self.client_v2.rate_limit_reset = int(timezone.now().timestamp()) + 900
+        result = collect()
+        self.assertEqual(result["requests"], 1)
+        self.assertEqual(result["remaining"], 150)
+
+        # 次回は取得していないツイートから問い合わせる
+        first_batch = set(self.client_v2.lookups.pop())
+        self.client_v2.rate_limit_remaining = None
+        with freeze_time("2025-04-03 02:00:00"):
+            result = collect(max_requests=1)
+        self.assertEqual(result["remaining"], 150)
+        collected = set(
+            EngagementSnapshot.objects.values_list("tweet__tweet_id", flat=True)
+        )
+        self.assertEqual(len(collected), 200)
+        self.assertTrue(first_batch.isdisjoint(self.client_v2.lookups[0]))
+
+    def test_governor_waits_for_short_reset(self):
+        governor = LookupGovernor(max_wait_seconds=60)
+        governor.remaining = 0
+        governor.reset = int(timezone.now().timestamp()) + 30
+        with patch("x_scheduler.engagement.time.sleep") as mock_sleep:
+            self.assertTrue(governor.acquire())
+        mock_sleep.assert_called_once()
+        governor.remaining = 0
+        governor.reset = int(timezone.now().timestamp()) + 900
+        self.assertFalse(governor.acquire())
+
+    def test_command(self):
+        self._posted(3)
+        out = StringIO()
+        call_command("collect_metrics", "--days", "3", stdout=out)
+        self.assertIn("ツイート 3件の公開指標を 3件記録しました", out.getvalue())
@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import events
+from ..models import DailyPostCounter, TweetSchedule
+
+
+class ChangeFeedTest(TestCase):
+    """投稿キューの変更フィードのテストクラス"""
+
+    def setUp(self):
+        self.tweet = TweetSchedule.objects.create(
+            content="フィードテスト",
+            scheduled_time=timezone.now() - timezone.timedelta(minutes=1),
+        )
+
+    def test_changes_since_returns_status_transitions(self):
+        """カーソル以降のステータス変化とカウンター更新が差分として返ることをテスト"""
+        cursor = timezone.now()
+        self.tweet.status = "posted"
+        self.tweet.save()
+        DailyPostCounter.get_today_counter().increment_count()
+
+        delivered = set()
+        changes, new_cursor = events.changes_since(cursor, delivered)
+
+        self.assertEqual([event for event, _ in changes], ["schedule", "counter"])
+        self.assertEqual(changes[0][1]["id"], str(self.tweet.pk))
+        self.assertEqual(changes[0][1]["status"], "posted")
+        self.assertEqual(changes[1][1]["post_count"], 1)
+        self.assertGreater(new_cursor, cursor)
+
+        # 新しいカーソル以降は差分なし (重なりの範囲で読み直した配信済みの行は送らない)
+        self.assertEqual(events.changes_since(new_cursor, delivered)[0], [])
+
+    def test_changes_since_picks_up_late_commits(self):
+        """カーソルより前の updated_at で後からコミットされた行も差分に含まれることをテスト"""
+        delivered = set()
+        stamp = timezone.now()
+        TweetSchedule.objects.filter(pk=self.tweet.pk).update(
+            status="posting", updated_at=stamp
+        )
+        changes, cursor = events.changes_since(
+            stamp - timezone.timedelta(seconds=1), delivered
+        )
+        self.assertEqual([data["status"] for _, data in changes], ["posting"])
+        self.assertEqual(cursor, stamp)
+
+        # 配信済みの行より前の時刻、または同じ時刻で別の行がコミットされる
+        late = TweetSchedule.objects.create(
+            content="遅れてコミット", scheduled_time=stamp
+        )
+        same = TweetSchedule.objects.create(content="同じ時刻", scheduled_time=stamp)
+        TweetSchedule.objects.filter(pk=late.pk).update(
+            updated_at=stamp - timezone.timedelta(seconds=5)
+        )
+        TweetSchedule.objects.filter(pk=same.pk).update(updated_at=stamp)
+
+        changes, new_cursor = events.changes_since(cursor, delivered)
+        self.assertEqual(
+            sorted(data["id"] for _, data in changes),
+            sorted([str(late.pk), str(same.pk)]),
+        )
+        self.assertEqual(new_cursor, stamp)
+        self.assertEqual(events.changes_since(new_cursor, delivered)[0], [])
+
+    def test_initial_events_resumes_from_last_event_id(self):
+        """Last-Event-ID を指定した再接続で取りこぼし分が返ることをテスト"""
+        cursor = timezone.now()
+        self.tweet.status = "failed"
+        self.tweet.error_message = "エラー"
+        self.tweet.save()
+
+        changes, _ = events.initial_events(cursor.isoformat())
+        self.assertEqual(changes[0][1]["status"], "failed")
+        self.assertEqual(changes[0][1]["error_message"], "エラー")
+
+        # 不正な ID の場合は差分なしで開始する
+        self.assertEqual(events.initial_events("invalid")[0], [])
+
+    def test_format_event(self):
+        """SSE 形式の文字列が生成されることをテスト"""
+        text = events.format_event("counter", {"post_count": 1}, "cursor-1")
+        self.assertEqual(
+            text, 'id: cursor-1\nevent: counter\ndata: {"post_count": 1}\n\n'
+        )
+
+    @override_settings(SSE_POLL_INTERVAL_SECONDS=0.01)
+    async def test_shared_feed_broadcasts_to_subscribers(self):
+        """共有フィードが複数の購読者に同じ差分を配信することをテスト"""
+        events._feed = None
+        stream_a = events.aiter_events()
+        stream_b = events.aiter_events()
+        try:
+            # retry 行を読み、購読を開始させる
+            self.assertTrue((await anext(stream_a)).startswith("retry:"))
+            self.assertTrue((await anext(stream_b)).startswith("retry:"))
+
+            self.tweet.status = "posted"
+            await self.tweet.asave()
+
+            message_a = await asyncio.wait_for(anext(stream_a), timeout=5)
+            message_b = await asyncio.wait_for(anext(stream_b), timeout=5)
+        finally:
+            await stream_a.aclose()
+            await stream_b.aclose()
+
+        self.assertEqual(message_a, message_b)
+        data = json.loads(message_a.split("data: ")[1])
+        self.assertEqual(data["status"], "posted")
+        self.assertEqual(events.get_feed().subscribers, set())
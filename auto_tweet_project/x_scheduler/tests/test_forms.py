@@ -0,0 +1,105 @@
+import io
+
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.test import TestCase
+from django.utils import timezone
+from PIL import Image
+
+from ..forms import MAX_IMAGE_DIMENSION, TweetScheduleForm, sniff_image_format
+from ..uploadhandlers import LimitedTemporaryFileUploadHandler
+
+
+def _png_bytes(size=(10, 10)):
+    """テスト用の PNG 画像データを生成"""
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class TweetScheduleFormImageTest(TestCase):
+    """TweetScheduleForm の画像検証のテストクラス"""
+
+    def _form(self, image):
+        scheduled_time = timezone.localtime() + timezone.timedelta(hours=1)
+        return TweetScheduleForm(
+            {
+                "content": "画像検証テスト",
+                "scheduled_time": scheduled_time.strftime("%Y-%m-%dT%H:%M"),
+            },
+            {"image": image},
+        )
+
+    def test_valid_png(self):
+        """正しい PNG 画像が受け付けられることをテスト"""
+        form = self._form(SimpleUploadedFile("image.png", _png_bytes()))
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data["image"].content_type, "image/png")
+
+    def test_valid_png_from_temporary_file(self):
+        """一時ファイルに書き出されたアップロードもパスから検証されることをテスト"""
+        data = _png_bytes()
+        upload = TemporaryUploadedFile("image.png", "image/png", len(data), None)
+        upload.write(data)
+        upload.seek(0)
+        form = self._form(upload)
+        self.assertTrue(form.is_valid(), form.errors)
+        upload.close()
+
+    def test_rejects_fake_image(self):
+        """拡張子だけ画像のファイルが先頭バイトの判定で拒否されることをテスト"""
+        form = self._form(SimpleUploadedFile("image.png", b"not an image at all"))
+        self.assertFalse(form.is_valid())
+        self.assertIn("image", form.errors)
+
+    def test_rejects_oversized_dimensions(self):
+        """縦横サイズの上限を超える画像が拒否されることをテスト"""
+        data = _png_bytes((MAX_IMAGE_DIMENSION + 1, 1))
+        form = self._form(SimpleUploadedFile("image.png", data))
+        self.assertFalse(form.is_valid())
+        self.assertIn("ピクセル", form.errors["image"][0])
+
+    def test_rejects_truncated_upload(self):
+        """アップロードハンドラーが書き込みを中止したファイルが拒否されることをテスト"""
+        upload = SimpleUploadedFile("image.png", _png_bytes())
+        upload.truncated = True
+        form = self._form(upload)
+        self.assertFalse(form.is_valid())
+        self.assertIn("5MB", form.errors["image"][0])
+
+    def test_sniff_image_format(self):
+        """先頭バイトから画像形式を判定できることをテスト"""
+        self.assertEqual(sniff_image_format(_png_bytes()[:16]), "PNG")
+        self.assertEqual(sniff_image_format(b"GIF89a\x00\x00"), "GIF")
+        self.assertEqual(sniff_image_format(b"\xff\xd8\xff\xe0"), "JPEG")
+        self.assertIsNone(sniff_image_format(b"%PDF-1.4"))
+
+
+class LimitedTemporaryFileUploadHandlerTest(TestCase):
+    """LimitedTemporaryFileUploadHandler のテストクラス"""
+
+    def test_stops_writing_over_limit(self):
+        """上限を超えたチャンクが書き込まれず truncated が立つことをテスト"""
+        handler = LimitedTemporaryFileUploadHandler()
+        handler.new_file("image", "image.png", "image/png", None)
+        handler.size_limit = 10
+
+        handler.receive_data_chunk(b"x" * 8, 0)
+        handler.receive_data_chunk(b"x" * 8, 8)
+        upload = handler.file_complete(16)
+
+        self.assertTrue(upload.truncated)
+        upload.seek(0)
+        self.assertEqual(len(upload.read()), 8)
+        upload.close()
+
+    def test_unlimited_field(self):
+        """上限のないフィールドはすべて書き込まれることをテスト"""
+        handler = LimitedTemporaryFileUploadHandler()
+        handler.new_file("file", "data.csv", "text/csv", None)
+        handler.receive_data_chunk(b"a,b\n" * 4, 0)
+        upload = handler.file_complete(16)
+
+        self.assertFalse(upload.truncated)
+        upload.seek(0)
+        self.assertEqual(upload.read(), b"a,b\n" * 4)
+        upload.close()
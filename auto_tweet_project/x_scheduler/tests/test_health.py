@@ -0,0 +1,85 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from freezegun import freeze_time
+
+from .. import health
+from ..models import SystemSetting, TweetSchedule
+from ..utils import TwitterAPIClient
+from .fakes import FakeTweepyAPI, FakeTweepyClient
+
+
+@override_settings(API_HEALTH_TTL_SECONDS=3600)
+class HealthCacheTest(TestCase):
+    """接続確認の結果のキャッシュのテストクラス"""
+
+    def setUp(self):
+        for patcher in (
+            patch.object(
+                TwitterAPIClient, "_initialize_api_v1", lambda self: FakeTweepyAPI()
+            ),
+            patch.object(
+                TwitterAPIClient,
+                "_initialize_client_v2",
+                lambda self: FakeTweepyClient(),
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_probe_records_result_until_ttl(self):
+        self.assertTrue(health.needs_probe())
+        with freeze_time("2025-04-03 01:00:00"):
+            self.assertTrue(health.probe(TwitterAPIClient())["success"])
+            state = health.load()
+            self.assertEqual(state["user_id"], "1")
+            self.assertEqual(state["source"], "probe")
+            self.assertFalse(health.needs_probe())
+
+        with freeze_time("2025-04-03 02:00:00"):
+            self.assertTrue(health.needs_probe())
+
+    def test_failure_forces_probe_and_post_success_keeps_user_id(self):
+        health.record_success(user_id=42)
+        health.record_failure("401 Unauthorized", source="post")
+        self.assertTrue(health.needs_probe())
+        self.assertEqual(health.load()["user_id"], "42")
+
+        health.record_success(source="post")
+        state = health.load()
+        self.assertTrue(state["ok"])
+        self.assertEqual(state["user_id"], "42")
+        self.assertFalse(health.needs_probe())
+
+    def test_unreadable_record(self):
+        SystemSetting.set_value(health.HEALTH_SETTING_KEY, "not json")
+        self.assertIsNone(health.load())
+        self.assertTrue(health.needs_probe())
+
+    def _run_process_tweets(self):
+        TweetSchedule.objects.create(
+            content="接続確認テスト",
+            scheduled_time=timezone.now() - timedelta(minutes=1),
+        )
+        with patch.object(
+            TwitterAPIClient,
+            "test_connection",
+            autospec=True,
+            side_effect=lambda self: {"success": True, "error": "", "user_id": "1"},
+        ) as mock_test:
+            call_command("process_tweets")
+        return mock_test
+
+    def test_process_tweets_skips_probe_when_fresh(self):
+        health.record_success(user_id=1, source="post")
+        self._run_process_tweets().assert_not_called()
+        # 投稿の成功で記録が更新される
+        self.assertEqual(health.load()["source"], "post")
+
+    def test_process_tweets_probes_after_failure(self):
+        health.record_failure("投稿失敗", source="post")
+        self._run_process_tweets().assert_called_once()
+        self.assertTrue(health.load()["ok"])
@@ -0,0 +1,129 @@
+import json
+import logging
+import logging.config
+import threading
+from io import StringIO
+from unittest.mock import patch
+
+from core.logging_handlers import JsonFormatter, QueueListenerHandler
+from django.test import SimpleTestCase
+
+
+class ListHandler(logging.Handler):
+    """受け取ったレコードをリストに保存するテスト用ハンドラー"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class BlockingHandler(ListHandler):
+    """release が呼ばれるまで出力を待つテスト用ハンドラー"""
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.released = threading.Event()
+
+    def emit(self, record):
+        self.started.set()
+        self.released.wait(5)
+        super().emit(record)
+
+
+class JsonFormatterTest(SimpleTestCase):
+    """JsonFormatter のテストクラス"""
+
+    def test_format_with_extra_and_exception(self):
+        """メッセージ・extra・例外情報が JSON のフィールドとして出力されることをテスト"""
+        logger = logging.getLogger("x_scheduler.tests.json")
+        try:
+            raise ValueError("テスト例外")
+        except ValueError:
+            record = logger.makeRecord(
+                logger.name,
+                logging.ERROR,
+                __file__,
+                1,
+                "投稿失敗: %s",
+                ("ID-1",),
+                exc_info=__import__("sys").exc_info(),
+                extra={"tweet_id": "ID-1"},
+            )
+        data = json.loads(JsonFormatter().format(record))
+
+        self.assertEqual(data["level"], "ERROR")
+        self.assertEqual(data["message"], "投稿失敗: ID-1")
+        self.assertEqual(data["tweet_id"], "ID-1")
+        self.assertIn("ValueError: テスト例外", data["exc_info"])
+
+
+class QueueListenerHandlerTest(SimpleTestCase):
+    """QueueListenerHandler のテストクラス"""
+
+    def test_records_are_emitted_by_listener(self):
+        """dictConfig で設定したハンドラーへリスナー経由で出力されることをテスト"""
+        config = logging.config.DictConfigurator(
+            {
+                "version": 1,
+                "disable_existing_loggers": False,
+                "handlers": {
+                    "memory": {"()": ListHandler},
+                    "queue": {
+                        "()": "core.logging_handlers.QueueListenerHandler",
+                        "handlers": ["cfg://handlers.memory"],
+                    },
+                },
+                "loggers": {
+                    "x_scheduler.tests.queue": {
+                        "handlers": ["queue"],
+                        "level": "INFO",
+                        "propagate": False,
+                    },
+                },
+            }
+        )
+        config.configure()
+        logger = logging.getLogger("x_scheduler.tests.queue")
+        queue_handler = logger.handlers[0]
+        memory_handler = config.config["handlers"]["memory"]
+        try:
+            logger.debug("出力されない %s", "debug")
+            logger.info("投稿処理: %d件", 3)
+            queue_handler.close()
+        finally:
+            logger.handlers.clear()
+
+        self.assertEqual(len(memory_handler.records), 1)
+        record = memory_handler.records[0]
+        self.assertEqual(record.getMessage(), "投稿処理: 3件")
+        self.assertIsNone(record.args)
+
+    def test_dropped_records_are_counted_and_reported(self):
+        """キューが満杯で捨てたレコードが数えられ、標準エラー出力に報告されることをテスト"""
+        blocking = BlockingHandler()
+        handler = QueueListenerHandler([blocking], maxsize=1)
+        logger = logging.getLogger("x_scheduler.tests.queue_full")
+        with patch("sys.stderr", new_callable=StringIO) as stderr:
+            # 1件目の出力中にリスナーを止め、2件目でキューを満杯にする
+            handler.handle(
+                logger.makeRecord(logger.name, logging.INFO, "", 1, "1", (), None)
+            )
+            self.assertTrue(blocking.started.wait(5))
+            for i in range(2, 5):
+                handler.handle(
+                    logger.makeRecord(
+                        logger.name, logging.INFO, "", 1, str(i), (), None
+                    )
+                )
+            blocking.released.set()
+            handler.close()
+            # 2回目の close では何もしない
+            handler.close()
+
+        self.assertEqual(handler.dropped, 2)
+        self.assertEqual([r.getMessage() for r in blocking.records], ["1", "2"])
+        self.assertIn("2件のレコードを捨てました", stderr.getvalue())
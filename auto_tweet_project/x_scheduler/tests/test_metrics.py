@@ -0,0 +1,99 @@
+from unittest.mock import MagicMock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..metrics import MetricsRegistry, record_rate_limit, registry, render_metrics
+from ..models import DailyPostCounter, MetricValue, TweetSchedule
+
+
+class MetricsRegistryTest(TestCase):
+    """MetricsRegistry のテストクラス"""
+
+    def test_flush_accumulates_across_registries(self):
+        """別プロセス (別レジストリ) の観測値が DB 上で加算されることをテスト"""
+        first = MetricsRegistry()
+        first.observe("x_scheduler_create_tweet_seconds", 0.3)
+        first.flush()
+        second = MetricsRegistry()
+        second.observe("x_scheduler_create_tweet_seconds", 2.0)
+        second.flush()
+
+        values = dict(
+            MetricValue.objects.filter(labels="").values_list("name", "value")
+        )
+        self.assertEqual(values["x_scheduler_create_tweet_seconds_count"], 2)
+        self.assertAlmostEqual(values["x_scheduler_create_tweet_seconds_sum"], 2.3)
+        bucket = MetricValue.objects.get(
+            name="x_scheduler_create_tweet_seconds_bucket", labels='le="0.5"'
+        )
+        self.assertEqual(bucket.value, 1)
+
+    def test_flush_clears_registry(self):
+        """flush 後に同じ値が二重に加算されないことをテスト"""
+        local = MetricsRegistry()
+        local.observe("x_scheduler_media_upload_seconds", 1)
+        local.flush()
+        local.flush()
+        self.assertEqual(
+            MetricValue.objects.get(
+                name="x_scheduler_media_upload_seconds_count"
+            ).value,
+            1,
+        )
+
+    def test_record_rate_limit(self):
+        """レスポンスヘッダーのレート制限の残り回数が記録されることをテスト"""
+        response = MagicMock()
+        response.headers = {"x-rate-limit-remaining": "42"}
+        response.url = "https://api.twitter.com/2/tweets"
+        record_rate_limit(response)
+        registry.flush()
+
+        gauge = MetricValue.objects.get(name="x_scheduler_rate_limit_remaining")
+        self.assertEqual(gauge.labels, 'endpoint="/2/tweets"')
+        self.assertEqual(gauge.value, 42)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, MAX_DAILY_POSTS_PER_USER=10)
+class MetricsEndpointTest(TestCase):
+    """メトリクスエンドポイントのテストクラス"""
+
+    def test_render_metrics(self):
+        """キューの状態と累積値が Prometheus 形式で出力されることをテスト"""
+        TweetSchedule.objects.create(
+            content="遅延",
+            scheduled_time=timezone.now() - timezone.timedelta(minutes=5),
+        )
+        TweetSchedule.objects.create(
+            content="未来", scheduled_time=timezone.now() + timezone.timedelta(hours=1)
+        )
+        DailyPostCounter.objects.create(date=timezone.localdate(), post_count=3)
+        local = MetricsRegistry()
+        local.observe("x_scheduler_process_tweets_duration_seconds", 4)
+        local.flush()
+
+        response = self.client.get(reverse("x_scheduler:metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        text = response.content.decode()
+        self.assertIn("x_scheduler_pending_queue_depth 2", text)
+        self.assertIn("x_scheduler_daily_posts_used 3", text)
+        self.assertIn("x_scheduler_daily_posts_limit 10", text)
+        self.assertIn(
+            "# TYPE x_scheduler_process_tweets_duration_seconds histogram", text
+        )
+        self.assertIn(
+            'x_scheduler_process_tweets_duration_seconds_bucket{le="2.5"} 0', text
+        )
+        self.assertIn(
+            'x_scheduler_process_tweets_duration_seconds_bucket{le="+Inf"} 1', text
+        )
+
+        lag_line = next(
+            line
+            for line in render_metrics().splitlines()
+            if line.startswith("x_scheduler_oldest_due_lag_seconds ")
+        )
+        self.assertGreaterEqual(float(lag_line.split()[1]), 300)
@@ -5,7 +5,7 @@ from django.utils import timezone
 from django.conf import settings
 from freezegun import freeze_time # 日時を固定するために freezegun を使用
 
-from ..models import DailyPostCounter, SystemSetting
+from ..models import DailyPostCounter, SystemSetting, TweetSchedule
 
 class DailyPostCounterModelTest(TestCase):
 
@@ -103,6 +103,36 @@ class DailyPostCounterModelTest(TestCase):
             self.assertNotEqual(counter_day1.date, counter_day2.date)
             self.assertEqual(counter_day2.date, timezone.now().date())
 
+    @freeze_time("2025-04-03 10:00:00")
+    def test_reserve_and_release(self):
+        """reserve が上限まで投稿枠を予約し、release で返却できることをテスト"""
+        today = timezone.localdate()
+        # カウンターがまだない日も予約できる
+        for _ in range(5):
+            self.assertEqual(DailyPostCounter.reserve(), today)
+        self.assertIsNone(DailyPostCounter.reserve())
+        self.assertEqual(DailyPostCounter.objects.get(date=today).post_count, 5)
+
+        DailyPostCounter.release(today)
+        self.assertEqual(DailyPostCounter.objects.get(date=today).post_count, 4)
+        self.assertEqual(DailyPostCounter.reserve(), today)
+        self.assertIsNone(DailyPostCounter.reserve())
+
+
+class TweetScheduleDeferTest(TestCase):
+
+    @freeze_time("2025-04-03 10:00:00")  # JST 19:00
+    def test_defer_to_next_day_keeps_time_of_day(self):
+        """defer_to_next_day が翌日の同じ時刻に延期することをテスト"""
+        scheduled = timezone.make_aware(timezone.datetime(2025, 4, 1, 8, 30))
+        tweet = TweetSchedule(content="延期テスト", scheduled_time=scheduled)
+        tweet.defer_to_next_day("投稿上限")
+        local = timezone.localtime(tweet.scheduled_time)
+        self.assertEqual(local.date(), timezone.datetime(2025, 4, 4).date())
+        self.assertEqual((local.hour, local.minute), (8, 30))
+        self.assertEqual(tweet.error_message, "投稿上限")
+
+
 class SystemSettingModelTest(TestCase):
 
     def test_set_value_creates_new_entry(self):
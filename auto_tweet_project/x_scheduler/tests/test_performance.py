@@ -0,0 +1,243 @@
+"""
+クエリ数と処理時間の回帰テスト
+
+各コマンド・ビューを複数のデータ件数で実行し、
+- クエリ数が予算 (固定分 + 1件あたりの件数) 以内であること
+- クエリ数・処理時間が件数に対して線形より悪化しないこと
+を確認する。X API は tests/fakes.py のクライアントに置き換える。
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from freezegun import freeze_time
+
+from ..models import TweetSchedule
+from ..utils import TwitterAPIClient
+from .fakes import FakeTweepyAPI, FakeTweepyClient
+
+SIZES = (5, 20, 80)
+
+
+class QueryBudgetMixin:
+    """クエリ数の予算と増加の仕方を検証するヘルパー"""
+
+    def run_counted(self, func):
+        """func を実行し、(発行したクエリ数, 所要時間) を返す"""
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+        return context.captured_queries, elapsed
+
+    def count_without_insert_chunks(self, queries):
+        """SQLite の変数上限で分割された一括 INSERT を1回と数えたクエリ数 (増加の仕方の確認用)"""
+        inserts = sum(1 for query in queries if query["sql"].startswith("INSERT"))
+        return len(queries) - max(0, inserts - 1)
+
+    def assertQueryBudget(self, queries, budget, label):
+        if len(queries) > budget:
+            sql = "\n".join(query["sql"] for query in queries)
+            self.fail(
+                f"{label}: クエリ数 {len(queries)} が予算 {budget} を超えています\n{sql}"
+            )
+
+    def assertAtMostLinear(self, sizes, values, label, tolerance=1.0):
+        """件数あたりの増加量 (傾き) が件数とともに大きくならないことを確認する"""
+        slopes = [
+            (values[i + 1] - values[i]) / (sizes[i + 1] - sizes[i])
+            for i in range(len(sizes) - 1)
+        ]
+        for smaller, larger in zip(slopes, slopes[1:]):
+            self.assertLessEqual(
+                larger,
+                max(smaller, 0) * tolerance + 1e-9,
+                f"{label}: 件数に対して線形より悪化しています (件数 {sizes}, 値 {values})",
+            )
+
+    def assertTimeAtMostLinear(self, sizes, timings, label, factor=3.0, floor=0.002):
+        """最大件数での1件あたりの時間が、最小件数の factor 倍以内であることを確認する"""
+        per_item_small = max(timings[0] / sizes[0], floor)
+        per_item_large = timings[-1] / sizes[-1]
+        self.assertLessEqual(
+            per_item_large,
+            per_item_small * factor,
+            f"{label}: 1件あたりの処理時間が件数とともに増えています (件数 {sizes}, 秒 {timings})",
+        )
+
+
+def _fake_clients():
+    """TwitterAPIClient が生成する tweepy クライアントをフェイクに差し替える"""
+    return (
+        patch.object(
+            TwitterAPIClient, "_initialize_api_v1", lambda self: FakeTweepyAPI()
+        ),
+        patch.object(
+            TwitterAPIClient, "_initialize_client_v2", lambda self: FakeTweepyClient()
+        ),
+    )
+
+
+@override_settings(MAX_DAILY_POSTS_PER_USER=1000)
+class ProcessTweetsPerformanceTest(QueryBudgetMixin, TestCase):
+    """process_tweets コマンドのクエリ数・処理時間のテストクラス"""
+
+    # 固定分: 繰り返しパターンの確認・予約の存在確認・カウンター・設定値・予約の取得・
+    # 接続確認の記録 (読み込みと更新)・メトリクス (持ち越し件数のゲージを含む) の保存
+    BASE_QUERIES = 14
+    # 1件あたり: 投稿中への更新・予約の保存・投稿試行の記録・カウンターの更新
+    QUERIES_PER_TWEET = 4
+
+    def setUp(self):
+        for patcher in _fake_clients():
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _create_due_tweets(self, count):
+        scheduled_time = timezone.now() - timezone.timedelta(minutes=1)
+        TweetSchedule.objects.bulk_create(
+            TweetSchedule(content=f"性能テスト{i}", scheduled_time=scheduled_time)
+            for i in range(count)
+        )
+
+    def _run(self):
+        # 遅延分の再配置を行うと1回で投稿されなくなるため、全件を投稿させる
+        call_command("process_tweets", "--skip-api-test", "--no-catch-up")
+
+    def test_query_budget_and_scaling(self):
+        # メトリクスの行作成など初回のみの処理を済ませておく
+        self._create_due_tweets(1)
+        self._run()
+
+        counts, timings = [], []
+        for size in SIZES:
+            self._create_due_tweets(size)
+            queries, elapsed = self.run_counted(self._run)
+            self.assertQueryBudget(
+                queries,
+                self.BASE_QUERIES + self.QUERIES_PER_TWEET * size,
+                f"process_tweets ({size}件)",
+            )
+            self.assertEqual(TweetSchedule.objects.filter(status="pending").count(), 0)
+            counts.append(len(queries))
+            timings.append(elapsed)
+
+        self.assertAtMostLinear(SIZES, counts, "process_tweets のクエリ数")
+        self.assertTimeAtMostLinear(SIZES, timings, "process_tweets の処理時間")
+
+
+@override_settings(MAX_DAILY_POSTS_PER_USER=1000)
+class BatchCommandsPerformanceTest(QueryBudgetMixin, TestCase):
+    """一括登録系コマンドのクエリ数のテストクラス"""
+
+    def setUp(self):
+        self.image_dir_name = "test_performance_images"
+        self.image_dir_path = os.path.join(settings.MEDIA_ROOT, self.image_dir_name)
+        os.makedirs(self.image_dir_path, exist_ok=True)
+        for i in range(1, 4):
+            with open(os.path.join(self.image_dir_path, f"image_{i}.png"), "w") as f:
+                f.write(f"test image {i}")
+
+    def tearDown(self):
+        shutil.rmtree(self.image_dir_path, ignore_errors=True)
+        for tweet in TweetSchedule.objects.all():
+            if tweet.image:
+                tweet.image.delete(save=False)
+
+    @freeze_time("2025-04-04 10:00:00")
+    def test_auto_post_slots(self):
+        """--slots の件数によらずクエリ数が一定であることをテスト"""
+        # 設定値・メトリクスの行作成など初回のみの処理を済ませておく
+        call_command("auto_post", f"--image-dir={self.image_dir_name}", "--slots=1")
+        counts = []
+        for size in SIZES:
+            TweetSchedule.objects.all().delete()
+            queries, _ = self.run_counted(
+                lambda: call_command(
+                    "auto_post",
+                    f"--image-dir={self.image_dir_name}",
+                    f"--slots={size}",
+                    "--interval=1",
+                    "--until=23:59",
+                )
+            )
+            # カウンター・予約数・設定値の取得、投稿時刻のおすすめ用の履歴の集計、
+            # 一括作成と設定値の更新、メトリクスの保存 (SAVEPOINT / RELEASE を含む)
+            self.assertQueryBudget(queries, 16, f"auto_post --slots={size}")
+            counts.append(self.count_without_insert_chunks(queries))
+        self.assertAtMostLinear(SIZES, counts, "auto_post --slots のクエリ数")
+
+    def test_import_schedules(self):
+        """インポート件数に対してクエリ数が線形以下であることをテスト"""
+        now = timezone.localtime()
+        counts = []
+        for size in SIZES:
+            with tempfile.NamedTemporaryFile(
+                "w", suffix=".csv", delete=False, encoding="utf-8"
+            ) as f:
+                f.write("content,scheduled_time\n")
+                for i in range(size):
+                    scheduled = now + timezone.timedelta(hours=1, minutes=i)
+                    f.write(f"投稿{i},{scheduled.strftime('%Y-%m-%d %H:%M')}\n")
+                path = f.name
+            try:
+                queries, _ = self.run_counted(
+                    lambda: call_command("import_schedules", path, stdout=StringIO())
+                )
+            finally:
+                os.remove(path)
+            # 日ごとの予約数・投稿済み数の集計 (1回のみ) と、
+            # 1トランザクション内の一括登録 (SQLite の変数上限で分割される)
+            self.assertQueryBudget(
+                queries, 5 + size // 50, f"import_schedules ({size}件)"
+            )
+            counts.append(self.count_without_insert_chunks(queries))
+        self.assertAtMostLinear(SIZES, counts, "import_schedules のクエリ数")
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ViewsPerformanceTest(QueryBudgetMixin, TestCase):
+    """画面・エンドポイントのクエリ数が件数によらず一定であることのテストクラス"""
+
+    BUDGETS = {
+        # 版情報の集計 + 一覧の取得
+        "x_scheduler:schedule_list": 2,
+        # キューの集計・本日のカウンター・累積値
+        "x_scheduler:metrics": 3,
+        # 投稿済み予約の取得
+        "x_scheduler:dispatch_slo": 1,
+    }
+
+    def _create_tweets(self, count):
+        now = timezone.now()
+        tweets = []
+        for i in range(count):
+            tweet = TweetSchedule(
+                content=f"一覧{i}", scheduled_time=now - timezone.timedelta(minutes=i)
+            )
+            if i % 2:
+                tweet.mark_posted(now)
+            tweets.append(tweet)
+        TweetSchedule.objects.bulk_create(tweets)
+
+    def test_query_budgets(self):
+        created = 0
+        for size in SIZES:
+            self._create_tweets(size - created)
+            created = size
+            for url_name, budget in self.BUDGETS.items():
+                queries, _ = self.run_counted(
+                    lambda: self.client.get(reverse(url_name))
+                )
+                self.assertQueryBudget(queries, budget, f"{url_name} ({size}件)")
@@ -0,0 +1,226 @@
+from datetime import datetime, time
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from freezegun import freeze_time
+
+from ..models import RecurringPattern, TweetSchedule
+from ..recurrence import compile_template, materialize, render_template
+
+
+def _local(hour, day=3, month=4, minute=0):
+    return timezone.make_aware(datetime(2025, month, day, hour, minute))
+
+
+class TemplateTest(TestCase):
+    """投稿内容テンプレートのテストクラス"""
+
+    def test_render(self):
+        self.assertEqual(
+            render_template("{date} {time} の定期投稿 {{固定}}", _local(9, minute=5)),
+            "2025/04/03 09:05 の定期投稿 {固定}",
+        )
+
+    def test_template_is_parsed_once(self):
+        compile_template.cache_clear()
+        for hour in range(5):
+            render_template("{time} の投稿", _local(hour))
+        self.assertEqual(compile_template.cache_info().misses, 1)
+
+    def test_unknown_field(self):
+        with self.assertRaises(ValueError):
+            compile_template("{name} さん")
+        with self.assertRaises(ValueError):
+            compile_template("{date:%d}")
+
+
+# 2025-04-03 (木) 10:00 (JST)
+@freeze_time("2025-04-03 01:00:00")
+class RecurringPatternTest(TestCase):
+    """繰り返しパターンの次回の投稿時刻のテストクラス"""
+
+    def _pattern(self, **kwargs):
+        kwargs.setdefault("name", "定期")
+        kwargs.setdefault("content_template", "{date} の定期投稿")
+        return RecurringPattern.objects.create(**kwargs)
+
+    def test_daily(self):
+        # 当日の時刻を過ぎていれば翌日
+        self.assertEqual(
+            self._pattern(frequency="daily", time=time(9)).next_fire_at,
+            _local(9, day=4),
+        )
+        self.assertEqual(
+            self._pattern(frequency="daily", time=time(12)).next_fire_at, _local(12)
+        )
+
+    def test_weekly(self):
+        pattern = self._pattern(frequency="weekly", time=time(9), weekday=3)
+        self.assertEqual(pattern.next_fire_at, _local(9, day=10))
+        self.assertEqual(
+            pattern.next_fire_after(pattern.next_fire_at), _local(9, day=17)
+        )
+
+    def test_monthly_clamps_to_month_end(self):
+        pattern = self._pattern(frequency="monthly", time=time(9), day_of_month=31)
+        self.assertEqual(pattern.next_fire_at, _local(9, day=30))
+        self.assertEqual(
+            pattern.next_fire_after(pattern.next_fire_at), _local(9, day=31, month=5)
+        )
+
+    def test_inactive_has_no_next_fire(self):
+        pattern = self._pattern(frequency="daily", time=time(12), is_active=False)
+        self.assertIsNone(pattern.next_fire_at)
+
+    def test_clean(self):
+        pattern = RecurringPattern(
+            name="定期", frequency="weekly", time=time(9), content_template="{name}"
+        )
+        with self.assertRaises(ValidationError) as cm:
+            pattern.clean()
+        self.assertEqual(
+            set(cm.exception.message_dict), {"weekday", "content_template"}
+        )
+
+        # {date} (6文字) は10文字に展開される
+        pattern = RecurringPattern(
+            name="定期",
+            frequency="daily",
+            time=time(9),
+            content_template="あ" * 275 + "{date}",
+        )
+        with self.assertRaises(ValidationError):
+            pattern.clean()
+
+
+@freeze_time("2025-04-03 01:00:00")
+@override_settings(RECURRENCE_HORIZON_HOURS=48, MAX_DAILY_POSTS_PER_USER=10)
+class MaterializeTest(TestCase):
+    """繰り返しパターンの予約の作成のテストクラス"""
+
+    def setUp(self):
+        self.daily = RecurringPattern.objects.create(
+            name="毎日",
+            frequency="daily",
+            time=time(12),
+            content_template="{date} {time} のお知らせ",
+        )
+        self.weekly = RecurringPattern.objects.create(
+            name="毎週",
+            frequency="weekly",
+            time=time(9),
+            weekday=4,
+            content_template="週末です",
+        )
+        # 先読み期間の外にあるパターンは読み込まない
+        RecurringPattern.objects.create(
+            name="毎月",
+            frequency="monthly",
+            time=time(9),
+            day_of_month=20,
+            content_template="月次",
+        )
+
+    @patch("x_scheduler.recurrence.notify_schedule_changed")
+    def test_creates_occurrences_within_horizon(self, mock_notify):
+        # パターンの取得・各日の予定数・投稿済み数・パターンごとの更新・一括登録 (とセーブポイント)
+        with self.assertNumQueries(8):
+            result = materialize()
+        self.assertEqual(result["patterns"], 2)
+        self.assertEqual(result["created"], 3)
+        mock_notify.assert_called_once()
+
+        self.assertEqual(
+            list(
+                TweetSchedule.objects.order_by("scheduled_time").values_list(
+                    "content", "scheduled_time", "recurring_pattern"
+                )
+            ),
+            [
+                ("2025/04/03 12:00 のお知らせ", _local(12), self.daily.pk),
+                ("週末です", _local(9, day=4), self.weekly.pk),
+                ("2025/04/04 12:00 のお知らせ", _local(12, day=4), self.daily.pk),
+            ],
+        )
+        self.daily.refresh_from_db()
+        self.assertEqual(self.daily.next_fire_at, _local(12, day=5))
+        self.weekly.refresh_from_db()
+        self.assertEqual(self.weekly.next_fire_at, _local(9, day=11))
+
+        # 2回目は作成済みの分を作らない (パターンの取得だけ)
+        with self.assertNumQueries(1):
+            self.assertEqual(materialize()["created"], 0)
+
+    def test_rolling_horizon(self):
+        materialize()
+        with freeze_time("2025-04-04 01:00:00"):
+            result = materialize()
+        self.assertEqual(result["created"], 1)
+        self.assertTrue(
+            TweetSchedule.objects.filter(scheduled_time=_local(12, day=5)).exists()
+        )
+
+    def test_stale_claim_is_ignored(self):
+        stale = RecurringPattern.objects.get(pk=self.daily.pk)
+        materialize()
+        # 別のプロセスが読み込んだ古い next_fire_at では更新できない
+        updated = RecurringPattern.objects.filter(
+            pk=stale.pk, next_fire_at=stale.next_fire_at
+        ).update(next_fire_at=None)
+        self.assertEqual(updated, 0)
+        self.assertEqual(
+            TweetSchedule.objects.filter(recurring_pattern=self.daily).count(), 2
+        )
+
+    def test_skips_past_occurrences(self):
+        RecurringPattern.objects.filter(pk=self.daily.pk).update(
+            next_fire_at=_local(12, day=1)
+        )
+        result = materialize()
+        # 1日・2日の分は作成せず、3日・4日の分だけを作成する
+        self.assertEqual(result["skipped_past"], 2)
+        self.assertEqual(
+            TweetSchedule.objects.filter(recurring_pattern=self.daily).count(), 2
+        )
+
+    @override_settings(MAX_DAILY_POSTS_PER_USER=1)
+    def test_skips_over_daily_limit(self):
+        TweetSchedule.objects.create(content="手動", scheduled_time=_local(20))
+        result = materialize()
+        self.assertEqual(result["skipped_limit"], 2)
+        self.assertEqual(
+            TweetSchedule.objects.filter(recurring_pattern__isnull=False).count(), 1
+        )
+
+    def test_image_is_copied_per_occurrence(self):
+        storage = RecurringPattern._meta.get_field("image").storage
+        self.daily.image = SimpleUploadedFile("image.png", b"dummy image")
+        self.daily.save()
+        self.addCleanup(storage.delete, self.daily.image.name)
+
+        materialize()
+        names = set(
+            TweetSchedule.objects.filter(recurring_pattern=self.daily).values_list(
+                "image", flat=True
+            )
+        )
+        for name in names:
+            self.addCleanup(storage.delete, name)
+        # 予約の削除時に画像が削除されるため、予約ごとに別のファイルになる
+        self.assertEqual(len(names), 2)
+        self.assertNotIn(self.daily.image.name, names)
+        self.assertTrue(all(storage.exists(name) for name in names))
+
+    def test_command(self):
+        out = StringIO()
+        call_command("materialize_recurring", "--horizon-hours", "24", stdout=out)
+        self.assertIn("予約を 2件作成しました", out.getvalue())
+        self.assertEqual(TweetSchedule.objects.count(), 2)
+
+    def test_disabled(self):
+        self.assertEqual(materialize(horizon_hours=0)["created"], 0)
@@ -0,0 +1,85 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from freezegun import freeze_time
+
+from ..models import TweetSchedule
+from ..slo import dispatch_lag_report
+
+
+@freeze_time("2025-04-04 10:00:00")
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    DISPATCH_LAG_SLO_SECONDS=600,
+    DISPATCH_LAG_SLO_PERCENTILE=95,
+)
+class DispatchLagSLOTest(TestCase):
+    """投稿遅延の SLO 集計のテストクラス"""
+
+    def _posted(self, posted_at, lag_minutes):
+        tweet = TweetSchedule(
+            content="SLOテスト",
+            scheduled_time=posted_at - timezone.timedelta(minutes=lag_minutes),
+        )
+        tweet.mark_posted(posted_at)
+        tweet.save()
+        return tweet
+
+    def setUp(self):
+        now = timezone.now()
+        # 本日 (19時台 JST): 遅延 1〜4分
+        for minutes in (1, 2, 3, 4):
+            self._posted(now, minutes)
+        # 前日 (19時台 JST): 遅延 30分 → SLO 違反
+        self._posted(now - timezone.timedelta(days=1), 30)
+
+    def test_mark_posted(self):
+        """mark_posted が投稿日時と遅延を記録することをテスト"""
+        tweet = TweetSchedule.objects.filter(dispatch_lag__isnull=False).first()
+        self.assertEqual(tweet.status, "posted")
+        self.assertEqual(tweet.dispatch_lag, tweet.posted_at - tweet.scheduled_time)
+
+    def test_report_by_day(self):
+        """日別のパーセンタイルと違反判定をテスト"""
+        report = dispatch_lag_report(days=2, by="day")
+        self.assertEqual(report["breaches"], ["2025-04-03"])
+        today = report["groups"][1]
+        self.assertEqual(today["key"], "2025-04-04")
+        self.assertEqual(today["count"], 4)
+        self.assertEqual(today["p50"], 120)
+        self.assertEqual(today["p95"], 240)
+        self.assertFalse(today["breach"])
+
+    def test_report_by_hour(self):
+        """時間帯別 (現地時刻) に集計されることをテスト"""
+        report = dispatch_lag_report(days=2, by="hour")
+        self.assertEqual([g["key"] for g in report["groups"]], ["19"])
+        self.assertEqual(report["groups"][0]["count"], 5)
+
+    def test_endpoint(self):
+        """エンドポイントが JSON で集計結果を返すことをテスト"""
+        response = self.client.get(reverse("x_scheduler:dispatch_slo"), {"days": 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["threshold_seconds"], 600)
+        self.assertEqual(data["breaches"], ["2025-04-03"])
+
+        response = self.client.get(reverse("x_scheduler:dispatch_slo"), {"by": "week"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_command(self):
+        """コマンドが表と違反を出力し、--fail-on-breach でエラー終了することをテスト"""
+        out, err = StringIO(), StringIO()
+        call_command("dispatch_slo", "--days=2", stdout=out, stderr=err)
+        self.assertIn("2025-04-03\t1\t1800", out.getvalue())
+        self.assertIn("違反", out.getvalue())
+        self.assertIn("2025-04-03", err.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command("dispatch_slo", "--days=2", "--fail-on-breach", stdout=out)
+        # 本日分のみなら違反なし
+        call_command("dispatch_slo", "--days=1", "--fail-on-breach", stdout=StringIO())
@@ -0,0 +1,136 @@
+from datetime import datetime
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from freezegun import freeze_time
+
+from ..forms import TweetScheduleForm
+from ..importers import ScheduleImporter
+from ..models import DailyPostCounter, TweetSchedule
+from ..slots import SlotAllocator
+
+
+def _local(hour, day=3):
+    return timezone.make_aware(datetime(2025, 4, day, hour))
+
+
+# 2025-04-03 10:00 (JST)
+@freeze_time("2025-04-03 01:00:00")
+@override_settings(MAX_DAILY_POSTS_PER_USER=3)
+class SlotAllocatorTest(TestCase):
+    """日ごとの投稿枠の割り当てのテストクラス"""
+
+    def _book(self, *times, status="pending"):
+        return [
+            TweetSchedule.objects.create(
+                content="予約", scheduled_time=t, status=status
+            )
+            for t in times
+        ]
+
+    def test_counts_posted_and_booked(self):
+        DailyPostCounter.objects.create(date=_local(10).date(), post_count=1)
+        self._book(_local(12))
+        self._book(_local(13), status="scheduled")
+        # 投稿済み・失敗した予約は数えない (投稿済み数はカウンターで数える)
+        self._book(_local(14), status="posted")
+        self._book(_local(15), status="failed")
+
+        allocator = SlotAllocator()
+        self.assertEqual(allocator.remaining(_local(10).date()), 0)
+        self.assertEqual(allocator.remaining(_local(10, day=4).date()), 3)
+
+    def test_counts_are_loaded_once(self):
+        self._book(_local(12), _local(12, day=4))
+        allocator = SlotAllocator()
+        with self.assertNumQueries(2):
+            taken = [allocator.take(_local(20)) for _ in range(4)]
+            allocator.take(_local(20, day=4))
+        self.assertEqual(taken, [True, True, False, False])
+        self.assertEqual(allocator.remaining(_local(0, day=4).date()), 1)
+
+    def test_next_free_and_allocate(self):
+        self._book(
+            _local(11), _local(12), _local(13), _local(11, day=4), _local(12, day=4)
+        )
+        allocator = SlotAllocator()
+        self.assertEqual(allocator.next_free(_local(20)), _local(20, day=4))
+        self.assertEqual(allocator.allocate(_local(20)), _local(20, day=4))
+        # 4日の枠を使い切ったため5日に回す
+        self.assertEqual(allocator.allocate(_local(20)), _local(20, day=5))
+
+    def test_excluded_rows_are_not_counted(self):
+        tweets = self._book(_local(11), _local(12), _local(13))
+        self.assertFalse(SlotAllocator().take(_local(20)))
+        self.assertTrue(SlotAllocator(exclude_ids=[tweets[0].pk]).take(_local(20)))
+
+    @override_settings(MAX_DAILY_POSTS_PER_USER=0)
+    def test_zero_limit(self):
+        allocator = SlotAllocator()
+        self.assertIsNone(allocator.next_free(_local(20)))
+        self.assertIsNone(allocator.allocate(_local(20)))
+
+
+@freeze_time("2025-04-03 01:00:00")
+@override_settings(MAX_DAILY_POSTS_PER_USER=2)
+class DailyLimitOnCreateTest(TestCase):
+    """予約作成時の投稿上限の確認のテストクラス"""
+
+    def setUp(self):
+        self.booked = [
+            TweetSchedule.objects.create(
+                content=f"予約{i}", scheduled_time=_local(11 + i)
+            )
+            for i in range(2)
+        ]
+
+    def _form(self, scheduled_time, instance=None):
+        return TweetScheduleForm(
+            {
+                "content": "上限テスト",
+                "scheduled_time": timezone.localtime(scheduled_time).strftime(
+                    "%Y-%m-%dT%H:%M"
+                ),
+            },
+            instance=instance,
+        )
+
+    def test_form_rejects_full_day_and_suggests_next(self):
+        form = self._form(_local(20))
+        self.assertFalse(form.is_valid())
+        message = form.errors["scheduled_time"][0]
+        self.assertIn("1日の投稿上限（2件）", message)
+        self.assertIn("2025-04-04 20:00", message)
+
+        self.assertTrue(self._form(_local(20, day=4)).is_valid())
+
+    def test_form_allows_editing_booked_row(self):
+        form = self._form(_local(21), instance=self.booked[0])
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def _import(self, overflow):
+        lines = [
+            "content,scheduled_time",
+            "当日,2025-04-03 20:00",
+            "翌日,2025-04-04 20:00",
+            "翌日2,2025-04-04 21:00",
+        ]
+        return ScheduleImporter(overflow=overflow).run(lines, "csv")
+
+    def test_import_rejects_overflow(self):
+        result = self._import("reject")
+        self.assertEqual(result["created"], 2)
+        self.assertEqual(len(result["errors"]), 1)
+        self.assertEqual(result["errors"][0][0], 2)
+        self.assertIn("2025-04-03", result["errors"][0][1])
+
+    def test_import_spills_overflow(self):
+        result = self._import("spill")
+        self.assertEqual(result["created"], 3)
+        self.assertEqual(result["spilled"], 2)
+        tweet = TweetSchedule.objects.get(content="当日")
+        self.assertEqual(tweet.scheduled_time, _local(20, day=4))
+        self.assertEqual(tweet.original_scheduled_time, _local(20))
+        # 4日は先に回した行と「翌日」で埋まるため、5日の同じ時刻に回る
+        tweet = TweetSchedule.objects.get(content="翌日2")
+        self.assertEqual(tweet.scheduled_time, _local(21, day=5))
@@ -1,10 +1,17 @@
-from django.test import TestCase
+import os
+import subprocess
+import sys
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
 from django.conf import settings
 from unittest.mock import patch, MagicMock # モックを使用
 import tweepy
 
-from ..utils import TwitterAPIClient, process_scheduled_tweets
-from ..models import TweetSchedule # process_scheduled_tweets のテストで使用
+from ..utils import RunBudget, TwitterAPIClient, process_scheduled_tweets
+from ..models import DailyPostCounter, TweetSchedule # process_scheduled_tweets のテストで使用
+from .fakes import FakeTweepyAPI, FakeTweepyClient
 
 # テスト用の設定値 (APIキーなどはダミー)
 TEST_X_API_KEY = "test_api_key"
@@ -29,6 +36,15 @@ class TwitterAPIClientTest(TestCase):
 
         client = TwitterAPIClient()
 
+        # クライアントは最初に参照されるまで生成されない
+        mock_api_constructor.assert_not_called()
+        mock_client_constructor.assert_not_called()
+
+        self.assertEqual(client.api_v1, mock_api_instance)
+        self.assertEqual(client.client_v2, mock_client_instance)
+        # 2回目以降の参照では生成済みのクライアントを使う
+        self.assertEqual(client.api_v1, mock_api_instance)
+
         # コンストラクタが正しい引数で呼び出されたか確認
         mock_api_constructor.assert_called_once()
         # API v1 (OAuth1UserHandler経由) の引数チェックは少し複雑なので省略可
@@ -38,8 +54,6 @@ class TwitterAPIClientTest(TestCase):
             access_token=TEST_X_ACCESS_TOKEN,
             access_token_secret=TEST_X_ACCESS_TOKEN_SECRET
         )
-        self.assertEqual(client.api_v1, mock_api_instance)
-        self.assertEqual(client.client_v2, mock_client_instance)
 
     @patch('tweepy.Client', side_effect=Exception("V2 Init Error"))
     @patch('tweepy.API', side_effect=Exception("V1 Init Error"))
@@ -175,6 +189,198 @@ class TwitterAPIClientTest(TestCase):
         self.assertIn("Rate limit exceeded", result["error"])
         self.assertTrue(result["is_rate_limit"])
 
+
+class LazyTweepyImportTest(SimpleTestCase):
+    """コマンド・Web の起動時に tweepy が import されないことを確認する"""
+
+    def test_modules_do_not_import_tweepy(self):
+        # 既に tweepy を読み込んだテストプロセスとは別のインタープリターで確認する
+        code = (
+            "import sys, django; django.setup(); "
+            "import x_scheduler.utils, x_scheduler.views, x_scheduler.urls; "
+            "import x_scheduler.management.commands.process_tweets; "
+            "import x_scheduler.management.commands.auto_post; "
+            "print('tweepy' in sys.modules)"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            env={
+                **os.environ,
+                "DJANGO_SETTINGS_MODULE": "core.settings",
+                "SECRET_KEY": os.environ.get("SECRET_KEY", "x"),
+            },
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "False")
+
+    def test_client_is_not_built_until_used(self):
+        with (
+            patch.object(TwitterAPIClient, "_initialize_api_v1") as mock_init_api,
+            patch.object(TwitterAPIClient, "_initialize_client_v2") as mock_init_client,
+        ):
+            client = TwitterAPIClient()
+            mock_init_api.assert_not_called()
+            mock_init_client.assert_not_called()
+            client.client_v2
+            mock_init_api.assert_not_called()
+            mock_init_client.assert_called_once()
+
+
+class ProcessScheduledTweetsIdleTest(TestCase):
+    """処理対象がない場合に API クライアントを生成しないことを確認する"""
+
+    @patch.object(TwitterAPIClient, "_initialize_client_v2")
+    @patch.object(TwitterAPIClient, "_initialize_api_v1")
+    def test_no_pending_tweets_skips_client(self, mock_init_api, mock_init_client):
+        self.assertEqual(process_scheduled_tweets(), 0)
+        mock_init_api.assert_not_called()
+        mock_init_client.assert_not_called()
+
+
+@override_settings(MAX_DAILY_POSTS_PER_USER=2)
+class ProcessScheduledTweetsQuotaTest(TestCase):
+    """process_scheduled_tweets の投稿枠の予約と延期のテストクラス"""
+
+    def setUp(self):
+        now = timezone.now()
+        self.tweets = [
+            TweetSchedule.objects.create(
+                content=f"上限テスト{i}",
+                scheduled_time=now - timezone.timedelta(minutes=10 - i),
+            )
+            for i in range(3)
+        ]
+
+    def _mock_clients(self, mock_init_api, mock_init_client, create_tweet):
+        mock_init_api.return_value = MagicMock(spec=tweepy.API)
+        mock_client = MagicMock(spec=tweepy.Client)
+        mock_client.create_tweet.side_effect = create_tweet
+        mock_init_client.return_value = mock_client
+        return mock_client
+
+    @patch.object(TwitterAPIClient, "_initialize_client_v2")
+    @patch.object(TwitterAPIClient, "_initialize_api_v1")
+    def test_stops_when_quota_exhausted(self, mock_init_api, mock_init_client):
+        mock_client = self._mock_clients(
+            mock_init_api, mock_init_client, lambda **kwargs: MagicMock(data={"id": "1"})
+        )
+        self.assertEqual(process_scheduled_tweets(), 2)
+
+        # 上限を超える分は API を呼ばずに翌日へ延期する
+        self.assertEqual(mock_client.create_tweet.call_count, 2)
+        statuses = [t.status for t in TweetSchedule.objects.order_by("scheduled_time")]
+        self.assertEqual(statuses, ["posted", "posted", "pending"])
+        deferred = TweetSchedule.objects.get(pk=self.tweets[2].pk)
+        self.assertEqual(
+            timezone.localtime(deferred.scheduled_time).date(),
+            timezone.localdate() + timezone.timedelta(days=1),
+        )
+        self.assertIn("延期", deferred.error_message)
+        self.assertEqual(DailyPostCounter.get_today_counter().post_count, 2)
+
+    @patch.object(TwitterAPIClient, "_initialize_client_v2")
+    @patch.object(TwitterAPIClient, "_initialize_api_v1")
+    def test_failed_post_releases_quota(self, mock_init_api, mock_init_client):
+        results = iter([tweepy.TweepyException("失敗"), MagicMock(data={"id": "2"})])
+
+        def create_tweet(**kwargs):
+            result = next(results, MagicMock(data={"id": "3"}))
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        self._mock_clients(mock_init_api, mock_init_client, create_tweet)
+        self.assertEqual(process_scheduled_tweets(), 2)
+        statuses = [t.status for t in TweetSchedule.objects.order_by("scheduled_time")]
+        self.assertEqual(statuses, ["failed", "posted", "posted"])
+        self.assertEqual(DailyPostCounter.get_today_counter().post_count, 2)
+
+    @patch.object(TwitterAPIClient, "_initialize_client_v2")
+    @patch.object(TwitterAPIClient, "_initialize_api_v1")
+    def test_tweet_taken_by_another_process_is_skipped(
+        self, mock_init_api, mock_init_client
+    ):
+        def create_tweet(**kwargs):
+            # 投稿中に、他のプロセス (auto_post など) が2件目の投稿を始める
+            TweetSchedule.objects.filter(pk=self.tweets[1].pk).update(status="posting")
+            return MagicMock(data={"id": "1"})
+
+        mock_client = self._mock_clients(mock_init_api, mock_init_client, create_tweet)
+        self.assertEqual(process_scheduled_tweets(), 2)
+        self.assertEqual(mock_client.create_tweet.call_count, 2)
+        statuses = [t.status for t in TweetSchedule.objects.order_by("scheduled_time")]
+        self.assertEqual(statuses, ["posted", "posting", "posted"])
+        # 投稿しなかった分の投稿枠は返却される
+        self.assertEqual(DailyPostCounter.get_today_counter().post_count, 2)
+
+    @patch.object(TwitterAPIClient, "_initialize_client_v2")
+    @patch.object(TwitterAPIClient, "_initialize_api_v1")
+    def test_limit_reached_defers_without_client(self, mock_init_api, mock_init_client):
+        counter = DailyPostCounter.get_today_counter()
+        counter.post_count = 2
+        counter.save()
+
+        self.assertEqual(process_scheduled_tweets(), 0)
+        mock_init_api.assert_not_called()
+        mock_init_client.assert_not_called()
+        self.assertFalse(
+            TweetSchedule.objects.filter(scheduled_time__lte=timezone.now()).exists()
+        )
+
+
+@override_settings(MAX_DAILY_POSTS_PER_USER=100)
+class ProcessScheduledTweetsBudgetTest(TestCase):
+    """実行の上限 (--max-posts / --deadline) のテストクラス"""
+
+    def setUp(self):
+        for patcher in (
+            patch.object(TwitterAPIClient, "_initialize_api_v1", lambda self: FakeTweepyAPI()),
+            patch.object(
+                TwitterAPIClient, "_initialize_client_v2", lambda self: FakeTweepyClient()
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        now = timezone.now()
+        for i in range(5):
+            TweetSchedule.objects.create(
+                content=f"上限テスト{i}",
+                scheduled_time=now - timezone.timedelta(minutes=10 - i),
+            )
+
+    def test_max_posts_leaves_rest_pending(self):
+        budget = RunBudget(max_posts=2)
+        self.assertEqual(process_scheduled_tweets(budget=budget), 2)
+        self.assertEqual(budget.deferred, 3)
+        statuses = [t.status for t in TweetSchedule.objects.order_by("scheduled_time")]
+        self.assertEqual(statuses, ["posted", "posted", "pending", "pending", "pending"])
+        # 持ち越した予約の予定時刻は変更しない
+        self.assertFalse(
+            TweetSchedule.objects.filter(original_scheduled_time__isnull=False).exists()
+        )
+
+    def test_deadline_stops_claiming(self):
+        budget = RunBudget(deadline_seconds=60)
+        with patch("x_scheduler.utils.time.monotonic", return_value=budget.started + 60):
+            self.assertEqual(process_scheduled_tweets(budget=budget), 0)
+        self.assertEqual(budget.deferred, 5)
+        self.assertEqual(DailyPostCounter.get_today_counter().post_count, 0)
+
+    def test_command_reports_deferred(self):
+        with self.assertLogs("x_scheduler", level="WARNING") as cm:
+            call_command(
+                "process_tweets", "--skip-api-test", "--no-catch-up", "--max-posts=4"
+            )
+        self.assertEqual(TweetSchedule.objects.filter(status="pending").count(), 1)
+        self.assertTrue(any("1件の予約を次回の実行に持ち越しました" in m for m in cm.output))
+
+        with self.assertRaises(CommandError):
+            call_command("process_tweets", "--deadline=0")
+
+
 # TODO: process_scheduled_tweets のテストを追加する
 # - DB操作 (TweetSchedule.objects.filter など) のモック
 # - TwitterAPIClient.post_tweet のモック
@@ -0,0 +1,82 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import TweetSchedule
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ScheduleListViewTest(TestCase):
+    """投稿スケジュール一覧ページのテストクラス"""
+
+    def setUp(self):
+        self.url = reverse("x_scheduler:schedule_list")
+        self.tweet = TweetSchedule.objects.create(
+            content="一覧テスト",
+            scheduled_time=timezone.now() + timezone.timedelta(hours=1),
+        )
+
+    def test_conditional_get_returns_304_when_unchanged(self):
+        """変更がなければ ETag / Last-Modified による条件付きGETで 304 が返ることをテスト"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("一覧テスト", response.content.decode())
+        etag = response.headers["ETag"]
+        last_modified = response.headers["Last-Modified"]
+
+        response = self.client.get(self.url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            self.url, headers={"if-modified-since": last_modified}
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_changed_rows_are_rerendered(self):
+        """行が更新されると ETag が変わり、キャッシュ済みの行も再描画されることをテスト"""
+        response = self.client.get(self.url)
+        etag = response.headers["ETag"]
+
+        self.tweet.content = "更新後の内容"
+        self.tweet.save()
+
+        response = self.client.get(self.url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertIn("更新後の内容", response.content.decode())
+        self.assertNotIn("一覧テスト", response.content.decode())
+
+    def test_deleting_a_row_changes_etag(self):
+        """行が削除されると件数が変わり ETag も変わることをテスト"""
+        TweetSchedule.objects.create(
+            content="二件目",
+            scheduled_time=timezone.now() + timezone.timedelta(hours=2),
+        )
+        etag = self.client.get(self.url).headers["ETag"]
+        self.tweet.delete()
+
+        response = self.client.get(self.url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ScheduleImportViewTest(TestCase):
+    """投稿スケジュール一括インポートページのテストクラス"""
+
+    def test_non_utf8_file_registers_nothing(self):
+        """途中の行が UTF-8 でないファイルは1件も登録しないことをテスト"""
+        scheduled = (timezone.now() + timezone.timedelta(days=1)).strftime(
+            "%Y-%m-%dT%H:%M:%S"
+        )
+        upload = SimpleUploadedFile(
+            "schedules.csv",
+            f"content,scheduled_time\n一件目,{scheduled}\n".encode("utf-8")
+            + f"二件目,{scheduled}\n".encode("cp932"),
+        )
+        response = self.client.post(
+            reverse("x_scheduler:schedule_import"),
+            {"file": upload, "format": "csv"},
+            follow=True,
+        )
+        self.assertContains(response, "ファイルは UTF-8 で保存してください。")
+        self.assertEqual(TweetSchedule.objects.count(), 0)
@@ -0,0 +1,223 @@
+import json
+import os
+import socket
+import tempfile
+import threading
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from freezegun import freeze_time
+
+from .. import utils, wakeup, worker
+from ..importers import ScheduleImporter
+from ..models import Account, TweetSchedule
+from ..utils import TwitterAPIClient
+
+
+class WorkerRunCommandTest(TestCase):
+    """常駐ワーカーでのコマンド実行のテストクラス"""
+
+    def test_process_tweets_without_pending(self):
+        response = worker.handle_request({"command": "process_tweets", "args": []})
+        self.assertTrue(response["success"])
+        self.assertIsNone(response["error"])
+        self.assertIn("duration", response)
+
+    def test_rejects_unknown_command(self):
+        response = worker.handle_request({"command": "flush", "args": []})
+        self.assertFalse(response["success"])
+        self.assertIn("flush", response["error"])
+
+    def test_invalid_arguments(self):
+        response = worker.handle_request({"command": "auto_post", "args": ["--bogus"]})
+        self.assertFalse(response["success"])
+        self.assertIn("--bogus", response["error"])
+
+        response = worker.handle_request({"command": "auto_post", "args": "--slots 3"})
+        self.assertFalse(response["success"])
+
+    def test_log_output_is_returned(self):
+        # 画像ディレクトリがない場合の警告ログが応答の output に含まれる
+        response = worker.handle_request(
+            {
+                "command": "auto_post",
+                "args": ["--image-dir", "no_such_dir", "--slots", "1"],
+            }
+        )
+        self.assertTrue(response["success"])
+        self.assertIn("画像が見つかりません", response["output"])
+        self.assertFalse(TweetSchedule.objects.exists())
+
+
+class WorkerServerTest(TestCase):
+    """Unix ドメインソケットでの要求・応答のテストクラス"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.tmpdir.name, "worker.sock")
+        self.server = worker.WorkerServer(self.socket_path)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.tmpdir.cleanup()
+
+    def _send(self, payload):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(10)
+            sock.connect(self.socket_path)
+            sock.sendall(payload)
+            with sock.makefile("rb") as response:
+                return json.loads(response.readline())
+
+    def test_ping(self):
+        response = self._send(b'{"command": "ping"}\n')
+        self.assertTrue(response["success"])
+        self.assertIn(str(os.getpid()), response["output"])
+
+    def test_invalid_json(self):
+        response = self._send(b"not json\n")
+        self.assertFalse(response["success"])
+
+    def test_second_server_is_refused(self):
+        with self.assertRaises(RuntimeError):
+            worker.WorkerServer(self.socket_path)
+        self.assertEqual(os.stat(self.socket_path).st_mode & 0o777, 0o600)
+
+    @patch.object(TwitterAPIClient, "_initialize_client_v2", return_value="client")
+    @patch.object(TwitterAPIClient, "_initialize_api_v1", return_value="api")
+    def test_clients_are_reused_while_running(self, mock_init_api, mock_init_client):
+        for _ in range(3):
+            client = TwitterAPIClient()
+            self.assertEqual(client.api_v1, "api")
+            self.assertEqual(client.client_v2, "client")
+        mock_init_api.assert_called_once()
+        mock_init_client.assert_called_once()
+
+        # ワーカー停止後は使い回さない
+        self.server.server_close()
+        self.assertFalse(os.path.exists(self.socket_path))
+        TwitterAPIClient().api_v1
+        self.assertEqual(mock_init_api.call_count, 2)
+        self.assertIsNone(utils._shared_clients)
+
+
+class WakeupTest(TestCase):
+    """予約の変更通知のテストクラス"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.tmpdir.name, "wakeup.sock")
+        override = self.settings(WAKEUP_SOCKET_PATH=self.socket_path)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_publish_without_listener(self):
+        self.assertFalse(wakeup.publish())
+
+    def test_publish_and_drain(self):
+        listener = wakeup.WakeupListener()
+        self.addCleanup(listener.close)
+        self.assertFalse(listener.drain())
+        self.assertTrue(wakeup.publish())
+        self.assertTrue(wakeup.publish())
+        self.assertTrue(listener.drain())
+        self.assertFalse(listener.drain())
+
+    @patch("x_scheduler.wakeup.publish")
+    def test_signals_notify_after_commit(self, mock_publish):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            tweet = TweetSchedule.objects.create(
+                content="通知テスト", scheduled_time=timezone.now()
+            )
+            # 確定前には通知しない
+            mock_publish.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+        mock_publish.assert_called_once()
+
+        # 投稿済みへの更新では通知しない
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            tweet.mark_posted()
+            tweet.save()
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TweetSchedule.objects.create(
+                content="削除テスト", scheduled_time=timezone.now()
+            ).delete()
+        self.assertEqual(mock_publish.call_count, 3)
+
+    @patch("x_scheduler.wakeup.publish")
+    def test_bulk_create_paths_notify(self, mock_publish):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = ScheduleImporter().run(
+                ["content,scheduled_time", "一括,2030-01-01 09:00"], "csv"
+            )
+        self.assertEqual(result["created"], 1)
+        mock_publish.assert_called_once()
+
+
+class DispatcherTest(TestCase):
+    """ディスパッチャーのテストクラス"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.socket_path = os.path.join(self.tmpdir.name, "wakeup.sock")
+        self.listener = wakeup.WakeupListener(self.socket_path)
+        self.addCleanup(self.listener.close)
+        self.dispatcher = worker.Dispatcher(self.listener)
+
+    def _pending(self, minutes):
+        return TweetSchedule.objects.create(
+            content="ディスパッチ",
+            scheduled_time=timezone.now() + timezone.timedelta(minutes=minutes),
+        )
+
+    @patch("x_scheduler.worker.run_command")
+    def test_waits_until_deadline(self, mock_run):
+        self.assertIsNone(self.dispatcher.tick())
+        self.assertIsNone(self.dispatcher.deadline)
+
+        tweet = self._pending(2)
+        # 通知がなければ予定時刻は計算し直さない
+        self.assertIsNone(self.dispatcher.tick())
+        self.assertIsNone(self.dispatcher.deadline)
+
+        wakeup.publish(self.socket_path)
+        self.assertIsNone(self.dispatcher.tick())
+        self.assertEqual(self.dispatcher.deadline, tweet.scheduled_time)
+        mock_run.assert_not_called()
+
+        mock_run.return_value = {"success": True, "error": None}
+        with freeze_time(tweet.scheduled_time):
+            self.assertEqual(self.dispatcher.tick(), mock_run.return_value)
+        mock_run.assert_called_once_with("process_tweets")
+
+    @patch("x_scheduler.worker.run_command")
+    def test_backs_off_when_rows_remain_due(self, mock_run):
+        # process_tweets を実行しても予約が残る (投稿上限など)
+        mock_run.return_value = {"success": True, "error": None}
+        self._pending(-1)
+        self.dispatcher.tick()
+        self.dispatcher.tick()
+        mock_run.assert_called_once()
+
+        with override_settings(DISPATCH_RETRY_SECONDS=0):
+            self.dispatcher._not_before = 0
+            self.dispatcher.tick()
+        self.assertEqual(mock_run.call_count, 2)
+
+    def test_inactive_account_is_ignored(self):
+        account = Account.objects.create(
+            name="brand-a", credentials_prefix="X_A", is_active=False
+        )
+        TweetSchedule.objects.filter(pk=self._pending(-1).pk).update(account=account)
+        tweet = self._pending(5)
+        self.dispatcher.replan()
+        self.assertEqual(self.dispatcher.deadline, tweet.scheduled_time)
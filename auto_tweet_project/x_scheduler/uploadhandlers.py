@@ -0,0 +1,44 @@
+"""
+アップロードファイルをメモリに載せずに受け取るためのアップロードハンドラー
+"""
+
+import logging
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+from .forms import MAX_IMAGE_SIZE
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+# フィールド名ごとのサイズ上限（バイト）。上限を超えた分は一時ファイルに書き込まない
+UPLOAD_SIZE_LIMITS = {
+    "image": MAX_IMAGE_SIZE,
+}
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    アップロードをチャンク単位で一時ファイルに書き出すハンドラー。
+    サイズ上限のあるフィールドは上限を超えた時点で書き込みをやめ、
+    ファイルに truncated フラグを付けてフォーム側で早期に拒否できるようにする。
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.size_limit = UPLOAD_SIZE_LIMITS.get(field_name)
+        self.received = 0
+        self.file.truncated = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.size_limit is not None and self.received > self.size_limit:
+            if not self.file.truncated:
+                logger.warning(
+                    f"アップロードがサイズ上限を超えたため書き込みを中止します: "
+                    f"{self.file_name} ({self.field_name}, 上限 {self.size_limit} バイト)"
+                )
+                self.file.truncated = True
+            # 残りのデータは読み捨てる (メモリにもディスクにも保持しない)
+            return None
+        self.file.write(raw_data)
@@ -1,13 +1,21 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import async_views, views
+
+# ASGI で運用する場合は非同期版のビューを使用する
+schedule_views = async_views if settings.ASYNC_VIEWS else views
 
 app_name = "x_scheduler"
 
 urlpatterns = [
-    path("", views.schedule_list, name="schedule_list"),
-    path("create/", views.schedule_create, name="schedule_create"),
-    path("edit/<uuid:pk>/", views.schedule_edit, name="schedule_edit"),
-    path("delete/<uuid:pk>/", views.schedule_delete, name="schedule_delete"),
+    path("", schedule_views.schedule_list, name="schedule_list"),
+    path("events/", schedule_views.schedule_events, name="schedule_events"),
+    path("create/", schedule_views.schedule_create, name="schedule_create"),
+    path("edit/<uuid:pk>/", schedule_views.schedule_edit, name="schedule_edit"),
+    path("delete/<uuid:pk>/", schedule_views.schedule_delete, name="schedule_delete"),
+    path("import/", views.schedule_import, name="schedule_import"),
+    path("metrics/", views.metrics_view, name="metrics"),
+    path("slo/", views.dispatch_slo_view, name="dispatch_slo"),
     path("x_auth/callback/", views.x_auth_callback, name="x_auth_callback"),
 ]
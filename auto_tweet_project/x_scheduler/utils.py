@@ -1,35 +1,116 @@
-import tweepy
 import logging
+import time
+from functools import reduce
+from operator import or_
+
 from django.conf import settings
+from django.db.models import Q
 from django.utils import timezone
 
+from . import attempts, health
+from .metrics import record_rate_limit, registry
+from .wakeup import notify_schedule_changed
+
 # import tempfile # 不要になったので削除
 
 # ロガーの設定
 logger = logging.getLogger(__name__)
 
 
+# クライアント未生成を表す値 (生成に失敗した場合の None と区別する)
+_NOT_INITIALIZED = object()
+
+# 常駐ワーカーで tweepy のクライアント (HTTP セッション) を使い回すためのキャッシュ。
+# キーは (アカウントの ID (既定のアカウントは None), クライアントの種類)
+# (None の場合は使い回さず、TwitterAPIClient ごとに生成する)
+_shared_clients = None
+
+
+def enable_client_reuse():
+    """以後の TwitterAPIClient で、生成済みの tweepy クライアントをプロセス内で使い回す"""
+    global _shared_clients
+    if _shared_clients is None:
+        _shared_clients = {}
+
+
+def disable_client_reuse():
+    """tweepy クライアントの使い回しをやめ、キャッシュを破棄する"""
+    global _shared_clients
+    _shared_clients = None
+
+
 # --- TwitterAPIClient Class ---
 class TwitterAPIClient:
     """
     Tweepy API v1.1 と v2 のクライアントを管理し、
     関連する操作 (テスト接続、ツイート投稿) を提供するクラス。
+    account (Account) を指定した場合はそのアカウントの認証情報を使い、
+    省略した場合は settings の X_API_KEY などを使う (既定のアカウント)。
     """
 
-    def __init__(self):
-        self.api_v1 = self._initialize_api_v1()
-        self.client_v2 = self._initialize_client_v2()
+    def __init__(self, account=None):
+        self.account = account
+        # クライアントは最初に使われた時点で生成する (tweepy の import も含めて遅延させる)
+        self._api_v1 = _NOT_INITIALIZED
+        self._client_v2 = _NOT_INITIALIZED
+
+    @property
+    def api_v1(self):
+        """API v1.1 クライアント (初期化に失敗した場合は None)"""
+        if self._api_v1 is _NOT_INITIALIZED:
+            self._api_v1 = self._get_or_initialize("api_v1", self._initialize_api_v1)
+        return self._api_v1
+
+    @property
+    def client_v2(self):
+        """API v2 クライアント (初期化に失敗した場合は None)"""
+        if self._client_v2 is _NOT_INITIALIZED:
+            self._client_v2 = self._get_or_initialize(
+                "client_v2", self._initialize_client_v2
+            )
+        return self._client_v2
+
+    def _get_or_initialize(self, kind, initialize):
+        """使い回しが有効ならキャッシュ済みのクライアントを返し、なければ生成する"""
+        if _shared_clients is None:
+            return initialize()
+        key = (self.account.pk if self.account else None, kind)
+        client = _shared_clients.get(key)
+        if client is None:
+            client = initialize()
+            # 生成に失敗した場合はキャッシュせず、次回に再試行する
+            if client is not None:
+                _shared_clients[key] = client
+        return client
+
+    def _credentials(self):
+        """使用する認証情報 (api_key, api_secret, access_token, access_token_secret)"""
+        if self.account is not None:
+            return self.account.credentials()
+        return {
+            "api_key": settings.X_API_KEY,
+            "api_secret": settings.X_API_SECRET,
+            "access_token": settings.X_ACCESS_TOKEN,
+            "access_token_secret": settings.X_ACCESS_TOKEN_SECRET,
+        }
 
     def _initialize_api_v1(self):
         """API v1.1 クライアントを初期化"""
         try:
+            import tweepy
+
+            credentials = self._credentials()
             auth = tweepy.OAuth1UserHandler(
-                settings.X_API_KEY,
-                settings.X_API_SECRET,
-                settings.X_ACCESS_TOKEN,
-                settings.X_ACCESS_TOKEN_SECRET,
+                credentials["api_key"],
+                credentials["api_secret"],
+                credentials["access_token"],
+                credentials["access_token_secret"],
             )
             api = tweepy.API(auth)
+            # レスポンスごとにレート制限の残り回数を記録する
+            api.session.hooks["response"].extend(
+                [record_rate_limit, attempts.record_response]
+            )
             logger.debug("Tweepy API v1.1 client initialized successfully.")
             return api
         except Exception as e:
@@ -39,11 +120,17 @@ class TwitterAPIClient:
     def _initialize_client_v2(self):
         """API v2 クライアントを初期化"""
         try:
+            import tweepy
+
+            credentials = self._credentials()
             client = tweepy.Client(
-                consumer_key=settings.X_API_KEY,
-                consumer_secret=settings.X_API_SECRET,
-                access_token=settings.X_ACCESS_TOKEN,
-                access_token_secret=settings.X_ACCESS_TOKEN_SECRET,
+                consumer_key=credentials["api_key"],
+                consumer_secret=credentials["api_secret"],
+                access_token=credentials["access_token"],
+                access_token_secret=credentials["access_token_secret"],
+            )
+            client.session.hooks["response"].extend(
+                [record_rate_limit, attempts.record_response]
             )
             logger.debug("Tweepy API v2 client initialized successfully.")
             return client
@@ -53,6 +140,8 @@ class TwitterAPIClient:
 
     def test_connection(self):
         """API v1.1 と v2 の接続をテストする"""
+        import tweepy
+
         logger.info("Testing API connection...")
         if not self.api_v1 or not self.client_v2:
             error_msg = "API client(s) not initialized."
@@ -66,9 +155,11 @@ class TwitterAPIClient:
             self.client_v2.get_me()
 
             logger.info(
-                f"API connection test successful: User @{user.screen_name}, ID: {user.id}"
+                "API connection test successful: User @%s, ID: %s",
+                user.screen_name,
+                user.id,
             )
-            return {"success": True, "error": ""}
+            return {"success": True, "error": "", "user_id": str(user.id)}
 
         except tweepy.TweepyException as e:
             error_message = f"API connection test error (Tweepy): {str(e)}"
@@ -79,8 +170,28 @@ class TwitterAPIClient:
             logger.error(error_message)
             return {"success": False, "error": error_message}
 
-    def post_tweet(self, content, filename=None, file=None):
-        """指定された内容と画像でツイートを投稿する"""
+    def upload_media(self, filename, file=None):
+        """画像をアップロードし、media オブジェクトを返す (v1.1 API を使用)"""
+        import tweepy
+
+        if not self.api_v1:
+            raise tweepy.TweepyException("API v1.1 client not initialized.")
+        logger.info("Uploading media: %s", filename)
+        attempts.add_bytes_uploaded(attempts.file_size(filename, file))
+        with registry.timer("x_scheduler_media_upload_seconds"), attempts.phase(
+            "media_upload"
+        ):
+            media = self.api_v1.media_upload(filename=filename, file=file)
+        logger.info("Media uploaded successfully. Media ID: %s", media.media_id)
+        return media
+
+    def post_tweet(self, text, filename=None, file=None, media_ids=None):
+        """
+        指定された内容と画像でツイートを投稿する。
+        アップロード済みの画像がある場合は media_ids で指定する。
+        """
+        import tweepy
+
         if not self.client_v2:
             logger.error("Tweet posting failed: API v2 client not initialized.")
             return {
@@ -90,36 +201,42 @@ class TwitterAPIClient:
             }
 
         try:
-            media_id = None
-            if filename:
+            media_ids = list(media_ids or [])
+            if filename and not media_ids:
                 # 画像アップロードには v1.1 API が必要
                 if not self.api_v1:
                     logger.error(
-                        "Tweet posting failed: API v1.1 client not initialized for media upload."
+                        "Tweet posting failed: "
+                        "API v1.1 client not initialized for media upload."
                     )
                     return {
                         "success": False,
                         "error": "API v1.1 client not initialized.",
                         "is_rate_limit": False,
                     }
-                logger.info(f"Uploading media: {filename}")
                 # filename と file オブジェクトを渡す
-                media = self.api_v1.media_upload(filename=filename, file=file)
-                media_id = media.media_id
-                logger.info(f"Media uploaded successfully. Media ID: {media_id}")
+                media = self.upload_media(filename=filename, file=file)
+                media_ids.append(media.media_id)
 
-            if media_id:
+            if media_ids:
                 # Post tweet with media (v2)
-                response = self.client_v2.create_tweet(
-                    text=content, media_ids=[media_id]
-                )
-                logger.info(f"Tweet with media posted successfully: {response.data}")
+                with registry.timer("x_scheduler_create_tweet_seconds"), attempts.phase(
+                    "create_tweet"
+                ):
+                    response = self.client_v2.create_tweet(
+                        text=text, media_ids=media_ids
+                    )
+                logger.info("Tweet with media posted successfully: %s", response.data)
             else:
                 # Post text-only tweet (v2)
-                response = self.client_v2.create_tweet(text=content)
-                logger.info(f"Text-only tweet posted successfully: {response.data}")
+                with registry.timer("x_scheduler_create_tweet_seconds"), attempts.phase(
+                    "create_tweet"
+                ):
+                    response = self.client_v2.create_tweet(text=text)
+                logger.info("Text-only tweet posted successfully: %s", response.data)
 
-            return {"success": True, "error": ""}
+            # 投稿したツイートの ID (collect_metrics で公開指標を取得するために保存する)
+            return {"success": True, "error": "", "tweet_id": str(response.data["id"])}
 
         except tweepy.TweepyException as e:
             error_message = f"Tweet posting error (Tweepy): {str(e)}"
@@ -146,44 +263,140 @@ class TwitterAPIClient:
 # (get_tweepy_api, get_tweepy_client, test_api_connection, post_tweet は削除)
 
 
-def process_scheduled_tweets():
-    """待機中の予定時刻を過ぎたツイートを処理する"""
-    from .models import TweetSchedule  # 循環インポート回避
-
-    # APIクライアントをインスタンス化
-    api_client = TwitterAPIClient()
-    # クライアント初期化失敗時は処理を中断
-    if not api_client.api_v1 or not api_client.client_v2:
-        logger.error(
-            "Failed to process scheduled tweets: API client initialization failed."
-        )
-        return 0  # エラー時は処理せず終了 (処理件数0を返す)
+def defer_over_quota(tweets, account=None):
+    """本日の投稿枠がない予約を翌日の同じ時刻に延期する (1回の UPDATE)"""
+    from .models import TweetSchedule, daily_limit_for  # 循環インポート回避
 
+    if not tweets:
+        return 0
     now = timezone.now()
-    logger.info(f"Tweet processing started: Current time {now}")
-
-    pending_tweets = TweetSchedule.objects.filter(
-        status="pending", scheduled_time__lte=now
+    reason = (
+        f"本日の投稿上限（{daily_limit_for(account)}）に達したため翌日に延期しました"
+    )
+    for tweet in tweets:
+        tweet.defer_to_next_day(reason)
+        tweet.updated_at = now
+    TweetSchedule.objects.bulk_update(
+        tweets,
+        ["scheduled_time", "original_scheduled_time", "error_message", "updated_at"],
     )
-    logger.info(f"Number of tweets to process: {pending_tweets.count()}")
+    # bulk_update はシグナルを送らないため、ディスパッチャーへ明示的に通知する
+    notify_schedule_changed()
+    logger.warning(
+        "Daily post limit reached for %s: deferred %d tweet(s) to the next day",
+        account_label(account),
+        len(tweets),
+    )
+    return len(tweets)
+
+
+def account_label(account):
+    """ログ用のアカウント名 (既定のアカウントは default)"""
+    return account.name if account is not None else "default"
+
+
+class RunBudget:
+    """
+    1回の実行で投稿を試みる件数 (max_posts) と所要時間 (deadline_seconds) の上限。
+    所要時間は生成時点から数えるため、コマンドの開始時に生成する。
+    """
+
+    def __init__(self, max_posts=None, deadline_seconds=None):
+        self.max_posts = max_posts
+        self.deadline_seconds = deadline_seconds
+        self.started = time.monotonic()
+        self.claimed = 0
+        self.deferred = 0
+
+    def exhausted(self):
+        """上限に達していれば理由を、達していなければ None を返す"""
+        if self.max_posts is not None and self.claimed >= self.max_posts:
+            return f"max posts ({self.max_posts})"
+        if (
+            self.deadline_seconds is not None
+            and time.monotonic() - self.started >= self.deadline_seconds
+        ):
+            return f"deadline ({self.deadline_seconds:g}s)"
+        return None
+
+
+def _open_lanes(pending_tweets, probe=None):
+    """
+    予約をアカウントごとの列に分け、投稿できるアカウントの API クライアントを用意する。
+    本日の投稿枠がないアカウントの予約は延期し、クライアントを生成できないアカウントや
+    接続確認 (probe) に失敗したアカウントの予約は pending のまま残す。
+    戻り値: ({アカウント ID: [予約, ...]}, {アカウント ID: クライアント})
+    """
+    from .models import DailyPostCounter  # 循環インポート回避
 
-    processed_count = 0
+    lanes = {}
+    # 予定時刻の昇順に並んでいるため、最も古い予約のあるアカウントから順に並ぶ
     for tweet in pending_tweets:
-        logger.info(
-            f"Processing tweet: ID={tweet.id}, Content={tweet.content[:20]}..., Scheduled={tweet.scheduled_time}"
-        )
+        lanes.setdefault(tweet.account_id, []).append(tweet)
+
+    clients = {}
+    for account_id, tweets in list(lanes.items()):
+        account = tweets[0].account
+        # 投稿枠が残っていなければ、API クライアントを生成せずに延期だけを行う
+        if DailyPostCounter.get_today_counter(account).is_limit_reached:
+            defer_over_quota(tweets, account)
+            del lanes[account_id]
+            continue
+        # API クライアントはアカウントごとに生成する (常駐ワーカーではプロセス内で使い回される)
+        api_client = TwitterAPIClient(account)
+        if not api_client.api_v1 or not api_client.client_v2:
+            logger.error(
+                "Failed to process scheduled tweets for %s: "
+                "API client initialization failed.",
+                account_label(account),
+            )
+            del lanes[account_id]
+            continue
+        # 接続確認は予約のあるアカウントだけに行う
+        if probe is not None and not probe(api_client):
+            logger.error(
+                "Skipped scheduled tweets for %s: API connection test failed.",
+                account_label(account),
+            )
+            del lanes[account_id]
+            continue
+        clients[account_id] = api_client
+    return lanes, clients
+
+
+def _post_scheduled_tweet(tweet, api_client, quota_date):
+    """
+    予約を1件投稿して結果を保存する。失敗した場合は予約した投稿枠を返却する。
+    戻り値: 失敗した場合のエラーメッセージ (成功した場合は None)
+    """
+    from .models import DailyPostCounter  # 循環インポート回避
 
-        image_file_object = None
-        image_path_for_logging = None
+    logger.info(
+        "Processing tweet: ID=%s, Account=%s, Content=%.20s..., Scheduled=%s",
+        tweet.id,
+        account_label(tweet.account),
+        tweet.content,
+        tweet.scheduled_time,
+    )
 
+    image_file_object = None
+    image_path_for_logging = None
+    registry.observe(
+        "x_scheduler_dispatch_lag_seconds",
+        max(0.0, (timezone.now() - tweet.scheduled_time).total_seconds()),
+    )
+
+    # 1件ごとの投稿試行をフェーズ別に計測し、PostingAttempt に記録する
+    with attempts.start("process_tweets", tweet) as attempt:
         try:
             filename = None  # post_tweet に渡すファイル名
             if tweet.image:
                 # 画像ファイルオブジェクトを開く
                 logger.info(
-                    f"Opening image file: {tweet.image.name} ({tweet.image.path})"
+                    "Opening image file: %s (%s)", tweet.image.name, tweet.image.path
                 )
-                image_file_object = tweet.image.open("rb")
+                with attempts.phase("open_image"):
+                    image_file_object = tweet.image.open("rb")
                 image_path_for_logging = tweet.image.name
                 filename = tweet.image.name  # 元のファイル名を filename として渡す
 
@@ -195,40 +408,162 @@ def process_scheduled_tweets():
             )
 
             if post_result["success"]:
-                tweet.status = "posted"
-                tweet.error_message = ""  # 成功時はエラーメッセージをクリア
-                tweet.save()
-                logger.info(f"Scheduled tweet posted successfully. ID: {tweet.id}")
-                processed_count += 1
-            else:
-                tweet.status = "failed"
-                tweet.error_message = post_result["error"]
+                # 投稿日時と予定時刻からの遅延も記録する (エラーメッセージはクリア)
+                tweet.mark_posted()
+                tweet.tweet_id = post_result.get("tweet_id")
+                with attempts.phase("db_save"):
+                    tweet.save()
+                attempt.success = True
+                logger.info("Scheduled tweet posted successfully. ID: %s", tweet.id)
+                return None
+
+            # 投稿されなかったため予約した投稿枠を返却する
+            DailyPostCounter.release(quota_date, account=tweet.account)
+            tweet.status = "failed"
+            tweet.error_message = post_result["error"]
+            with attempts.phase("db_save"):
                 tweet.save()
-                logger.error(
-                    f"Failed to post scheduled tweet. ID: {tweet.id}, Error: {post_result['error']}"
-                )
-                # レートリミットの場合はループを中断することも検討できるが、
-                # ここでは個々のツイートの失敗として記録し、処理を続ける
+            attempt.error_message = post_result["error"]
+            logger.error(
+                "Failed to post scheduled tweet. ID: %s, Error: %s",
+                tweet.id,
+                post_result["error"],
+            )
+            # レートリミットの場合はループを中断することも検討できるが、
+            # ここでは個々のツイートの失敗として記録し、処理を続ける
+            return post_result["error"]
 
         except Exception as e:
             # 個々のツイート処理中の予期せぬエラー
             logger.error(
-                f"Error during tweet processing loop for tweet ID {tweet.id}: {str(e)}",
+                "Error during tweet processing loop for tweet ID %s: %s",
+                tweet.id,
+                e,
                 exc_info=True,
             )
+            if tweet.status != "posted":
+                DailyPostCounter.release(quota_date, account=tweet.account)
             tweet.status = "failed"
             tweet.error_message = f"Unexpected error: {str(e)}"
             tweet.save()
+            attempt.error_message = tweet.error_message
+            return tweet.error_message
         finally:
             # ファイルオブジェクトを確実に閉じる
             if image_file_object:
                 try:
                     image_file_object.close()
-                    logger.info(f"Closed image file object: {image_path_for_logging}")
+                    logger.info("Closed image file object: %s", image_path_for_logging)
                 except Exception as e_close:
                     logger.error(
-                        f"Error closing image file object for tweet ID {tweet.id}: {str(e_close)}"
+                        "Error closing image file object for tweet ID %s: %s",
+                        tweet.id,
+                        e_close,
                     )
 
-    logger.info(f"Finished processing tweets. Processed count: {processed_count}")
+
+def process_scheduled_tweets(budget=None, accounts=None, probe=None):
+    """
+    待機中の予定時刻を過ぎたツイートを処理する。
+    予約はアカウントごとの列に分け、各アカウントから1件ずつ順番に (ラウンドロビンで) 投稿する。
+    予約の多いアカウントがあっても他のアカウントの投稿が後回しにならず、
+    budget の上限で打ち切った場合も各アカウントが同じ件数ずつ進む。
+    1件ごとに投稿の直前でそのアカウントの本日の投稿枠を予約し (DailyPostCounter.reserve)、
+    枠がなくなったアカウントは残りの予約を翌日に延期して列から外す。
+    budget (RunBudget) を指定した場合は、上限に達した時点で以降の予約に手を付けずに終了する
+    (予約は pending のまま次回の実行で処理される。持ち越した件数は budget.deferred に残る)。
+    accounts を指定した場合は、そのアカウント (None は既定のアカウント) の予約だけを処理する。
+    probe (API クライアントを受け取り、投稿してよければ True を返す関数) を指定した場合は、
+    投稿の前に予約のあるアカウントごとに1回呼び出し、False のアカウントの予約は pending のまま残す。
+    """
+    from .models import DailyPostCounter, TweetSchedule  # 循環インポート回避
+
+    now = timezone.now()
+    logger.info("Tweet processing started: Current time %s", now)
+
+    due = TweetSchedule.objects.filter(status="pending", scheduled_time__lte=now)
+    if accounts is None:
+        # 無効なアカウントの予約は投稿しない
+        due = due.filter(Q(account__isnull=True) | Q(account__is_active=True))
+    else:
+        due = due.filter(
+            reduce(or_, (Q(account=account) for account in accounts), Q(pk__in=[]))
+        )
+    # 件数の確認と処理で2回クエリを発行しないよう、先に評価しておく。
+    # 投稿枠が足りない場合に予定時刻の古いものから投稿されるよう、昇順で処理する
+    pending_tweets = list(due.select_related("account").order_by("scheduled_time"))
+    logger.info("Number of tweets to process: %d", len(pending_tweets))
+    # 処理対象がなければ API クライアントを生成しない (tweepy の import も行わない)
+    if not pending_tweets:
+        return 0
+
+    lanes, clients = _open_lanes(pending_tweets, probe=probe)
+    positions = dict.fromkeys(lanes, 0)
+    # アカウントごとの投稿件数と最後のエラー (接続確認の記録に使う)
+    posted = dict.fromkeys(lanes, 0)
+    last_errors = {}
+    account_by_id = {key: tweets[0].account for key, tweets in lanes.items()}
+
+    while lanes:
+        for account_id in list(lanes):
+            tweets = lanes[account_id]
+            index = positions[account_id]
+            # 実行の上限に達したら、以降の予約は次回の実行に持ち越す
+            reason = budget.exhausted() if budget else None
+            if reason:
+                budget.deferred = sum(
+                    len(lane) - positions[key] for key, lane in lanes.items()
+                )
+                logger.warning(
+                    "Run budget exhausted (%s): "
+                    "left %d tweet(s) pending for the next run",
+                    reason,
+                    budget.deferred,
+                )
+                lanes.clear()
+                break
+
+            # 投稿の前に投稿枠を予約する (上限に達したらこのアカウントの以降の予約は投稿しない)
+            account = account_by_id[account_id]
+            quota_date = DailyPostCounter.reserve(account=account)
+            if quota_date is None:
+                defer_over_quota(tweets[index:], account)
+                del lanes[account_id]
+                continue
+
+            positions[account_id] = index + 1
+            if positions[account_id] >= len(tweets):
+                del lanes[account_id]
+            # 他のプロセス (auto_post --post-now や別の process_tweets) と二重に投稿しないよう、
+            # 投稿中にできた予約だけを投稿する
+            if not tweets[index].claim():
+                DailyPostCounter.release(quota_date, account=account)
+                logger.info(
+                    "Tweet already taken by another process: %s", tweets[index].id
+                )
+                continue
+            # 実行の上限は、投稿枠を予約できた (実際に投稿する) 予約だけで数える
+            if budget:
+                budget.claimed += 1
+            error = _post_scheduled_tweet(
+                tweets[index], clients[account_id], quota_date
+            )
+            if error is None:
+                posted[account_id] += 1
+            else:
+                last_errors[account_id] = error
+
+    # 投稿の成功を接続確認の代わりに記録し、すべて失敗した場合は次回の実行で接続確認を行わせる
+    for account_id, count in posted.items():
+        account = account_by_id[account_id]
+        if count:
+            health.record_success(source="post", account=account)
+        elif account_id in last_errors:
+            health.record_failure(
+                last_errors[account_id], source="post", account=account
+            )
+    if budget:
+        registry.set_gauge("x_scheduler_budget_deferred_tweets", budget.deferred)
+    processed_count = sum(posted.values())
+    logger.info("Finished processing tweets. Processed count: %d", processed_count)
     return processed_count
@@ -1,25 +1,79 @@
+import codecs
 import os
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.urls import reverse
-from django.http import HttpResponse, HttpResponseRedirect
+from django.db.models import Count, Max
+from django.http import (
+    HttpResponse,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.utils import timezone
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
 import logging
-import tweepy
 
 from .models import TweetSchedule  # 相対インポートに変更
 
 # from .models import TweetSchedule, SystemSetting # 現在未使用
-from .forms import TweetScheduleForm
+from . import events, metrics, slo
+from .analytics import PostingTimeRecommender
+from .forms import ScheduleImportForm, TweetScheduleForm
+from .importers import ScheduleImporter, is_utf8
+from .slots import SlotAllocator
 # from .utils import get_tweepy_api, get_tweepy_client, post_tweet # 未使用のため削除
 
 # ロガーの設定
 logger = logging.getLogger(__name__)
 
 
+# 一覧ページの版情報 (最終更新日時と件数) を1クエリで取得するための集計式
+SCHEDULE_LIST_VERSION = {"last_modified": Max("updated_at"), "count": Count("id")}
+
+
+def schedule_list_etag_from_version(version):
+    """一覧ページの版情報から ETag を生成する"""
+    last_modified = version["last_modified"]
+    stamp = last_modified.timestamp() if last_modified else 0
+    return quote_etag(f"{version['count']}-{stamp}")
+
+
+def _schedule_list_version(request):
+    """
+    一覧ページの版情報を返す。未表示のメッセージがある場合は
+    条件付きGETを行わないよう None を返す (304 でメッセージが消えないように)。
+    ETag と Last-Modified の両方から呼ばれるため、結果はリクエストに保持する。
+    """
+    if not hasattr(request, "_schedule_list_version"):
+        if len(messages.get_messages(request)):
+            request._schedule_list_version = None
+        else:
+            request._schedule_list_version = TweetSchedule.objects.aggregate(
+                **SCHEDULE_LIST_VERSION
+            )
+    return request._schedule_list_version
+
+
+def _schedule_list_etag(request):
+    version = _schedule_list_version(request)
+    return schedule_list_etag_from_version(version) if version else None
+
+
+def _schedule_list_last_modified(request):
+    version = _schedule_list_version(request)
+    return version["last_modified"] if version else None
+
+
+@condition(
+    etag_func=_schedule_list_etag, last_modified_func=_schedule_list_last_modified
+)
 def schedule_list(request):
-    """投稿スケジュール一覧ページ"""
+    """投稿スケジュール一覧ページ (変更がなければ 304 を返す)"""
     schedules = TweetSchedule.objects.all()
     return render(
         request,
@@ -30,6 +84,17 @@ def schedule_list(request):
     )
 
 
+def schedule_events(request):
+    """投稿キューの変更を Server-Sent Events で配信する (WSGI 用)"""
+    response = StreamingHttpResponse(
+        events.iter_events(request.headers.get("Last-Event-ID")),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # リバースプロキシでのバッファリングを無効化
+    return response
+
+
 def schedule_create(request):
     """投稿スケジュール作成ページ"""
     if request.method == "POST":
@@ -69,8 +134,16 @@ def schedule_create(request):
             return redirect("x_scheduler:schedule_list")
         else:
             logger.debug(f"フォームエラー: {form.errors}")
+        recommended_times = recommended_posting_times(form.cleaned_data.get("account"))
     else:
+        # エンゲージメントの履歴があれば、今後24時間で反応の良い時刻を初期値にする
+        # (?account= で選んだアカウントの履歴を使う)
         form = TweetScheduleForm()
+        account = selected_account(form, request.GET.get("account"))
+        recommended_times = recommended_posting_times(account)
+        form.initial["account"] = account
+        if recommended_times:
+            form.initial["scheduled_time"] = timezone.localtime(recommended_times[0])
 
     return render(
         request,
@@ -78,10 +151,26 @@ def schedule_create(request):
         {
             "form": form,
             "title": "新規投稿スケジュール作成",
+            "recommended_times": recommended_times,
         },
     )
 
 
+def selected_account(form, value):
+    """アカウントの選択欄の値から有効なアカウントを返す (未選択・不正な値は既定のアカウント = None)"""
+    try:
+        return form.fields["account"].clean(value)
+    except ValidationError:
+        return None
+
+
+def recommended_posting_times(account=None):
+    """アカウントの、投稿枠の残っている今後24時間のおすすめの投稿時刻 (最大3件)"""
+    return PostingTimeRecommender(account=account).upcoming(
+        timezone.now(), hours=24, count=3, allocator=SlotAllocator(account=account)
+    )
+
+
 def schedule_edit(request, pk):
     """投稿スケジュール編集ページ"""
     tweet = get_object_or_404(TweetSchedule, pk=pk)
@@ -156,6 +245,54 @@ def schedule_delete(request, pk):
     )
 
 
+def schedule_import(request):
+    """投稿スケジュール一括インポートページ"""
+    result = None
+    if request.method == "POST":
+        form = ScheduleImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data["file"]
+            importer = ScheduleImporter(
+                dry_run=form.cleaned_data["dry_run"],
+                overflow="spill" if form.cleaned_data["spill_over"] else "reject",
+            )
+            # 途中の行で読めずに一部だけ登録されないよう、先にファイル全体の文字コードを確認する
+            utf8 = is_utf8(upload.chunks())
+            upload.seek(0)
+            if not utf8:
+                messages.error(request, "ファイルは UTF-8 で保存してください。")
+            else:
+                # アップロードファイルを1行ずつデコードしながら読み込む
+                lines = codecs.iterdecode(upload, "utf-8-sig")
+                result = importer.run(lines, form.cleaned_data["format"])
+                if result["errors"]:
+                    messages.warning(
+                        request,
+                        f"{len(result['errors'])}件のエラーがありました。内容を確認してください。",
+                    )
+                elif form.cleaned_data["dry_run"]:
+                    messages.success(
+                        request, f"{result['created']}件すべての検証に成功しました。"
+                    )
+                else:
+                    messages.success(
+                        request,
+                        f"{result['created']}件の投稿スケジュールを登録しました。",
+                    )
+                    return redirect("x_scheduler:schedule_list")
+    else:
+        form = ScheduleImportForm()
+
+    return render(
+        request,
+        "x_scheduler/schedule_import.html",
+        {
+            "form": form,
+            "result": result,
+        },
+    )
+
+
 def x_auth_callback(request):
     """X API OAuth認証コールバック"""
     oauth_verifier = request.GET.get("oauth_verifier")
@@ -166,6 +303,9 @@ def x_auth_callback(request):
         return redirect("x_scheduler:schedule_list")
 
     try:
+        # tweepy は Web プロセスの起動時ではなく認証時に import する
+        import tweepy
+
         # この部分は通常はセッションから取得した認証情報を使用します
         # ローカルでの使用なので簡易的に実装しています
         auth = tweepy.OAuth1UserHandler(settings.X_API_KEY, settings.X_API_SECRET)
@@ -181,3 +321,29 @@ def x_auth_callback(request):
         messages.error(request, f"認証エラー: {str(e)}")
 
     return redirect("x_scheduler:schedule_list")
+
+
+def metrics_view(request):
+    """Prometheus 形式のメトリクスを返す"""
+    return HttpResponse(
+        metrics.render_metrics(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+def dispatch_slo_view(request):
+    """投稿遅延の SLO 集計を JSON で返す (?by=day|hour&days=N)"""
+    by = request.GET.get("by", "day")
+    if by not in ("day", "hour"):
+        return JsonResponse(
+            {"error": "by には day または hour を指定してください。"}, status=400
+        )
+    try:
+        days = int(request.GET.get("days", "7"))
+    except ValueError:
+        days = 0
+    if not 1 <= days <= 90:
+        return JsonResponse(
+            {"error": "days には1〜90の値を指定してください。"}, status=400
+        )
+    return JsonResponse(slo.dispatch_lag_report(days=days, by=by))
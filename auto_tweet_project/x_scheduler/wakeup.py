@@ -0,0 +1,81 @@
+"""
+予約の変更通知
+
+予約 (TweetSchedule) が作成・変更・削除されると、トランザクションの確定後に
+Unix ドメインのデータグラムソケット (settings.WAKEUP_SOCKET_PATH) へ1バイトを送る。
+run_worker --dispatch で常駐しているディスパッチャーは通知を受けると次の予定時刻を
+計算し直すため、近い時刻に作成された予約もポーリング間隔を待たずに投稿される。
+
+個別の save() / delete() は signals.py から通知される。シグナルを送らない一括操作
+(bulk_create / QuerySet.update) を行う箇所は notify_schedule_changed() を明示的に呼ぶ。
+送信先で誰も待ち受けていなければ通知は捨てられる。
+"""
+
+import logging
+import os
+import socket
+
+from django.conf import settings
+from django.db import transaction
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+WAKEUP_MESSAGE = b"1"
+
+
+def publish(socket_path=None):
+    """ディスパッチャーに通知を送る (待ち受けていなければ何もしない)。送信できたかを返す"""
+    socket_path = socket_path or settings.WAKEUP_SOCKET_PATH
+    if not os.path.exists(socket_path):
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            sock.sendto(WAKEUP_MESSAGE, socket_path)
+        return True
+    except OSError as e:
+        # ディスパッチャーの停止直後 (ECONNREFUSED) や受信キューが満杯 (EAGAIN) の場合。
+        # 満杯ならすでに未読の通知があるため、捨てても再計算は行われる
+        logger.debug(f"予約の変更通知を送信できませんでした: {e}")
+        return False
+
+
+def notify_schedule_changed(using=None):
+    """現在のトランザクションの確定後にディスパッチャーへ通知する"""
+    transaction.on_commit(publish, using=using)
+
+
+class WakeupListener:
+    """ディスパッチャー側で通知を受け取るソケット"""
+
+    def __init__(self, socket_path=None):
+        self.socket_path = str(socket_path or settings.WAKEUP_SOCKET_PATH)
+        # 前回のディスパッチャーが残したソケットファイルは削除する
+        # (二重起動は run_worker のストリームソケット側で検出される)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        self.socket.setblocking(False)
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def drain(self):
+        """未読の通知をすべて読み捨て、通知があったかを返す"""
+        received = False
+        while True:
+            try:
+                self.socket.recv(64)
+            except BlockingIOError:
+                return received
+            received = True
+
+    def close(self):
+        self.socket.close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,247 @@
+"""
+常駐ワーカー
+
+cron / launchd から起動されるたびに Django の初期化を行う代わりに、run_worker コマンドで
+常駐したプロセスが Unix ドメインソケットで実行要求を待ち受ける。
+クライアント (scripts/worker_client.py やシェルスクリプト) は1行の JSON で要求を送り、
+コマンドの終了を待って1行の JSON で結果を受け取る。
+
+    要求: {"command": "process_tweets", "args": ["--skip-api-test"]}
+    応答: {"success": true, "error": null, "output": "...", "duration": 0.12}
+
+要求は受け付けた順に1件ずつ実行し、DB 接続と tweepy のクライアント (HTTP セッション) は
+要求をまたいで使い回す。
+
+run_worker --dispatch の場合は Dispatcher も動かし、待機中の予約の最も早い予定時刻に
+process_tweets を実行する。予定時刻は予約の変更通知 (wakeup.py) を受けた時点で計算し直す。
+"""
+
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import time
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from . import utils
+from .recurrence import materialize
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+# ワーカー経由で実行できるコマンド
+ALLOWED_COMMANDS = ("process_tweets", "auto_post")
+# 1件の要求の最大サイズ（バイト）
+MAX_REQUEST_SIZE = 64 * 1024
+
+
+def _ensure_usable_connections():
+    """前回の要求で壊れた DB 接続だけを閉じる (正常な接続は次の要求でも使う)"""
+    for connection in connections.all(initialized_only=True):
+        if connection.connection is not None and (
+            connection.errors_occurred or not connection.is_usable()
+        ):
+            connection.close()
+
+
+def run_command(command, args=()):
+    """
+    管理コマンドをワーカーのプロセス内で実行し、結果を返す。
+    コマンドの標準出力・標準エラーと、実行中の x_scheduler のログを output にまとめる。
+    """
+    if command not in ALLOWED_COMMANDS:
+        return {"success": False, "error": f"実行できないコマンドです: {command}"}
+    if not all(isinstance(arg, str) for arg in args):
+        return {"success": False, "error": "args は文字列のリストで指定してください"}
+
+    output = io.StringIO()
+    log_handler = logging.StreamHandler(output)
+    log_handler.setFormatter(
+        logging.Formatter("{levelname} {module} {message}", style="{")
+    )
+    app_logger = logging.getLogger("x_scheduler")
+    app_logger.addHandler(log_handler)
+
+    _ensure_usable_connections()
+    start = time.monotonic()
+    success, error = True, None
+    try:
+        call_command(command, *args, stdout=output, stderr=output)
+    except CommandError as e:
+        # 引数の誤りなどはトレースバックを出さずに返す
+        success, error = False, str(e)
+    except SystemExit as e:
+        # コマンドが sys.exit() で終了しようとした場合もワーカーは止めない
+        success, error = False, f"コマンドが終了コード {e.code} で終了しました"
+    except Exception as e:
+        logger.exception(f"ワーカーでのコマンド実行中にエラー: {command}")
+        success, error = False, str(e)
+    finally:
+        app_logger.removeHandler(log_handler)
+
+    return {
+        "success": success,
+        "error": error,
+        "output": output.getvalue(),
+        "duration": round(time.monotonic() - start, 3),
+    }
+
+
+def handle_request(request):
+    """デコード済みの要求を処理し、応答を返す"""
+    if not isinstance(request, dict):
+        return {"success": False, "error": "要求は JSON オブジェクトで指定してください"}
+    command = request.get("command")
+    if command == "ping":
+        return {"success": True, "error": None, "output": f"pong (PID {os.getpid()})\n"}
+    args = request.get("args") or []
+    if not isinstance(args, list):
+        return {"success": False, "error": "args は文字列のリストで指定してください"}
+    logger.info(f"ワーカーが要求を受け付けました: {command} {args}")
+    return run_command(command, args)
+
+
+class WorkerRequestHandler(socketserver.StreamRequestHandler):
+    """1接続につき1件の要求を読み、応答を書き込む"""
+
+    def handle(self):
+        line = self.rfile.readline(MAX_REQUEST_SIZE + 1)
+        if not line:
+            # 稼働確認のための接続 (要求を送らずに切断) は何もしない
+            return
+        if len(line) > MAX_REQUEST_SIZE:
+            response = {"success": False, "error": "要求が大きすぎます"}
+        else:
+            try:
+                response = handle_request(json.loads(line))
+            except ValueError as e:
+                response = {"success": False, "error": f"要求を解析できません: {e}"}
+        try:
+            self.wfile.write(
+                json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n"
+            )
+        except OSError as e:
+            # クライアントがタイムアウトなどで先に切断した場合 (コマンドは実行済み)
+            logger.warning(f"ワーカーの応答を返せませんでした: {e}")
+
+
+class Dispatcher:
+    """
+    待機中の予約の最も早い予定時刻を保持し、その時刻を過ぎたら process_tweets を実行する。
+    予定時刻は変更通知を受けた時と、DISPATCH_REPLAN_SECONDS ごと (通知の取りこぼし対策) に
+    計算し直す。DB への問い合わせはこの2つの場合と投稿後だけで、待機中は行わない。
+    """
+
+    def __init__(self, listener):
+        self.listener = listener
+        self.deadline = None
+        self._planned_at = None
+        self._not_before = 0.0
+
+    def replan(self):
+        """次に投稿すべき予定時刻を計算し直す"""
+        from .models import TweetSchedule  # 循環インポート回避
+
+        # 待機中の予約がなくても繰り返しパターンの予約が作られるよう、先に作成しておく
+        materialize()
+        # 無効なアカウントの予約は投稿されないため、予定時刻に含めない
+        # (含めると過去の予定時刻が残り続け、process_tweets を繰り返し実行してしまう)
+        self.deadline = (
+            TweetSchedule.objects.filter(status="pending")
+            .filter(Q(account__isnull=True) | Q(account__is_active=True))
+            .aggregate(next=Min("scheduled_time"))["next"]
+        )
+        self._planned_at = time.monotonic()
+        logger.debug(f"ディスパッチャーの次の予定時刻: {self.deadline}")
+
+    def tick(self):
+        """
+        サーバーのループから定期的に呼ばれる。予定時刻を過ぎていれば process_tweets を実行し、
+        その応答を返す (実行しなかった場合は None)。
+        """
+        woken = self.listener.drain()
+        if (
+            woken
+            or self._planned_at is None
+            or time.monotonic() - self._planned_at >= settings.DISPATCH_REPLAN_SECONDS
+        ):
+            _ensure_usable_connections()
+            self.replan()
+
+        if self.deadline is None or timezone.now() < self.deadline:
+            return None
+        if time.monotonic() < self._not_before:
+            return None
+
+        logger.info(
+            f"予定時刻 {self.deadline} を過ぎたため process_tweets を実行します"
+        )
+        response = run_command("process_tweets")
+        if not response["success"]:
+            logger.error(
+                f"ディスパッチャーからの process_tweets が失敗しました: {response['error']}"
+            )
+        self.replan()
+        if self.deadline is not None and self.deadline <= timezone.now():
+            # 投稿上限などで予約が残った場合は、しばらく間を空けてから再実行する
+            self._not_before = time.monotonic() + settings.DISPATCH_RETRY_SECONDS
+        return response
+
+
+class WorkerServer(socketserver.UnixStreamServer):
+    """
+    要求を1件ずつ順番に処理する Unix ドメインソケットサーバー
+    (投稿処理が同時に走らないよう、スレッドは使わない)。
+    dispatcher を指定した場合は、要求を待つ間 (poll_interval ごと) に dispatcher.tick() を呼ぶ。
+    """
+
+    def __init__(self, socket_path, dispatcher=None):
+        self.socket_path = str(socket_path)
+        self.dispatcher = dispatcher
+        _remove_stale_socket(self.socket_path)
+        super().__init__(self.socket_path, WorkerRequestHandler)
+        # ソケットは起動したユーザーだけが使えるようにする
+        os.chmod(self.socket_path, 0o600)
+        # tweepy のクライアントを要求をまたいで使い回す
+        utils.enable_client_reuse()
+
+    def service_actions(self):
+        if self.dispatcher is None:
+            return
+        try:
+            self.dispatcher.tick()
+        except Exception:
+            # DB の一時的なエラーなどでワーカーを止めない (次の tick で再試行する)
+            logger.exception("ディスパッチャーの処理中にエラーが発生しました")
+
+    def server_close(self):
+        super().server_close()
+        utils.disable_client_reuse()
+        if self.dispatcher is not None:
+            self.dispatcher.listener.close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+
+def _remove_stale_socket(socket_path):
+    """前回のワーカーが残したソケットファイルを削除する (稼働中のワーカーがあればエラー)"""
+    if not os.path.exists(socket_path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        os.unlink(socket_path)
+    else:
+        raise RuntimeError(f"ワーカーはすでに起動しています: {socket_path}")
+    finally:
+        probe.close()
@@ -0,0 +1,11 @@
+#!/bin/bash
+
+# 仮想環境をアクティベート
+source .venv/bin/activate
+
+# 非同期ビューを有効化 (.env で設定済みの場合はそちらが優先される)
+export ASYNC_VIEWS="${ASYNC_VIEWS:-True}"
+
+# auto_tweet_projectディレクトリに移動してASGIサーバーを起動
+# uvicorn は requirements.txt に含まれないため、事前に pip install uvicorn が必要
+cd auto_tweet_project && uvicorn core.asgi:application --host 127.0.0.1 --port 8000 --workers "${ASGI_WORKERS:-2}"
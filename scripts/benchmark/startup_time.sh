@@ -0,0 +1,52 @@
+#!/bin/bash
+
+# --- エラーハンドリング設定 ---
+set -euo pipefail
+# ---
+
+# 管理コマンドの起動時間を計測するスクリプト
+# 使い方: startup_time.sh [実行回数] [コマンド...]  (既定: 5回, process_tweets)
+# 処理対象がない状態での実行時間と、起動時に import されたモジュール (tweepy など) の
+# 累積 import 時間を表示する。
+SCRIPT_PATH=$(readlink -f "$0")
+SCRIPT_DIR=$(dirname "$SCRIPT_PATH")
+
+# --- 共通設定ファイルの読み込み ---
+source "${SCRIPT_DIR}/../config/common_config.sh" || { echo "共通設定ファイルの読み込みに失敗しました"; exit 1; }
+# ---
+
+RUNS="${1:-5}"
+shift || true
+COMMAND=("$@")
+if [ ${#COMMAND[@]} -eq 0 ]; then
+    COMMAND=(process_tweets)
+fi
+
+# 仮想環境がなければ PATH 上の python を使う
+if [ ! -x "${PYTHON_BIN}" ]; then
+    PYTHON_BIN=$(command -v python3 || command -v python)
+fi
+
+cd "${PROJECT_DIR}"
+
+echo "コマンド: manage.py ${COMMAND[*]} (${RUNS}回)"
+for i in $(seq 1 "${RUNS}"); do
+    start=$(date +%s%N)
+    "${PYTHON_BIN}" manage.py "${COMMAND[@]}" > /dev/null 2>&1
+    end=$(date +%s%N)
+    echo "  ${i}回目: $(( (end - start) / 1000000 ))ms"
+done
+
+# -X importtime の出力から累積 import 時間の大きいモジュールを表示する
+IMPORT_TIMES=$("${PYTHON_BIN}" -X importtime manage.py "${COMMAND[@]}" 2>&1 >/dev/null | grep '^import time:' || true)
+echo "累積 import 時間の上位 (マイクロ秒):"
+echo "${IMPORT_TIMES}" \
+    | awk -F'|' 'NR > 1 { gsub(/ /, "", $2); print $2 "\t" $3 }' \
+    | sort -rn \
+    | head -15 || true
+
+if echo "${IMPORT_TIMES}" | grep -qE '\|\s+tweepy$'; then
+    echo "tweepy: 起動時に import されています"
+else
+    echo "tweepy: import されていません"
+fi
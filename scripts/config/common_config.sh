@@ -49,6 +49,20 @@ RETRY_INTERVAL_SECONDS=30
 # --- レート制限リトライ設定 (launchd版で使用) ---
 RATE_LIMIT_RETRY_WAIT_SECONDS=300 # 5分
 
+# --- process_tweets の実行上限 ---
+# 1回の実行で新しい予約に手を付ける時間の上限（秒）。次回の起動 (launchd: 600秒間隔) と
+# 重ならないよう余裕を持たせる。空にすると上限なし
+PROCESS_TWEETS_DEADLINE_SECONDS="${PROCESS_TWEETS_DEADLINE_SECONDS-480}"
+# 1回の実行で投稿を試みる件数の上限。空の場合は上限なし
+PROCESS_TWEETS_MAX_POSTS="${PROCESS_TWEETS_MAX_POSTS-}"
+
+# --- 常駐ワーカー設定 ---
+# true の場合、manage.py run_worker が起動していればソケット経由でコマンドを実行する
+# (ワーカーに接続できない場合は manage.py を直接実行する)
+USE_WORKER="${USE_WORKER:-false}"
+WORKER_SOCKET="${WORKER_SOCKET_PATH:-${PROJECT_DIR}/worker.sock}"
+WORKER_CLIENT="${SCRIPTS_DIR}/worker_client.py"
+
 # --- その他 ---
 # 必要に応じて他の共通設定を追加
 
@@ -128,12 +128,29 @@ determine_peak_hour_flag_option() {
     echo "$peak_flag_option"
 }
 
+# Django の管理コマンドを実行する
+# USE_WORKER=true で常駐ワーカーが起動していればソケット経由で実行し、
+# 接続できない場合 (worker_client.py の終了コード 2) は manage.py を直接実行する
+# Usage: run_django_command <command> [args...]
+# Returns: コマンドの終了コード
+run_django_command() {
+    if [[ "${USE_WORKER:-false}" == "true" ]]; then
+        local worker_exit_code=0
+        "${PYTHON_BIN}" "${WORKER_CLIENT}" --socket "${WORKER_SOCKET}" "$@" || worker_exit_code=$?
+        if [[ ${worker_exit_code} -ne 2 ]]; then
+            return ${worker_exit_code}
+        fi
+        echo "ワーカーに接続できないため manage.py を直接実行します"
+    fi
+    (cd "${PROJECT_DIR}" && "${PYTHON_BIN}" manage.py "$@")
+}
+
 # manage.py process_tweets コマンドを実行し、レート制限時には再試行する
 # Usage: execute_process_tweets_command "<options>"
 # Returns: 0 on success, non-zero on failure
 execute_process_tweets_command() {
     local options="$1"
-    local cmd="${PYTHON_BIN} manage.py process_tweets ${options}"
+    local cmd="run_django_command process_tweets ${options}"
     local success=false
     local exit_code
 
@@ -141,7 +158,7 @@ execute_process_tweets_command() {
     log "DEBUG" "===== Pythonコマンド(process_tweets)出力開始 ====="
 
     # 初回実行
-    if output=$(cd "${PROJECT_DIR}" && eval "$cmd" 2>&1); then
+    if output=$(eval "$cmd" 2>&1); then
         exit_code=0
         log "INFO" "ツイート処理が完了しました"
         while IFS= read -r line; do log "DEBUG" "[Python Output] $line"; done <<< "$output"
@@ -162,11 +179,11 @@ execute_process_tweets_command() {
             if ! grep -q -- '--skip-api-test' <<< "${options}"; then
                  retry_options="${options} --skip-api-test"
             fi
-            local retry_cmd="${PYTHON_BIN} manage.py process_tweets ${retry_options}"
+            local retry_cmd="run_django_command process_tweets ${retry_options}"
             log "INFO" "再実行中: ${retry_cmd}"
             log "DEBUG" "===== 再試行コマンド出力開始 ====="
 
-            if retry_output=$(cd "${PROJECT_DIR}" && eval "$retry_cmd" 2>&1); then
+            if retry_output=$(eval "$retry_cmd" 2>&1); then
                 local retry_exit_code=0
                 log "INFO" "再実行が成功しました"
                 while IFS= read -r line; do log "DEBUG" "[Python Retry Output] $line"; done <<< "$retry_output"
@@ -200,8 +217,7 @@ execute_auto_post_command() {
 
     # コマンドと引数を配列で準備
     local cmd_array=(
-        "${PYTHON_BIN}" \
-        manage.py \
+        run_django_command \
         auto_post \
         --text \
         "${DEFAULT_TWEET_TEXT}" \
@@ -217,7 +233,7 @@ execute_auto_post_command() {
     log "DEBUG" "===== Pythonコマンド(auto_post)出力開始 ====="
 
     # 初回実行 (eval を使わず直接実行)
-    if output=$(cd "${PROJECT_DIR}" && "${cmd_array[@]}" 2>&1); then
+    if output=$("${cmd_array[@]}" 2>&1); then
         exit_code=0
         log "INFO" "自動投稿が完了しました"
         while IFS= read -r line; do log "DEBUG" "[Python Output] $line"; done <<< "$output"
@@ -235,7 +251,7 @@ execute_auto_post_command() {
             log "INFO" "再実行中: ${cmd_array[*]}"
             log "DEBUG" "===== 再試行コマンド出力開始 ====="
 
-            if retry_output=$(cd "${PROJECT_DIR}" && "${cmd_array[@]}" 2>&1); then
+            if retry_output=$("${cmd_array[@]}" 2>&1); then
                 local retry_exit_code=0
                 log "INFO" "再実行が成功しました"
                 while IFS= read -r line; do log "DEBUG" "[Python Retry Output] $line"; done <<< "$retry_output"
@@ -118,8 +118,14 @@ main() {
     cd "${PROJECT_DIR}" || { log "ERROR" "プロジェクトディレクトリに移動できません: ${PROJECT_DIR}"; exit 1; }
     log "INFO" "auto_tweet_projectディレクトリに移動しました"
 
-    # 基本オプション設定 (リトライ回数)
+    # 基本オプション設定 (リトライ回数・実行上限)
     local base_options="--max-retries=${RETRY_COUNT}"
+    if [ -n "${PROCESS_TWEETS_DEADLINE_SECONDS}" ]; then
+        base_options="${base_options} --deadline=${PROCESS_TWEETS_DEADLINE_SECONDS}"
+    fi
+    if [ -n "${PROCESS_TWEETS_MAX_POSTS}" ]; then
+        base_options="${base_options} --max-posts=${PROCESS_TWEETS_MAX_POSTS}"
+    fi
 
     # ピーク時間フラグ判定 & オプション追加 (共通関数呼び出しに変更)
     # local peak_hour_option=$(determine_peak_hour_flag)
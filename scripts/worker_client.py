@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+常駐ワーカー (manage.py run_worker) にコマンドの実行を依頼するクライアント
+
+Django を読み込まない標準ライブラリだけのスクリプトなので、すぐに起動する。
+使い方: worker_client.py [--socket パス] [--timeout 秒] <コマンド> [引数...]
+    例: worker_client.py process_tweets --skip-api-test
+
+終了コード:
+    0: コマンドが成功した
+    1: コマンドが失敗した
+    2: ワーカーに接続できない (呼び出し元は manage.py を直接実行する)
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SOCKET_PATH = os.getenv(
+    "WORKER_SOCKET_PATH",
+    os.path.join(os.path.dirname(SCRIPTS_DIR), "auto_tweet_project", "worker.sock"),
+)
+
+EXIT_SUCCESS = 0
+EXIT_FAILURE = 1
+EXIT_UNAVAILABLE = 2
+
+
+def send_request(socket_path, request, timeout):
+    """要求を送り、応答 (dict) を返す。接続できない場合は ConnectionError"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(socket_path)
+        except OSError as e:
+            raise ConnectionError(
+                f"ワーカーに接続できません ({socket_path}): {e}"
+            ) from e
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as response:
+            line = response.readline()
+    if not line:
+        raise ConnectionError("ワーカーから応答がありません")
+    return json.loads(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="常駐ワーカーにコマンドの実行を依頼する"
+    )
+    parser.add_argument(
+        "--socket", default=DEFAULT_SOCKET_PATH, help="ワーカーのソケット"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=600, help="応答を待つ最大秒数 (既定: 600)"
+    )
+    parser.add_argument(
+        "command", help="実行するコマンド (process_tweets / auto_post / ping)"
+    )
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="コマンドの引数")
+    options = parser.parse_args(argv)
+
+    try:
+        response = send_request(
+            options.socket,
+            {"command": options.command, "args": options.args},
+            options.timeout,
+        )
+    except ConnectionError as e:
+        print(e, file=sys.stderr)
+        return EXIT_UNAVAILABLE
+    except (OSError, ValueError) as e:
+        # 接続後のタイムアウトなど: コマンドが実行された可能性があるため再実行させない
+        print(f"ワーカーとの通信に失敗しました: {e}", file=sys.stderr)
+        return EXIT_FAILURE
+
+    if response.get("output"):
+        sys.stdout.write(response["output"])
+    if not response.get("success"):
+        print(f"エラー: {response.get('error')}", file=sys.stderr)
+        return EXIT_FAILURE
+    return EXIT_SUCCESS
+
+
+if __name__ == "__main__":
+    sys.exit(main())